@@ -1,49 +1,22 @@
 # interleave16_print.py
 # 在終端機印出 4x4 空間交錯(=16 banks) 的 bank 對應與打包結果
-# 不需任何外部套件
+# 函式庫本體在 bank16.py（檔名不能以數字開頭才 import 得到）；這裡只剩命令列、印表與基準
+#
+#   python 16bank.py           # 印出小圖的佈局與打包結果
+#   python 16bank.py --bench   # 純 Python 對比 NumPy 版，640x480 到 8K
+#   python 16bank.py --stream [H W]   # 串流打包大影格，看峰值記憶體是否固定
+#   python 16bank.py --formats   # 各像素格式（RGB/RGBA/Bayer/YUYV…）交錯與分平面的往返檢查
+#   python 16bank.py --conflicts [H W]   # 各存取樣式在不同 br x bc 下的 bank 衝突與頻寬（預設全高畫質）
 
-def bank_id(y, x, br=4, bc=4):
-    """回傳 0..15 的 bank 編號；顯示時再 +1 變 1..16。"""
-    return (y % br) * bc + (x % bc)
+import os, sys, tempfile, time, tracemalloc
 
-def make_test_image(H, W):
-    """做一張容易檢查的灰階 ramp 影像(0..255 循環)。回傳 HxW 的 list[list[int]]。"""
-    img = []
-    v = 0
-    for y in range(H):
-        row = []
-        for x in range(W):
-            row.append(v & 0xFF)
-            v += 1
-        img.append(row)
-    return img
-
-def pack_to_16banks(img, br=4, bc=4):
-    """把 HxW(灰階) 影像依 4x4 空間交錯打包到 16 個 bank。
-       回傳 banks(list[list[int]]) 以及 (y,x)->(bank,bank_addr) 的 map(list)。"""
-    H, W = len(img), len(img[0])
-    banks = [[] for _ in range(br*bc)]
-    counts = [0]*(br*bc)
-    addr_map = []  # (y,x,bank,bank_addr)
+import numpy as np
 
-    for y in range(H):
-        for x in range(W):
-            b = bank_id(y, x, br, bc)
-            addr_map.append((y, x, b, counts[b]))
-            banks[b].append(img[y][x])
-            counts[b] += 1
-    return banks, addr_map
-
-def reconstruct_from_16banks(banks, H, W, br=4, bc=4):
-    """把 16 個 bank 依同樣走訪規則還原回 HxW(灰階) 影像，用來驗證。"""
-    img = [[0]*W for _ in range(H)]
-    read_ptr = [0]*len(banks)
-    for y in range(H):
-        for x in range(W):
-            b = bank_id(y, x, br, bc)
-            img[y][x] = banks[b][read_ptr[b]]
-            read_ptr[b] += 1
-    return img
+from bank16 import (PIXEL_FORMATS, AddrMap, BankLayout, addr_map_np, as_words, band_rows, bank_id,
+                    col_pattern, from_words, load_stream_banks, make_test_frame, make_test_image,
+                    make_test_image_np, pack_to_16banks, pack_to_16banks_np, reconstruct_from_16banks,
+                    reconstruct_from_16banks_np, reference_banks, rotate_pattern, row_pattern,
+                    stream_pack, sweep_conflicts, window_pattern)
 
 def print_bank_layout(H, W, br=4, bc=4):
     """印出與你圖一樣的 1..16 bank 佈局（逐列列印）。"""
@@ -63,10 +36,11 @@ def main():
     print_bank_layout(H, W, 4, 4)
 
     banks, addr_map = pack_to_16banks(img, 4, 4)
+    amap = AddrMap(H, W, 4, 4)   # 預覽只要 40 筆，不必整張表
 
     # 印出前 40 筆 (y,x)-> bank/addr 對應，方便檢查
     print("[(y,x) -> bank, bank_addr] preview (first 40):")
-    for y, x, b, a in addr_map[:40]:
+    for y, x, b, a in amap[:40]:
         print(f"  ({y:2d},{x:2d}) -> bank {b+1:2d}, addr {a}")
 
     # 各 bank 長度與前幾個元素
@@ -80,5 +54,191 @@ def main():
     ok = (recon == img)
     print(f"\nReconstruct OK? {ok}")
 
+    # 陣列版與純 Python 版逐位元相同
+    img_np = make_test_image_np(H, W)
+    banks_np = pack_to_16banks_np(img_np, 4, 4)
+    same = (img_np.tolist() == img
+            and [d.tolist() for d in banks_np] == banks
+            and addr_map_np(H, W, 4, 4).tolist() == [list(t) for t in addr_map]
+            and np.array_equal(reconstruct_from_16banks_np(banks_np, H, W, 4, 4), img_np))
+    print(f"NumPy version identical? {same}")
+    print(f"AddrMap matches addr_map? {list(amap) == addr_map}")
+
+# 基準尺寸：(名稱, H, W)
+_BENCH_SIZES = [("VGA", 480, 640), ("720p", 720, 1280), ("1080p", 1080, 1920),
+                ("4K", 2160, 3840), ("8K", 4320, 7680)]
+_BENCH_PY_MAX = 1080 * 1920   # 純 Python 版只跑到 1080p；再大要好幾分鐘、好幾 GB
+
+def _timed(fn, *args):
+    t0 = time.perf_counter()
+    out = fn(*args)
+    return out, time.perf_counter() - t0
+
+def _views_memory(H, W, br, bc):
+    """在 HxW 影像上取全部 bank 視圖 vs. 全部 pack 出來，各多用多少記憶體（位元組）。"""
+    img = make_test_image_np(H, W)
+    layout = BankLayout(H, W, br, bc)
+    tracemalloc.start()
+    views = layout.views(img)
+    view_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    assert all(np.shares_memory(v, img) for v in views)
+    packed_bytes = sum(a.nbytes for a in layout.pack(img))
+    return view_bytes, packed_bytes
+
+def _addr_map_memory(H, W):
+    """8K 等級的 addr_map：tuple 清單（以 VGA 實測每筆大小外推）、AddrMap 物件、int32 表各多大（位元組）。"""
+    tracemalloc.start()
+    small = list(AddrMap(480, 640))
+    per_entry = tracemalloc.get_traced_memory()[0] / len(small)
+    tracemalloc.stop()
+    del small
+    amap = AddrMap(H, W)
+    obj = sys.getsizeof(amap) + sum(sys.getsizeof(getattr(amap, k)) for k in AddrMap.__slots__)
+    return per_entry * H * W, obj, H * W * 4 * 4
+
+def bench():
+    """純 Python 對比 NumPy：打包＋還原的耗時，並逐位元比對結果。"""
+    print(f"{'size':>6} {'HxW':>10} | {'python pack+unpack':>18} | {'numpy pack+unpack':>17} | {'speedup':>7} | identical")
+    for name, H, W in _BENCH_SIZES:
+        img_np = make_test_image_np(H, W)
+        banks_np, t_pack = _timed(pack_to_16banks_np, img_np)
+        recon_np, t_unpack = _timed(reconstruct_from_16banks_np, banks_np, H, W)
+        t_np = t_pack + t_unpack
+        ok = np.array_equal(recon_np, img_np)
+        if H * W <= _BENCH_PY_MAX:
+            img = make_test_image(H, W)
+            (banks, addr_map), t_pack = _timed(pack_to_16banks, img)
+            recon, t_unpack = _timed(reconstruct_from_16banks, banks, H, W)
+            t_py = t_pack + t_unpack
+            ok = (ok and recon == img
+                  and all(np.array_equal(a, b) for a, b in zip(banks_np, banks))
+                  and np.array_equal(addr_map_np(H, W), np.array(addr_map, dtype=np.int32)))
+            del img, banks, addr_map, recon
+            py = f"{t_py * 1000:15.0f} ms"
+            speed = f"{t_py / t_np:6.0f}x"
+        else:
+            py, speed = f"{'-':>18}", f"{'-':>7}"
+        print(f"{name:>6} {H:>4}x{W:<5} | {py} | {t_np * 1000:14.1f} ms | {speed} | {ok}")
+
+    print("\n8K frame, extra memory to reach every bank:")
+    for br, bc in ((4, 4), (5, 7), (8, 8)):
+        view_bytes, packed_bytes = _views_memory(4320, 7680, br, bc)
+        print(f"  {br}x{bc} = {br * bc:2d} banks: strided views {view_bytes / 1024:6.1f} KB | packed copies {packed_bytes / 2**20:6.1f} MB")
+
+    tuples, obj, table = _addr_map_memory(4320, 7680)
+    amap = AddrMap(4320, 7680)
+    ys = np.random.default_rng(0).integers(0, 4320, 10**6)
+    xs = np.random.default_rng(1).integers(0, 7680, 10**6)
+    (banks, addrs), t_fwd = _timed(amap.lookup, ys, xs)
+    (ry, rx), t_inv = _timed(amap.locate, banks, addrs)
+    assert np.array_equal(ry, ys) and np.array_equal(rx, xs)
+    print("\n8K frame, (y,x) -> (bank, addr) map:")
+    print(f"  list of tuples ~{tuples / 2**30:.1f} GB | AddrMap {obj} B | int32 table on request {table / 2**20:.0f} MB")
+    print(f"  1M random lookups {t_fwd * 1000:.1f} ms, inverse {t_inv * 1000:.1f} ms")
+
+def _write_ramp(path, H, W, dtype=np.uint8):
+    """把 make_test_image_np 的 ramp 一條一條寫成原始影格檔，不在記憶體裡建整張圖。"""
+    with open(path, "wb") as f:
+        step = band_rows(W, np.dtype(dtype).itemsize, 1)
+        for y0 in range(0, H, step):
+            rows = min(step, H - y0)
+            (np.arange(y0 * W, (y0 + rows) * W, dtype=np.int64) & 0xFF).astype(dtype).tofile(f)
+
+def bench_stream(sizes):
+    """各尺寸串流打包的耗時與 Python 堆積峰值（tracemalloc）；小尺寸另與記憶體內 pack 逐位元比對。"""
+    print(f"{'HxW':>12} | {'frame':>9} | {'dir time':>8} | {'file time':>9} | {'peak heap':>9} | identical")
+    with tempfile.TemporaryDirectory(prefix="16bank_") as tmp:
+        for H, W in sizes:
+            src = os.path.join(tmp, "frame.raw")
+            _write_ramp(src, H, W)
+            bank_dir = os.path.join(tmp, "banks")
+            os.makedirs(bank_dir, exist_ok=True)
+            tracemalloc.start()
+            regions, t_dir = _timed(stream_pack, src, H, W, bank_dir)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            packed = os.path.join(tmp, "packed.raw")
+            single, t_file = _timed(stream_pack, src, H, W, packed)
+            ok = "-"
+            if H * W <= 4320 * 7680:
+                expect = pack_to_16banks_np(np.fromfile(src, dtype=np.uint8).reshape(H, W))
+                ok = all(np.array_equal(a, e) and np.array_equal(c, e) for a, c, e in
+                         zip(load_stream_banks(regions), load_stream_banks(single), expect))
+            print(f"{H:>5}x{W:<6} | {H * W / 2**20:6.0f} MB | {t_dir:7.2f}s | {t_file:8.2f}s | {peak / 2**20:6.1f} MB | {ok}")
+            for f in os.listdir(bank_dir):
+                os.remove(os.path.join(bank_dir, f))
+            os.remove(packed)
+            os.remove(src)
+
+def check_formats(sizes=((37, 53), (64, 96), (1080, 1920)), mappings=((4, 4), (3, 5), (2, 8))):
+    """每種像素格式 x 尺寸 x br x bc：交錯、一像素一字、分平面、串流四種路徑都要往返一致且與對照相同。"""
+    ok_all = True
+    print(f"{'format':>9} | {'dtype':>7} | ch | interleave | words | planar | stream | 1080p pack+unpack")
+    with tempfile.TemporaryDirectory(prefix="16bank_") as tmp:
+        for fmt, (dtype, ch, bits) in PIXEL_FORMATS.items():
+            res = {"interleave": True, "words": True, "planar": True, "stream": True}
+            t_total = 0.0
+            for H, W in sizes:
+                img = make_test_frame(H, W, fmt)
+                for br, bc in mappings:
+                    layout = BankLayout(H, W, br, bc)
+                    ref = reference_banks(img, br, bc) if H * W <= 96 * 96 else None
+                    t0 = time.perf_counter()
+                    banks = layout.pack(img)
+                    back = layout.unpack(banks)
+                    if (H, W, br, bc) == (1080, 1920, 4, 4):
+                        t_total = time.perf_counter() - t0
+                    res["interleave"] &= np.array_equal(back, img) and (
+                        ref is None or all(np.array_equal(a, e) for a, e in zip(banks, ref)))
+                    words = layout.pack(as_words(img))
+                    res["words"] &= all(np.array_equal(from_words(w, dtype, ch).reshape(a.shape), a)
+                                        for w, a in zip(words, banks))
+                    groups = layout.pack_planar(img)
+                    res["planar"] &= np.array_equal(layout.unpack_planar(groups), img) and all(
+                        np.array_equal(g[b], (banks[b] if ch == 1 else banks[b][:, c]))
+                        for c, g in enumerate(groups) for b in range(layout.n_banks))
+                    if H * W <= 96 * 96:
+                        src = os.path.join(tmp, "frame.raw")
+                        img.tofile(src)
+                        regions = stream_pack(src, H, W, os.path.join(tmp, "packed.raw"), dtype, br, bc,
+                                              band_bytes=W * img.itemsize * ch * br, channels=ch)
+                        res["stream"] &= all(np.array_equal(s, a) for s, a in
+                                             zip(load_stream_banks(regions, dtype, ch), banks))
+            ok_all &= all(res.values())
+            cells = " | ".join(f"{str(v):>{len(k)}}" for k, v in res.items())
+            print(f"{fmt:>9} | {np.dtype(dtype).name:>7} | {ch:2d} | {cells} | {t_total * 1000:13.1f} ms")
+    print(f"\nAll formats round-trip? {ok_all}")
+    return ok_all
+
+_SWEEP_MAPPINGS = [(1, 16), (2, 8), (4, 4), (8, 2), (16, 1), (3, 5), (4, 8), (8, 8)]
+
+def bench_conflicts(H=1080, W=1920, ports=1):
+    """全高畫質上掃過常見卷積／讀取樣式與多種 br x bc，印出每週期像素數與最壞 stall。"""
+    patterns = [window_pattern(H, W, 3), window_pattern(H, W, 5), window_pattern(H, W, 3, 2),
+                row_pattern(H, W, 8), row_pattern(H, W, 8, 2), col_pattern(H, W, 4),
+                rotate_pattern(H, W, 16, 90), rotate_pattern(H, W, 16, 30)]
+    t0 = time.perf_counter()
+    results = sweep_conflicts(patterns, _SWEEP_MAPPINGS, ports)
+    elapsed = time.perf_counter() - t0
+    print(f"[Bank conflicts over {H}x{W}, {ports} port(s) per bank; cell = pixels/cycle (worst stall)]")
+    print(f"{'pattern':>20} | " + " | ".join(f"{br:>2}x{bc:<2}".center(11) for br, bc in _SWEEP_MAPPINGS))
+    for i, p in enumerate(patterns):
+        row = results[i * len(_SWEEP_MAPPINGS):(i + 1) * len(_SWEEP_MAPPINGS)]
+        print(f"{p.name:>20} | " + " | ".join(f"{r['pixels_per_cycle']:5.2f} ({r['worst_stall']:2d})" for _, _, _, r in row))
+    print(f"\n{len(patterns)} patterns x {len(_SWEEP_MAPPINGS)} mappings in {elapsed:.2f}s")
+
 if __name__ == "__main__":
-    main()
+    if "--bench" in sys.argv[1:]:
+        bench()
+    elif "--stream" in sys.argv[1:]:
+        dims = [int(a) for a in sys.argv[1:] if a.isdigit()]
+        bench_stream([tuple(dims[:2])] if len(dims) >= 2 else
+                     [(2160, 3840), (4320, 7680), (8640, 15360), (17280, 30720)])
+    elif "--formats" in sys.argv[1:]:
+        check_formats()
+    elif "--conflicts" in sys.argv[1:]:
+        dims = [int(a) for a in sys.argv[1:] if a.isdigit()]
+        bench_conflicts(*dims[:2])
+    else:
+        main()
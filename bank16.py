@@ -0,0 +1,451 @@
+# -*- coding: utf-8 -*-
+"""
+4x4（一般為 br x bc）空間交錯的 bank 打包函式庫（16bank.py 的命令列、tests/ 共用）
+
+- 純 Python 逐像素版（pack_to_16banks 等）當作對照；*_np／BankLayout 為 NumPy 陣列版；
+- BankLayout：任意 br、bc、H、W 與像素格式（PIXEL_FORMATS）的交錯／分平面打包，pack() 一律回傳自有的緩衝；
+- AddrMap：(y,x) <-> (bank, bank_addr) 的閉式對應；stream_pack：比記憶體大的影格以列帶串流打包；
+- AccessPattern／simulate_conflicts：各存取樣式在不同 br x bc 下的 bank 衝突與頻寬。
+"""
+
+import os
+
+import numpy as np
+
+def bank_id(y, x, br=4, bc=4):
+    """回傳 0..15 的 bank 編號；顯示時再 +1 變 1..16。"""
+    return (y % br) * bc + (x % bc)
+
+def make_test_image(H, W):
+    """做一張容易檢查的灰階 ramp 影像(0..255 循環)。回傳 HxW 的 list[list[int]]。"""
+    img = []
+    v = 0
+    for y in range(H):
+        row = []
+        for x in range(W):
+            row.append(v & 0xFF)
+            v += 1
+        img.append(row)
+    return img
+
+def pack_to_16banks(img, br=4, bc=4):
+    """把 HxW(灰階) 影像依 4x4 空間交錯打包到 16 個 bank。
+       回傳 banks(list[list[int]]) 以及 (y,x)->(bank,bank_addr) 的 map(list)。"""
+    H, W = len(img), len(img[0])
+    banks = [[] for _ in range(br*bc)]
+    counts = [0]*(br*bc)
+    addr_map = []  # (y,x,bank,bank_addr)
+
+    for y in range(H):
+        for x in range(W):
+            b = bank_id(y, x, br, bc)
+            addr_map.append((y, x, b, counts[b]))
+            banks[b].append(img[y][x])
+            counts[b] += 1
+    return banks, addr_map
+
+def reconstruct_from_16banks(banks, H, W, br=4, bc=4):
+    """把 16 個 bank 依同樣走訪規則還原回 HxW(灰階) 影像，用來驗證。"""
+    img = [[0]*W for _ in range(H)]
+    read_ptr = [0]*len(banks)
+    for y in range(H):
+        for x in range(W):
+            b = bank_id(y, x, br, bc)
+            img[y][x] = banks[b][read_ptr[b]]
+            read_ptr[b] += 1
+    return img
+
+def make_test_image_np(H, W, dtype=np.uint8):
+    """make_test_image 的陣列版：同樣的 0..255 循環 ramp，回傳 HxW 的 ndarray。"""
+    return (np.arange(H * W, dtype=np.int64) & 0xFF).astype(dtype).reshape(H, W)
+
+# 多通道／寬像素格式：名稱 -> (dtype, 每像素通道數, 有效位元數)
+PIXEL_FORMATS = {
+    "gray8":    (np.uint8, 1, 8),
+    "rgb8":     (np.uint8, 3, 8),
+    "rgba8":    (np.uint8, 4, 8),
+    "bayer10":  (np.uint16, 1, 10),   # RGGB 馬賽克，每像素一個 10-bit 樣本放在 16-bit 容器
+    "bayer12":  (np.uint16, 1, 12),
+    "bayer16":  (np.uint16, 1, 16),
+    "yuyv":     (np.uint8, 2, 8),     # 4:2:2 packed：每像素 (Y, U) 或 (Y, V) 交替
+    "rgb16":    (np.uint16, 3, 16),
+    "rgba_f32": (np.float32, 4, 32),
+}
+
+def make_test_frame(H, W, fmt="gray8"):
+    """依 PIXEL_FORMATS 做一張測試影格：HxW（單通道）或 HxWxC，值為 ramp 遮到有效位元數，各通道錯開。"""
+    dtype, ch, bits = PIXEL_FORMATS[fmt]
+    v = np.arange(H * W * ch, dtype=np.int64).reshape((H, W) if ch == 1 else (H, W, ch))
+    if np.issubdtype(dtype, np.floating):
+        return (v / 7.0).astype(dtype)
+    return (v * 2654435761 >> 7 & ((1 << bits) - 1)).astype(dtype)
+
+def as_words(img):
+    """HxWxC 的連續影像 → HxW 的「一像素一字」零複製視圖：C*itemsize 為 2/4/8 位元組時用無號整數，
+       其他寬度（如 RGB888 的 3 位元組）用同寬的 void 字。單通道影像原樣回傳。"""
+    img = np.ascontiguousarray(img)
+    if img.ndim == 2:
+        return img
+    width = img.shape[2] * img.itemsize
+    word = np.dtype(f"u{width}") if width in (1, 2, 4, 8) else np.dtype((np.void, width))
+    return img.view(word).reshape(img.shape[:2])
+
+def from_words(words, dtype, channels):
+    """as_words 的反向：把一維或二維的字陣列看回 (..., channels) 的 dtype 陣列（零複製）。"""
+    words = np.ascontiguousarray(words)
+    if channels == 1 and words.dtype == np.dtype(dtype):
+        return words
+    return words.view(dtype).reshape(words.shape + (channels,))
+
+class BankLayout:
+    """HxW 影像在 br x bc 空間交錯下的 bank 佈局（br、bc 任意，含非 2 的次方；H、W 不必是倍數）。
+       bank b = by*bc + bx 收到原圖的 [by::br, bx::bc]。
+       view()/views() 回傳原影像上的跨步視圖，不複製任何像素；要連續的 bank 緩衝才呼叫 pack()。
+       影像可以是任意 dtype 的 HxW 或 HxWxC：
+       - 交錯（預設）：同一像素的各通道留在同一個 bank 字裡，bank 為 (n, C)；用 as_words 可再看成一維字陣列；
+       - 分平面（pack_planar）：每個通道各自一組 br*bc 個 bank。"""
+
+    def __init__(self, H, W, br=4, bc=4):
+        self.H, self.W, self.br, self.bc = H, W, br, bc
+        self.n_banks = br * bc
+
+    def shape(self, b):
+        """bank b 的 (列數, 行數)。"""
+        by, bx = divmod(b, self.bc)
+        return (self.H - by + self.br - 1) // self.br, (self.W - bx + self.bc - 1) // self.bc
+
+    def length(self, b):
+        rows, cols = self.shape(b)
+        return rows * cols
+
+    def _check(self, img):
+        img = np.asarray(img)
+        if img.shape[:2] != (self.H, self.W):
+            raise ValueError(f"image is {img.shape[:2]}, layout expects {(self.H, self.W)}")
+        return img
+
+    def view(self, img, b):
+        """bank b 的零複製跨步視圖。"""
+        by, bx = divmod(b, self.bc)
+        return self._check(img)[by::self.br, bx::self.bc]
+
+    def views(self, img):
+        img = self._check(img)
+        return [img[by::self.br, bx::self.bc] for by in range(self.br) for bx in range(self.bc)]
+
+    def pack(self, img, b=None):
+        """實體化成連續的 bank 緩衝（單通道為一維，多通道為 (n, C)）：b 給定時只做那一個，否則回傳全部 br*bc 個。"""
+        img = self._check(img)
+        # 一律複製：br=bc=1 時跨步視圖就是整張原圖，reshape/ravel 不會複製，回傳值會和輸入共用記憶體
+        if img.ndim == 3 and img.flags.c_contiguous:
+            # 多通道先看成一像素一字再跨步複製，內層不再是 C 個小元素，快數倍
+            dtype, ch = img.dtype, img.shape[2]
+            words = as_words(img)
+            if b is not None:
+                return from_words(np.array(self.view(words, b), copy=True).ravel(), dtype, ch)
+            return [from_words(np.array(v, copy=True).ravel(), dtype, ch) for v in self.views(words)]
+        if b is not None:
+            v = self.view(img, b)
+            return np.array(v, copy=True).reshape((-1,) + v.shape[2:])
+        return [np.array(v, copy=True).reshape((-1,) + v.shape[2:]) for v in self.views(img)]
+
+    def unpack(self, banks, out=None):
+        """把 br*bc 個 bank 跨步寫回 HxW(xC) 影像（out 可給現成的緩衝，dtype 與通道數預設跟著 bank）。"""
+        if out is None:
+            first = np.asarray(banks[0])
+            out = np.empty((self.H, self.W) + first.shape[1:], dtype=first.dtype)
+        if out.ndim == 3 and out.flags.c_contiguous:
+            ch = out.shape[2]
+            for v, data in zip(self.views(as_words(out)), banks):
+                v[...] = as_words(np.asarray(data).reshape(-1, 1, ch)).reshape(v.shape)
+            return out
+        for v, data in zip(self.views(out), banks):
+            v[...] = np.asarray(data).reshape(v.shape)
+        return out
+
+    def pack_planar(self, img):
+        """分平面打包：回傳 C 組、每組 br*bc 個一維 bank，第 c 組只放通道 c。"""
+        img = self._check(img)
+        if img.ndim == 2:
+            return [self.pack(img)]
+        return [self.pack(img[:, :, c]) for c in range(img.shape[2])]
+
+    def unpack_planar(self, groups, out=None):
+        """pack_planar 的反向：C 組 bank 寫回 HxWxC（只有一組時回 HxW）。"""
+        if len(groups) == 1:
+            return self.unpack(groups[0], out)
+        if out is None:
+            out = np.empty((self.H, self.W, len(groups)), dtype=np.asarray(groups[0][0]).dtype)
+        for c, banks in enumerate(groups):
+            self.unpack(banks, out[:, :, c])
+        return out
+
+def pack_to_16banks_np(img, br=4, bc=4):
+    """pack_to_16banks 的陣列版：img 為 HxW 的 uint8/uint16 等 ndarray，回傳 br*bc 個一維 ndarray。
+       同一個 bank 的像素就是 img[by::br, bx::bc]，依掃描順序攤平正好等於純 Python 版逐像素 append 的順序，
+       所以每個 bank 只是一次跨步切片加一次連續複製。H、W 不必是 br、bc 的倍數（各 bank 長度可能不同）。"""
+    img = np.asarray(img)
+    return BankLayout(img.shape[0], img.shape[1], br, bc).pack(img)
+
+class AddrMap:
+    """(y,x) <-> (bank, bank_addr) 的閉式對應，取代 pack_to_16banks 那張 H*W 個 tuple 的 addr_map。
+       本身只存 H、W、br、bc 幾個整數；lookup()/locate() 接受純量（回 Python int）或索引陣列（整批向量化）。
+       bank = (y%br)*bc + x%bc，bank_addr = (y//br) * 該 bank 的行數 + x//bc。
+       仍可像原本的 list 一樣 len()、索引、切片、逐筆走訪 (y, x, bank, bank_addr)；
+       要整張表才呼叫 table()，得到 (H*W, 4) int32。"""
+
+    __slots__ = ("H", "W", "br", "bc")
+
+    def __init__(self, H, W, br=4, bc=4):
+        self.H, self.W, self.br, self.bc = H, W, br, bc
+
+    def _cols(self, bx):
+        return (self.W - bx + self.bc - 1) // self.bc
+
+    def lookup(self, y, x):
+        """(y, x) -> (bank, bank_addr)。"""
+        if not (np.isscalar(y) and np.isscalar(x)):
+            y, x = np.asarray(y, dtype=np.int64), np.asarray(x, dtype=np.int64)
+        bx = x % self.bc
+        return (y % self.br) * self.bc + bx, (y // self.br) * self._cols(bx) + x // self.bc
+
+    def locate(self, bank, addr):
+        """lookup 的反向：(bank, bank_addr) -> (y, x)。"""
+        if not (np.isscalar(bank) and np.isscalar(addr)):
+            bank, addr = np.asarray(bank, dtype=np.int64), np.asarray(addr, dtype=np.int64)
+        by, bx = bank // self.bc, bank % self.bc
+        r, c = addr // self._cols(bx), addr % self._cols(bx)
+        return by + r * self.br, bx + c * self.bc
+
+    def rows(self, y0, rows):
+        """第 y0..y0+rows-1 列的表片段：(rows*W, 4) int32，每列 (y, x, bank, bank_addr)。"""
+        y, x = np.divmod(np.arange(rows * self.W, dtype=np.int64), self.W)
+        y += y0
+        out = np.empty((rows * self.W, 4), dtype=np.int32)
+        out[:, 0], out[:, 1] = y, x
+        out[:, 2], out[:, 3] = self.lookup(y, x)
+        return out
+
+    def table(self):
+        """明確建出整張表（與 pack_to_16banks 的 addr_map 同順序），只在真的需要時呼叫。"""
+        return self.rows(0, self.H)
+
+    def __len__(self):
+        return self.H * self.W
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        y, x = divmod(i, self.W)
+        return (y, x) + self.lookup(y, x)
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+def addr_map_np(H, W, br=4, bc=4):
+    """pack_to_16banks 的 addr_map 陣列版：(H*W, 4) int32，每列 (y, x, bank, bank_addr)，順序相同。"""
+    return AddrMap(H, W, br, bc).table()
+
+def reconstruct_from_16banks_np(banks, H, W, br=4, bc=4):
+    """reconstruct_from_16banks 的陣列版：每個 bank reshape 回自己的形狀，跨步寫回 HxW ndarray（dtype 跟著 bank）。"""
+    return BankLayout(H, W, br, bc).unpack(banks)
+
+# ---- 串流打包：比記憶體還大的原始影格 ----
+
+STREAM_BAND_BYTES = 16 * 2**20   # 每次讀進來的列帶大小上限（實際取 br 的倍數列）
+
+def band_rows(W, itemsize, br, band_bytes=STREAM_BAND_BYTES):
+    return max(br, band_bytes // (W * itemsize) // br * br)
+
+def stream_pack(src, H, W, out, dtype=np.uint8, br=4, bc=4, offset=0,
+                band_bytes=STREAM_BAND_BYTES, addr_map=None, channels=1):
+    """從原始影格檔 src（HxW、dtype、每像素 channels 個通道交錯、列優先，自 offset 位元組起）以 memmap 一次讀一條 br 倍數列的列帶，
+       逐帶把各 bank 的片段接到輸出後面；峰值記憶體不超過一條列帶，與影格大小無關。
+       列帶的起點都是 br 的倍數，所以同一個 bank 依帶接起來就是整張圖的掃描順序，與 pack_to_16banks 相同。
+       out 為既有目錄：每個 bank 寫成 bank_01.raw … bank_NN.raw；
+       否則 out 當成單一檔案，bank 依序排成連續區段（memmap 寫入）。
+       addr_map 給路徑時才逐帶寫出 (H*W, 4) int32 的 (y, x, bank, bank_addr) 表，預設不建。
+       多通道時各通道留在同一個 bank 字裡（交錯）。
+       回傳每個 bank 的 (路徑, 位元組偏移, 像素數)。"""
+    dtype = np.dtype(dtype)
+    px = (channels,) if channels > 1 else ()
+    pixel_bytes = dtype.itemsize * channels
+    layout = BankLayout(H, W, br, bc)
+    frame = np.memmap(src, dtype=dtype, mode="r", offset=offset, shape=(H, W) + px)
+    lengths = [layout.length(b) for b in range(layout.n_banks)]
+    if os.path.isdir(out):
+        paths = [os.path.join(out, f"bank_{b + 1:02d}.raw") for b in range(layout.n_banks)]
+        regions = [(p, 0, n) for p, n in zip(paths, lengths)]
+        files = [open(p, "wb") for p in paths]
+        sink = None
+    else:
+        starts = np.concatenate([[0], np.cumsum(lengths)[:-1]]).astype(np.int64)
+        regions = [(out, int(st) * pixel_bytes, n) for st, n in zip(starts, lengths)]
+        sink = np.memmap(out, dtype=dtype, mode="w+", shape=(H * W,) + px)
+        files = None
+    pos = [int(r[1]) // pixel_bytes for r in regions]
+    amap = open(addr_map, "wb") if addr_map else None
+    lookup = AddrMap(H, W, br, bc)
+    try:
+        step = band_rows(W, pixel_bytes, br, band_bytes)
+        for y0 in range(0, H, step):
+            rows = min(step, H - y0)
+            band = frame[y0:y0 + rows]   # memmap 上的視圖，頁面由作業系統按需讀入
+            for b, v in enumerate(BankLayout(rows, W, br, bc).views(band)):
+                if files is not None:
+                    files[b].write(np.ascontiguousarray(v).data)
+                else:
+                    n = v.shape[0] * v.shape[1]
+                    sink[pos[b]:pos[b] + n] = v.reshape((n,) + px)
+                    pos[b] += n
+            if amap is not None:
+                lookup.rows(y0, rows).tofile(amap)
+            del band
+    finally:
+        for f in files or ():
+            f.close()
+        if sink is not None:
+            sink.flush()
+            del sink
+        if amap is not None:
+            amap.close()
+        del frame
+    return regions
+
+def load_stream_banks(regions, dtype=np.uint8, channels=1):
+    """把 stream_pack 回傳的區段以唯讀 memmap 打開，回傳各 bank 的陣列（不讀進記憶體）。"""
+    px = (channels,) if channels > 1 else ()
+    return [np.memmap(p, dtype=dtype, mode="r", offset=off, shape=(n,) + px) if n else np.zeros((0,) + px, dtype)
+            for p, off, n in regions]
+
+# ---- bank 衝突模擬：一個週期要同時讀的一組像素落在幾個 bank ----
+#
+# 每個 bank 每週期可讀 ports 個字；一組存取中落在同一 bank 的像素超過 ports 個就得多花週期。
+# 該組的週期數 = max(各 bank 的像素數 / ports 無條件進位)，stall = 週期數 - 1。
+
+class AccessPattern:
+    """一串「每週期要讀的像素組」。
+       平移不變的樣式（視窗、跨步列／行讀取）給 origins (n,2) 與 offsets (g,2)：第 i 組讀 origins[i] + offsets；
+       不是的（旋轉）給 coords(lo, hi)，回傳第 lo..hi-1 組的 (ys, xs, valid)，各為 (hi-lo, g) 陣列。"""
+
+    def __init__(self, name, n, size, origins=None, offsets=None, coords=None):
+        self.name, self.n, self.size = name, n, size
+        self.origins, self.offsets, self._coords = origins, offsets, coords
+
+    def coords(self, lo, hi):
+        if self._coords is not None:
+            return self._coords(lo, hi)
+        o = self.origins[lo:hi]
+        ys = o[:, :1] + self.offsets[None, :, 0]
+        xs = o[:, 1:] + self.offsets[None, :, 1]
+        return ys, xs, None
+
+def _grid(ys, xs):
+    oy, ox = np.meshgrid(np.asarray(ys, dtype=np.int64), np.asarray(xs, dtype=np.int64), indexing="ij")
+    return np.stack([oy.ravel(), ox.ravel()], axis=1)
+
+def window_pattern(H, W, k, stride=1):
+    """k x k 卷積視窗，每週期讀一整個視窗（不計行緩衝重用），輸出步長 stride。"""
+    origins = _grid(range(0, H - k + 1, stride), range(0, W - k + 1, stride))
+    return AccessPattern(f"{k}x{k} window/s{stride}", len(origins), k * k, origins, _grid(range(k), range(k)))
+
+def row_pattern(H, W, n, stride=1):
+    """沿列每週期讀 n 個像素，像素間距 stride（stride=2 即隔點抽樣）。"""
+    span = (n - 1) * stride + 1
+    origins = _grid(range(H), range(0, W - span + 1, n * stride))
+    return AccessPattern(f"row {n}px/s{stride}", len(origins), n, origins, _grid([0], range(0, span, stride)))
+
+def col_pattern(H, W, n, stride=1):
+    """沿行每週期讀 n 個像素（轉置、直向濾波），像素間距 stride。"""
+    span = (n - 1) * stride + 1
+    origins = _grid(range(0, H - span + 1, n * stride), range(W))
+    return AccessPattern(f"col {n}px/s{stride}", len(origins), n, origins, _grid(range(0, span, stride), [0]))
+
+def rotate_pattern(H, W, n, degrees):
+    """以影像中心旋轉 degrees 度（最近鄰），每週期產生同一輸出列上連續 n 個像素，各自回頭讀一個來源像素；
+       落在影像外的不讀。"""
+    per_row = (W + n - 1) // n
+    rad = np.deg2rad(degrees)
+    c, s_ = np.cos(rad), np.sin(rad)
+    cy, cx = (H - 1) / 2, (W - 1) / 2
+
+    def coords(lo, hi):
+        g = np.arange(lo, hi, dtype=np.int64)
+        yo = np.repeat((g // per_row)[:, None], n, axis=1)
+        xo = (g % per_row)[:, None] * n + np.arange(n)[None, :]
+        dy, dx = yo - cy, xo - cx
+        ys = np.rint(cy + c * dy - s_ * dx).astype(np.int64)
+        xs = np.rint(cx + s_ * dy + c * dx).astype(np.int64)
+        valid = (xo < W) & (ys >= 0) & (ys < H) & (xs >= 0) & (xs < W)
+        return ys, xs, valid
+
+    return AccessPattern(f"rotate {degrees:g}deg {n}px", H * per_row, n, coords=coords)
+
+_SIM_CHUNK = 1 << 16   # 每次向量化處理的組數，限制暫存陣列大小
+
+def _group_cycles(ys, xs, valid, br, bc, ports):
+    """每組的 (週期數, 有效像素數)。"""
+    nb = br * bc
+    b = (ys % br) * bc + xs % bc
+    if valid is not None:
+        b = np.where(valid, b, nb)   # 無效像素丟到多出來的那一格，不計
+    m = b.shape[0]
+    counts = np.bincount((b + np.arange(m)[:, None] * (nb + 1)).ravel(), minlength=m * (nb + 1))
+    counts = counts.reshape(m, nb + 1)[:, :nb]
+    return -(-counts.max(axis=1) // ports), counts.sum(axis=1)
+
+def simulate_conflicts(pattern, br=4, bc=4, ports=1):
+    """在 br x bc 交錯下跑完整個存取樣式，回傳 dict：
+       groups / pixels / cycles、pixels_per_cycle、peak（理想每週期像素數）、
+       worst_stall（單組最多多等幾個週期）、mean_stall、conflict_groups（有衝突的組數）。
+       平移不變的樣式只看起點對 (br, bc) 的餘數，同一類只算一次再乘上個數，全高畫質也只需處理 br*bc 組。"""
+    if pattern.origins is not None:
+        o = pattern.origins
+        cls = (o[:, 0] % br) * bc + o[:, 1] % bc
+        weight = np.bincount(cls, minlength=br * bc)
+        keep = np.nonzero(weight)[0]
+        reps = np.stack([keep // bc, keep % bc], axis=1)
+        ys = reps[:, :1] + pattern.offsets[None, :, 0]
+        xs = reps[:, 1:] + pattern.offsets[None, :, 1]
+        cyc, px = _group_cycles(ys, xs, None, br, bc, ports)
+        w = weight[keep]
+    else:
+        parts = [_group_cycles(*pattern.coords(lo, min(lo + _SIM_CHUNK, pattern.n)), br, bc, ports)
+                 for lo in range(0, pattern.n, _SIM_CHUNK)]
+        cyc = np.concatenate([p[0] for p in parts])
+        px = np.concatenate([p[1] for p in parts])
+        w = np.ones(len(cyc), dtype=np.int64)
+    active = px > 0
+    cycles = int((cyc * w).sum())
+    pixels = int((px * w).sum())
+    stall = np.where(active, cyc - 1, 0)
+    return {
+        "groups": int(w[active].sum()),
+        "pixels": pixels,
+        "cycles": cycles,
+        "pixels_per_cycle": pixels / cycles if cycles else 0.0,
+        "peak": pattern.size,
+        "worst_stall": int(stall.max()) if len(stall) else 0,
+        "mean_stall": float((stall * w).sum() / max(1, w[active].sum())),
+        "conflict_groups": int(w[stall > 0].sum()),
+    }
+
+def sweep_conflicts(patterns, mappings, ports=1):
+    """每個樣式 x 每組 (br, bc) 跑一次，回傳 [(樣式名稱, br, bc, 結果 dict)]。"""
+    return [(p.name, br, bc, simulate_conflicts(p, br, bc, ports)) for p in patterns for br, bc in mappings]
+
+def reference_banks(img, br, bc):
+    """以 addr_map_np 的 (bank, bank_addr) 逐像素散射出的 bank，當作與切片實作無關的對照。"""
+    H, W = img.shape[:2]
+    amap = addr_map_np(H, W, br, bc)
+    flat = img.reshape((H * W,) + img.shape[2:])
+    layout = BankLayout(H, W, br, bc)
+    banks = [np.empty((layout.length(b),) + img.shape[2:], img.dtype) for b in range(layout.n_banks)]
+    for b in range(layout.n_banks):
+        sel = amap[:, 2] == b
+        banks[b][amap[sel, 3]] = flat[sel]
+    return banks
@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+"""
+報價快取熱路徑基準：cached_close 原做法（取出 DataFrame 再 dropna().iloc[-1]）
+對比現做法（讀快取項目裡預先算好的 CloseRecord.last），以及每檔常駐記憶體。
+
+  python bench_cache.py [檔數] [每檔查詢次數]
+
+不連網：快取以仿 yfinance period='7d' 的 DataFrame 直接填好，只量查詢本身。
+"""
+
+import sys, time, tracemalloc
+
+import numpy as np
+import pandas as pd
+
+import web
+from bounded_cache import CloseRecord
+
+
+def _frame(seed, rows=7):
+    """與 Ticker.history(period='7d') 同形狀：帶時區的日期索引、OHLCV＋配息＋分割。"""
+    idx = pd.date_range(end=pd.Timestamp.today().normalize(), periods=rows, freq="B", tz="America/New_York")
+    close = 100.0 + seed + np.arange(rows, dtype="float64")
+    return pd.DataFrame({"Open": close, "High": close, "Low": close, "Close": close,
+                         "Volume": np.full(rows, 1e6), "Dividends": 0.0, "Stock Splits": 0.0}, index=idx)
+
+
+def _old_close(symbol, ttl=web._TTL_FAST):
+    """原本的 cached_close：每次都在 DataFrame 上 dropna／iloc。"""
+    for period, t in (("7d", ttl), ("1mo", max(ttl, web._TTL_NORMAL))):
+        df = web.cached_history(symbol, period=period, ttl=t)
+        if not df.empty and "Close" in df:
+            close = df["Close"].dropna()
+            if not close.empty:
+                return float(close.iloc[-1])
+    return 'N/A'
+
+
+def _us_per_lookup(fn, symbols, n):
+    for s in symbols:
+        fn(s)   # 暖身
+    t0 = time.perf_counter()
+    for _ in range(n):
+        for s in symbols:
+            fn(s)
+    return (time.perf_counter() - t0) / (n * len(symbols)) * 1e6
+
+
+def _bytes_per_symbol(build, count=200):
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    kept = [build(i) for i in range(count)]
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    size = sum(d.size_diff for d in after.compare_to(before, "filename"))
+    del kept
+    return size / count
+
+
+def main():
+    symbols = [f"SYM{i}" for i in range(int(sys.argv[1]) if len(sys.argv) > 1 else 50)]
+    n = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    now = time.time()
+    for i, s in enumerate(symbols):
+        web._set_cache(("history", s, "7d", None, None), {"ts": now, "data": _frame(i), "ttl": 10 ** 9})
+    assert all(_old_close(s) == web.cached_close(s) for s in symbols)
+
+    before = _us_per_lookup(_old_close, symbols, n)
+    after = _us_per_lookup(web.cached_close, symbols, n)
+    frames = [_frame(i) for i in range(200)]
+    for f in frames:
+        CloseRecord.from_frame(f)   # pandas 會在索引上留快取，先建好，只量紀錄本身
+    df_bytes = _bytes_per_symbol(lambda i: _frame(i))
+    rec_bytes = _bytes_per_symbol(lambda i: CloseRecord.from_frame(frames[i]))
+
+    print(f"{len(symbols)} symbols x {n} lookups")
+    print(f"  DataFrame + dropna/iloc : {before:8.2f} us / lookup")
+    print(f"  CloseRecord.last        : {after:8.2f} us / lookup")
+    print(f"  speedup                 : {before / after:8.1f}x")
+    print(f"  memory / symbol         : DataFrame {df_bytes / 1024:.1f} KB, CloseRecord {rec_bytes / 1024:.2f} KB")
+
+
+if __name__ == "__main__":
+    main()
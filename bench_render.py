@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+"""
+模板渲染 CPU 基準：每次請求 render_template_string（原做法，每次都 parse+compile）
+對比 import 時預先編譯好的 Template（現做法）。
+
+  python bench_render.py [次數]
+
+不連網：報價以固定值代替，只量模板本身。
+"""
+
+import sys, time
+
+from flask import render_template, render_template_string
+
+import web
+
+
+def _capture_args():
+    """跑一次 home()，攔下它交給模板的參數。"""
+    captured = {}
+    web.prefetch_history = lambda *a, **k: 0
+    web.cached_close = lambda symbol, ttl=None, **kw: 100.0
+    orig = web.render_template
+    def spy(tmpl, **kw):
+        captured.update(kw)
+        return orig(tmpl, **kw)
+    web.render_template = spy
+    try:
+        with web.app.test_request_context("/"):
+            web.home()
+    finally:
+        web.render_template = orig
+    return captured
+
+
+def _cpu_per_call(fn, n):
+    fn()  # 暖身
+    t0 = time.process_time()
+    for _ in range(n):
+        fn()
+    return (time.process_time() - t0) / n * 1000
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    args = _capture_args()
+    with web.app.test_request_context("/"):
+        before = _cpu_per_call(lambda: render_template_string(web.TEMPLATE, **args), n)
+        after = _cpu_per_call(lambda: render_template(web._TEMPLATE, **args), n)
+    print(f"web.TEMPLATE ({len(web.TEMPLATE.encode('utf-8')) / 1024:.1f} KB), {n} renders")
+    print(f"  render_template_string : {before:8.3f} ms CPU / request")
+    print(f"  precompiled Template   : {after:8.3f} ms CPU / request")
+    print(f"  speedup                : {before / after:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+"""
+即時串流基準：每次報價更新後，V 位觀看者「整頁重新載入」對比「開著 /stream 收差異」，
+比較每位觀看者每次更新的傳輸量與伺服器 CPU。
+
+  python bench_stream.py [觀看者數] [更新次數]
+
+不連網：以本機的假報價來源（隨機漫步）直接寫入快取，模擬背景更新器每輪帶來的新價格。
+兩種做法都不計圓餅圖圖檔本身（/charts/*.svg，資料變了才會重抓）。
+"""
+
+import os, sys, tempfile, time
+
+_tmp = tempfile.mkdtemp(prefix="bench_stream_")
+os.environ.setdefault("HISTORY_STORE_DIR", os.path.join(_tmp, "history"))
+os.environ.setdefault("SYMBOL_INDEX_PATH", os.path.join(_tmp, "symbol_index.json"))
+
+import numpy as np
+import pandas as pd
+
+import web
+
+
+class FakePriceSource:
+    """首頁所有代碼的假日線；tick() 讓其中幾檔價格隨機走一步並寫回快取。"""
+
+    def __init__(self, seed=0):
+        self.rng = np.random.default_rng(seed)
+        self.symbols = list(web._page_symbols())
+        self.price = {s: 1.0 if s.endswith("=X") and "USDTWD" not in s else 50.0 + 10 * i
+                      for i, s in enumerate(self.symbols)}
+        self.price["USDTWD=X"] = 32.0
+        for s in self.symbols:
+            self._write(s)
+
+    def _write(self, symbol):
+        idx = pd.date_range(end=pd.Timestamp.today().normalize(), periods=5, freq="B")
+        close = np.full(5, self.price[symbol])
+        df = pd.DataFrame({"Open": close, "High": close, "Low": close, "Close": close, "Volume": 1e6}, index=idx)
+        web._set_cache(("history", symbol, "7d", None, None), {"ts": time.time(), "data": df, "ttl": 10 ** 9})
+
+    def tick(self, moves=5):
+        for s in self.rng.choice(self.symbols, size=moves, replace=False):
+            self.price[s] *= 1 + self.rng.normal(0, 0.01)
+            self._write(s)
+
+
+def _reload(client, source, viewers, ticks):
+    cpu = sent = 0
+    for _ in range(ticks):
+        source.tick()
+        t0 = time.process_time()
+        for _ in range(viewers):
+            sent += len(client.get("/").data)   # 強制重新載入：不帶 If-None-Match
+        cpu += time.process_time() - t0
+    return cpu, sent
+
+
+def _stream(client, source, viewers, ticks):
+    web._refresher_warm.set()   # 由「背景更新器」（這裡是下面的 publish_stream）負責發佈
+    web._STREAM_MAX_VIEWERS = viewers   # 量的是每位觀看者的成本，不受每個 worker 的名額上限限制
+    streams = [iter(client.get("/stream", buffered=False).response) for _ in range(viewers)]
+    for it in streams:
+        next(it)   # 連上時的完整狀態
+    cpu = sent = 0
+    for _ in range(ticks):
+        source.tick()
+        t0 = time.process_time()
+        web.publish_stream()
+        for it in streams:
+            sent += len(next(it))
+        cpu += time.process_time() - t0
+    for it in streams:
+        it.close()
+    return cpu, sent
+
+
+def main():
+    viewers = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    ticks = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    source = FakePriceSource()
+    client = web.app.test_client()
+    client.get("/")   # 暖身：模板、快照
+
+    r_cpu, r_sent = _reload(client, source, viewers, ticks)
+    s_cpu, s_sent = _stream(client, source, viewers, ticks)
+    per = viewers * ticks
+    print(f"{viewers} viewers x {ticks} price updates")
+    print(f"  full reload : {r_sent / per / 1024:8.2f} KB / viewer / update, {r_cpu / per * 1000:7.3f} ms CPU / viewer / update")
+    print(f"  SSE patches : {s_sent / per / 1024:8.2f} KB / viewer / update, {s_cpu / per * 1000:7.3f} ms CPU / viewer / update")
+    print(f"  reduction   : {r_sent / s_sent:8.1f}x bytes, {r_cpu / s_cpu:8.1f}x CPU")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+"""
+有記憶體上限的行程內快取（給 web.py / portfolio.py / web_nochart.py 的報價快取共用）
+
+- 依 LRU 淘汰：總大小超過 max_bytes（環境變數 PRICE_CACHE_MAX_MB，預設 64 MB）時，
+  從最久沒被讀的項目開始丟；
+- 大小為近似值：DataFrame 以 memory_usage(index=True) 加上固定的物件開銷估算；
+- 閒置到期：超過 idle_ttl 秒沒有被 get() 過的鍵視為死鍵（例如只查過一次的 start=/end= 區間），
+  stamps() 時順手清掉，背景更新器就不會一直替它們重抓；沒有背景更新器的 app
+  在請求路徑上呼叫 maybe_expire()，最多每 EXPIRE_EVERY 秒清一次；
+- stats() 回報命中／未命中／淘汰／到期次數與目前位元組數。
+
+項目格式與原本的 dict 快取相同：{"ts", "ttl", "data"}，另外附上精簡的 "close"（CloseRecord），
+讓 cached_close 這條熱路徑只讀現成的 float，完全不碰 pandas。
+"""
+
+import os, sys, threading, time
+from collections import OrderedDict
+
+import numpy as np
+
+MAX_BYTES = int(float(os.environ.get("PRICE_CACHE_MAX_MB", "64")) * 1024 * 1024)
+IDLE_TTL = 2 * 3600       # 秒：多久沒被讀就當成死鍵
+EXPIRE_EVERY = 60         # 秒：maybe_expire() 兩次清理的最短間隔
+_ENTRY_OVERHEAD = 1024    # 位元組：DataFrame／Index／項目 dict 等物件本身的概略開銷
+
+
+class CloseRecord:
+    """
+    一檔 history 結果的收盤價精簡版：有效收盤的日期（int64 ns）與價格（float64），
+    以及預先算好的最後一筆有效收盤 last（沒有則為 None）。
+    """
+
+    __slots__ = ("dates", "closes", "last")
+
+    def __init__(self, dates, closes):
+        self.dates, self.closes = dates, closes
+        self.last = float(closes[-1]) if len(closes) else None
+
+    @classmethod
+    def from_frame(cls, df):
+        """等同 df["Close"].dropna()，只在寫入快取時做一次。"""
+        if df is None or df.empty or "Close" not in df:
+            return cls.EMPTY
+        close = df["Close"].to_numpy(dtype="float64")
+        ok = ~np.isnan(close)
+        idx = df.index
+        dates = idx.as_unit("ns").asi8[ok] if hasattr(idx, "as_unit") else np.zeros(int(ok.sum()), dtype="int64")
+        return cls(dates, close[ok])
+
+    @property
+    def nbytes(self):
+        return self.dates.nbytes + self.closes.nbytes
+
+CloseRecord.EMPTY = CloseRecord(np.zeros(0, dtype="int64"), np.zeros(0, dtype="float64"))
+
+
+def entry_bytes(entry):
+    """一個快取項目的概略大小（位元組）。"""
+    if isinstance(entry, dict):
+        data, rec = entry.get("data"), entry.get("close")
+    else:
+        data, rec = entry, None
+    size = _ENTRY_OVERHEAD + (rec.nbytes if rec is not None else 0)
+    if data is None:
+        return size
+    if hasattr(data, "memory_usage"):
+        return int(data.memory_usage(index=True).sum()) + size
+    if hasattr(data, "nbytes"):
+        return int(data.nbytes) + size
+    return sys.getsizeof(data) + size
+
+
+class BoundedCache:
+    """執行緒安全的 LRU；順序依最後一次 get()，set() 覆寫既有鍵不算一次使用。"""
+
+    def __init__(self, max_bytes=MAX_BYTES, idle_ttl=IDLE_TTL, sizeof=entry_bytes):
+        self.max_bytes = max_bytes
+        self.idle_ttl = idle_ttl
+        self._sizeof = sizeof
+        self._d = OrderedDict()   # key -> [value, size, last_used]
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0, "expired": 0}
+        self._next_expire = 0.0
+
+    def _on_set(self, old, value):
+        """子類別的掛鉤（持有鎖時呼叫）：old 為被覆寫的舊值或 None。"""
+
+    def get(self, key):
+        with self._lock:
+            slot = self._d.get(key)
+            if slot is None:
+                self._stats["misses"] += 1
+                return None
+            self._stats["hits"] += 1
+            slot[2] = time.time()
+            self._d.move_to_end(key)
+            return slot[0]
+
+    def set(self, key, value):
+        size = self._sizeof(value)
+        with self._lock:
+            slot = self._d.get(key)
+            old = slot[0] if slot else None
+            if slot:
+                self._bytes += size - slot[1]
+                slot[0], slot[1] = value, size
+            else:
+                self._d[key] = [value, size, time.time()]
+                self._bytes += size
+            self._on_set(old, value)
+            self._evict()
+        return old
+
+    def pop(self, key):
+        with self._lock:
+            slot = self._d.pop(key, None)
+            if slot is None:
+                return None
+            self._bytes -= slot[1]
+            return slot[0]
+
+    def clear(self):
+        with self._lock:
+            self._d.clear()
+            self._bytes = 0
+
+    def _evict(self):
+        # 至少留下最新的一筆，單一項目比上限還大時也不會把自己丟掉
+        while self._bytes > self.max_bytes and len(self._d) > 1:
+            _, slot = self._d.popitem(last=False)
+            self._bytes -= slot[1]
+            self._stats["evictions"] += 1
+
+    def expire_idle(self, now=None):
+        """丟掉超過 idle_ttl 沒被讀過的鍵，回傳丟掉的個數。"""
+        cutoff = (time.time() if now is None else now) - self.idle_ttl
+        with self._lock:
+            dead = [k for k, slot in self._d.items() if slot[2] < cutoff]
+            for k in dead:
+                self._bytes -= self._d.pop(k)[1]
+            self._stats["expired"] += len(dead)
+        return len(dead)
+
+    def maybe_expire(self, every=EXPIRE_EVERY, now=None):
+        """請求路徑用的 expire_idle()：距上次清理不到 every 秒就什麼都不做（回傳 0）。"""
+        now = time.time() if now is None else now
+        with self._lock:
+            if now < self._next_expire:
+                return 0
+            self._next_expire = now + every
+        return self.expire_idle(now)
+
+    def stamps(self, default_ttl=0):
+        """[(key, ts, ttl)]（先清掉死鍵），給背景更新器判斷誰快過期，不必碰 DataFrame。"""
+        self.expire_idle()
+        with self._lock:
+            return [(k, slot[0]["ts"], slot[0].get("ttl", default_ttl)) for k, slot in self._d.items()]
+
+    def keys(self):
+        with self._lock:
+            return list(self._d)
+
+    def stats(self):
+        with self._lock:
+            return {**self._stats, "bytes": self._bytes, "max_bytes": self.max_bytes}
+
+    def __len__(self):
+        with self._lock:
+            return len(self._d)
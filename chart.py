@@ -1,7 +1,116 @@
-import matplotlib.pyplot as plt
+# -*- coding: utf-8 -*-
+"""
+伺服器端圓餅圖（給 web.py 的 /charts/*.svg|png 用；也可單獨執行畫範例資料）
 
-# --- 資料準備 ---
-# 從您的圖片中整理出的投資組合數據
+- 無頭 Agg：只用 matplotlib.figure.Figure，不碰 pyplot 與 GUI 後端；
+- matplotlib 延遲到第一次真正要畫圖才 import，每個 worker 只 import 一次，沒看圖的 worker 不付這筆啟動成本；
+- 以資料雜湊快取輸出：同一組標籤／數值／格式只畫一次，之後直接回傳位元組；
+- SVG 保留文字（svg.fonttype='none'），中文字由瀏覽器字型顯示，伺服器不必裝中文字型。
+
+  python chart.py   # 把下方範例資料畫成 allocation.svg / allocation.png
+"""
+
+import hashlib, io, os, threading, time, warnings
+
+from bounded_cache import BoundedCache
+
+CACHE_MAX_BYTES = 4 * 1024 * 1024   # 已渲染圖檔的快取上限
+FORMATS = {"svg": "image/svg+xml", "png": "image/png"}
+
+# 與原本 Chart.js 設定相同的配色
+COLORS = {
+    "teal":   (75 / 255, 192 / 255, 192 / 255, 0.7),
+    "blue":   (54 / 255, 162 / 255, 235 / 255, 0.7),
+    "yellow": (255 / 255, 206 / 255, 86 / 255, 0.7),
+    "red":    (255 / 255, 99 / 255, 132 / 255, 0.7),
+    "purple": (153 / 255, 102 / 255, 255 / 255, 0.7),
+    "orange": (255 / 255, 159 / 255, 64 / 255, 0.7),
+}
+_PALETTE = list(COLORS)
+
+_FONTS = ['Microsoft JhengHei', 'PingFang TC', 'Heiti TC', 'Noto Sans CJK TC', 'DejaVu Sans', 'sans-serif']
+
+_mpl = None                         # matplotlib.figure.Figure；第一次畫圖時才載入
+_render_lock = threading.Lock()     # matplotlib 的字型／文字排版快取不是執行緒安全的
+_cache = BoundedCache(max_bytes=CACHE_MAX_BYTES)
+
+
+def _figure_class():
+    """延遲載入 matplotlib（Agg），之後重複使用。"""
+    global _mpl
+    if _mpl is None:
+        import matplotlib
+        matplotlib.use("Agg")
+        from matplotlib.figure import Figure
+        matplotlib.rcParams.update({
+            "font.sans-serif": _FONTS,
+            "axes.unicode_minus": False,   # 修正負號顯示問題
+            "svg.fonttype": "none",        # 文字留在 SVG 裡，不轉成路徑
+            "svg.hashsalt": "chart",       # 固定 SVG 內的 id，同一份資料輸出逐位元組相同
+        })
+        _mpl = Figure
+    return _mpl
+
+
+def pie_spec(title, labels, values, colors=None, currency="TWD"):
+    """一張圓餅圖的資料：(title, labels, values, colors, currency)；values 四捨五入到整數元，微小跳動不換圖。"""
+    colors = tuple(colors or _PALETTE[:len(labels)])
+    return (title, tuple(labels), tuple(int(round(float(v or 0))) for v in values), colors, currency)
+
+
+def spec_key(spec):
+    """資料雜湊：網址參數與 ETag 用。"""
+    return hashlib.sha1(repr(spec).encode("utf-8")).hexdigest()[:16]
+
+
+def _draw(spec, fmt):
+    from matplotlib import patheffects
+    title, labels, values, colors, currency = spec
+    fig = _figure_class()(figsize=(6, 6.4), dpi=100)
+    ax = fig.add_axes((0.05, 0.02, 0.9, 0.72))
+    total = sum(values)
+    if total > 0:
+        wedges, _, autotexts = ax.pie(
+            values, colors=[COLORS[c] for c in colors], startangle=90, counterclock=False,
+            wedgeprops=dict(edgecolor="white", linewidth=2),
+            autopct=lambda p: f"{p:.1f}%" if p > 2 else "",
+            textprops=dict(color="white", fontsize=14, fontweight="bold"))
+        for t in autotexts:
+            t.set_path_effects([patheffects.withStroke(linewidth=2, foreground="#333")])
+        legend = [f"{l}  {currency} {v:,.0f}" for l, v in zip(labels, values)]
+        fig.legend(wedges, legend, loc="upper center", bbox_to_anchor=(0.5, 0.93), ncols=2, frameon=False, fontsize=10)
+    else:
+        ax.text(0.5, 0.5, "無資料", ha="center", va="center", fontsize=14, color="#6c757d", transform=ax.transAxes)
+    ax.axis("equal")
+    ax.axis("off")
+    fig.suptitle(title, fontsize=18, y=0.99)
+    buf = io.BytesIO()
+    with warnings.catch_warnings():
+        warnings.filterwarnings("ignore", message=r"Glyph \d+ .* missing from font")   # PNG 在沒有中文字型的主機上
+        fig.savefig(buf, format=fmt, metadata={"Date": None} if fmt == "svg" else {"Software": None})
+    return buf.getvalue()
+
+
+def render(spec, fmt="svg"):
+    """(key, 圖檔位元組)；同一份資料與格式只畫一次。"""
+    if fmt not in FORMATS:
+        raise ValueError(f"unknown chart format: {fmt}")
+    key = spec_key(spec)
+    body = _cache.get((key, fmt))
+    if body is None:
+        with _render_lock:
+            body = _cache.get((key, fmt))   # 等鎖時別人可能已經畫好
+            if body is None:
+                body = _draw(spec, fmt)
+                _cache.set((key, fmt), body)
+    return key, body
+
+
+def stats():
+    return {**_cache.stats(), "entries": len(_cache), "matplotlib_loaded": _mpl is not None}
+
+
+# --- 範例資料（直接執行時使用） ---
 portfolio_data = {
     '台股': 3142993.46,
     '債券': 1944336.21,
@@ -14,36 +123,18 @@ portfolio_data = {
     '比特幣': 53556.44
 }
 
-# 準備圖表的標籤和對應的數值
-labels = portfolio_data.keys()
-sizes = portfolio_data.values()
-
-# --- 繪製圓餅圖 ---
-
-# 設定字體以正確顯示中文 (在 Windows/macOS 上常見的字體)
-plt.rcParams['font.sans-serif'] = ['Microsoft JhengHei', 'PingFang TC', 'Heiti TC']
-plt.rcParams['axes.unicode_minus'] = False  # 修正負號顯示問題
-
-# 建立一個圖表
-fig, ax = plt.subplots(figsize=(10, 8))
-
-# 繪製圓餅圖
-# autopct='%1.1f%%' 會將百分比顯示到小數點後一位
-# startangle=90 讓圖表從90度角開始繪製，視覺上更整齊
-wedges, texts, autotexts = ax.pie(sizes, autopct='%1.1f%%', startangle=140,
-                                  textprops=dict(color="w")) # 設定百分比文字為白色
-
-# 設定圖例 (Legend)
-ax.legend(wedges, labels,
-          title="投資項目",
-          loc="center left",
-          bbox_to_anchor=(1, 0, 0.5, 1))
-
-# 設定圖表標題
-ax.set_title("投資組合分佈圓餅圖", fontsize=16, pad=20)
-
-# 確保圓餅圖是圓形的
-ax.axis('equal')
 
-# 顯示圖表
-plt.show()
\ No newline at end of file
+if __name__ == "__main__":
+    spec = pie_spec("投資組合分佈圓餅圖", portfolio_data.keys(), portfolio_data.values(),
+                    colors=[_PALETTE[i % len(_PALETTE)] for i in range(len(portfolio_data))])
+    for fmt in FORMATS:
+        t0 = time.perf_counter()
+        _, body = render(spec, fmt)
+        cold = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        render(spec, fmt)
+        hit = time.perf_counter() - t0
+        path = os.path.abspath(f"allocation.{fmt}")
+        with open(path, "wb") as f:
+            f.write(body)
+        print(f"{path}: {len(body) / 1024:.1f} KB, first render {cold * 1000:.0f} ms, cached {hit * 1e6:.0f} us")
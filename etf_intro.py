@@ -9,9 +9,17 @@
 """
 
 
-from flask import Flask, render_template_string, request
+from flask import Flask, render_template, request
+from concurrent.futures import ThreadPoolExecutor, wait
+from functools import partial
+import os, time
 import yfinance as yf
-from datetime import datetime, timedelta, date
+import numpy as np
+import pandas as pd
+from datetime import date
+from history_store import default_store
+from price_cache import yf_history
+from symbol_index import default_index
 
 app = Flask(__name__)
 from werkzeug.middleware.proxy_fix import ProxyFix
@@ -84,39 +92,114 @@ utility_intro = {
 }
 
 # --------------------- 工具函式 ---------------------
-def calc_annualized_return(ticker, years, price):
-    """以歷史收盤價計算年化報酬率（3/5/10 年）；price 為最新價。"""
+_history_store = default_store()
+_tw_index = default_index()
+QUOTE_MAX_AGE = 60   # 秒：日線尾巴（含現價）多久向上游補一次
+# --------------------- 並行抓取 ---------------------
+# 同一個路由要的代碼一次全部送出，頁面延遲≈最慢的那一檔，而不是全部相加。
+# 每個請求有自己的一組 worker（最多 FETCH_CONCURRENCY 條）與自己的期限 FETCH_DEADLINE（秒），
+# 逾時的項目以預設值（N/A）呈現；卡住的呼叫只佔用該請求自己的 worker，不會讓之後的請求排隊。
+FETCH_CONCURRENCY = int(os.environ.get('FETCH_CONCURRENCY', 8))
+FETCH_DEADLINE = float(os.environ.get('FETCH_DEADLINE', 20))
+
+class _Expired(Exception):
+    """請求期限已過，還沒開始的項目不再執行。"""
+
+def run_all(calls, deadline=None, default=None):
+    """
+    calls: {key: 無參數 callable}。以這個請求自己的 worker 並行執行，最多等 deadline 秒；
+    期限一到就回傳，還在排隊的項目直接放棄，不再打上游。
+    回傳 {key: 結果}；失敗或逾時的 key 回 default（default 可為 callable，逐一產生）。
+    """
+    if not calls:
+        return {}
+    stop_at = time.monotonic() + (FETCH_DEADLINE if deadline is None else deadline)
+    def guarded(fn):
+        if time.monotonic() >= stop_at:
+            raise _Expired()
+        return fn()
+    pool = ThreadPoolExecutor(max_workers=min(len(calls), FETCH_CONCURRENCY), thread_name_prefix='etf-fetch')
     try:
-        end_date = datetime.today()
-        start_date = end_date - timedelta(days=365 * years)
-        hist = ticker.history(start=start_date.strftime('%Y-%m-%d'),
-                              end=end_date.strftime('%Y-%m-%d'))
-        if not hist.empty:
-            first_price = hist['Close'].iloc[0]
-            actual_years = (hist.index[-1] - hist.index[0]).days / 365.25
-            if first_price > 0 and price != 'N/A' and actual_years > 0:
-                ann_return = (price / first_price) ** (1 / actual_years) - 1
-                return f"{ann_return * 100:.2f}%"
-    except Exception:
-        pass
-    return 'N/A'
-
-def get_etf_data(etf_list, intro_dict):
+        futures = {key: pool.submit(guarded, fn) for key, fn in calls.items()}
+        done, _ = wait(futures.values(), timeout=max(stop_at - time.monotonic(), 0))
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+    out = {}
+    for key, fut in futures.items():
+        if fut in done and fut.exception() is None:
+            out[key] = fut.result()
+        else:
+            out[key] = default() if callable(default) else default
+    return out
+
+def _etf_close_series(symbol):
+    return _history_store.history(symbol, period='max', max_age=QUOTE_MAX_AGE)['Close']
+
+def _last_close(symbol):
+    hist = yf.Ticker(symbol).history(period='1d')
+    return hist['Close'].iloc[-1] if not hist.empty else 'N/A'
+
+def _ytd_history(symbol, year_start, today):
+    return yf.Ticker(symbol).history(start=year_start.strftime('%Y-%m-%d'),
+                                     end=today.strftime('%Y-%m-%d'))
+
+# 年化報酬的期間（年）；全部從同一條日線序列取錨點，不另外下載
+_HORIZON_YEARS = (1, 3, 5, 10)
+
+def calc_returns(close):
+    """
+    由單一條日線收盤序列（依日期排序）一次算出：
+      現價、當日漲跌幅、今年以來、1/3/5/10 年與成立以來的年化報酬率。
+    N 年錨點＝「距今 N*365 天當天或之後的第一根」；序列比 N 年短時回 N/A（不拿成立以來充數）。
+    今年以來錨點＝「1/1 之前最後一根」，即去年最後一個交易日的收盤；今年才成立的取第一根。
+    錨點全部以 searchsorted 一次查完。
+    """
+    out = {'price': 'N/A', 'pct': 'N/A', 'ytd': 'N/A', 'inception': 'N/A'}
+    out.update({f'{y}y': 'N/A' for y in _HORIZON_YEARS})
+    close = close.dropna()
+    if close.empty:
+        return out
+    dates = close.index.values
+    values = close.to_numpy(dtype='float64')
+    price = values[-1]
+    out['price'] = price
+    if len(values) >= 2 and values[-2] != 0:
+        out['pct'] = (price - values[-2]) / values[-2] * 100
+
+    today = np.datetime64(date.today(), 'D')
+    anchors = np.array([today - np.timedelta64(365 * y, 'D') for y in _HORIZON_YEARS]
+                       + [np.datetime64(f'{today.astype(object).year}-01-01')],
+                       dtype=dates.dtype)
+    pos = np.searchsorted(dates, anchors, side='left')
+    pos[-1] -= 1                                  # 今年以來：1/1 之前最後一根
+    pos = np.clip(pos, 0, len(values) - 1)
+    pos = np.append(pos, 0)                       # 最後一個＝成立以來（第一根）
+    first = values[pos]
+    years = (dates[-1] - dates[pos]) / np.timedelta64(1, 'D') / 365.25
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cagr = (price / first) ** (1 / years) - 1
+        simple = price / first - 1
+    ok = (first > 0) & (years > 0)
+    ok[:len(_HORIZON_YEARS)] &= dates[0] <= anchors[:len(_HORIZON_YEARS)]   # 資料不滿 N 年
+
+    for i, y in enumerate(_HORIZON_YEARS):
+        if ok[i]:
+            out[f'{y}y'] = f"{cagr[i] * 100:.2f}%"
+    if first[-2] > 0:
+        out['ytd'] = f"{simple[-2] * 100:.2f}%"   # 今年以來：不年化
+    if ok[-1]:
+        out['inception'] = f"{cagr[-1] * 100:.2f}%"
+    return out
+
+def get_etf_data(etf_list, intro_dict, closes=None):
+    """closes：{symbol: 收盤序列}，由路由先並行抓好；沒給就自己抓這份清單。"""
+    if closes is None:
+        closes = fetch_etf_closes(etf_list)
     etfs = []
     for etf in etf_list:
         symbol = etf['名稱']
-        ticker = yf.Ticker(symbol)
-        data = ticker.history(period='2d')
-        if not data.empty and len(data) >= 2:
-            prev_close = data['Close'].iloc[-2]
-            price = data['Close'].iloc[-1]
-            pct = ((price - prev_close) / prev_close * 100) if prev_close != 0 else 'N/A'
-        else:
-            price = 'N/A'
-            pct = 'N/A'
-        ann_return_3y = calc_annualized_return(ticker, 3, price)
-        ann_return_5y = calc_annualized_return(ticker, 5, price)
-        ann_return_10y = calc_annualized_return(ticker, 10, price)
+        r = calc_returns(closes[symbol])
+        price, pct = r['price'], r['pct']
         if pct != 'N/A':
             color = 'red' if pct > 0 else ('green' if pct < 0 else 'black')
         else:
@@ -128,39 +211,45 @@ def get_etf_data(etf_list, intro_dict):
             '簡介': intro_dict.get(symbol, ''),
             '現價': f"{price:.2f}" if price != 'N/A' else 'N/A',
             '漲跌幅': f"{pct:.2f}%" if pct != 'N/A' else 'N/A',
-            '年化報酬率_3y': ann_return_3y,
-            '年化報酬率_5y': ann_return_5y,
-            '年化報酬率_10y': ann_return_10y,
+            '今年以來': r['ytd'],
+            '年化報酬率_1y': r['1y'],
+            '年化報酬率_3y': r['3y'],
+            '年化報酬率_5y': r['5y'],
+            '年化報酬率_10y': r['10y'],
+            '年化報酬率_成立以來': r['inception'],
             'color': color
         })
     return etfs
 
+def fetch_etf_closes(*etf_lists):
+    """多份 ETF 清單的所有代碼一次並行抓取。"""
+    symbols = dict.fromkeys(e['名稱'] for lst in etf_lists for e in lst)
+    return run_all({sym: partial(_etf_close_series, sym) for sym in symbols},
+                   default=partial(pd.Series, dtype='float64'))
+
 def get_tw_stock_price(symbol):
-    """嘗試多種可能的台股代碼格式，取最新收盤價。"""
-    possible_symbols = [
+    """嘗試多種可能的台股代碼格式，取最新收盤價；解析結果與不存在的後綴記在 _tw_index。"""
+    base = symbol.replace('.TW', '')
+    possible_symbols = list(dict.fromkeys([
         symbol,
-        symbol.replace('.TW', ''),
+        base,
         symbol.replace('.TW', '.TWO'),
         symbol.replace('.TW', '.TW:US'),
-    ]
-    for sym in possible_symbols:
+    ]))
+    misses = []
+    for sym in _tw_index.order(base, possible_symbols):
         try:
-            ticker = yf.Ticker(sym)
-            hist = ticker.history(period='1d')
+            hist = yf_history(sym, period='1d')   # 查無資料回空表；傳輸失敗才丟例外
             if not hist.empty:
+                _tw_index.record(base, sym, misses)
                 return hist['Close'].iloc[-1]
         except Exception:
-            continue
+            continue   # 例外是網路問題，不算「不存在」
+        misses.append(sym)
     return 'N/A'
 
-# --------------------- 路由：ETF介紹 ---------------------
-@app.route('/')
-def index():
-    bond_data = get_etf_data(bond_etfs, bond_intro)
-    index_data = get_etf_data(index_etfs, index_intro)
-    precious_data = get_etf_data(precious_etfs, precious_intro)
-    utility_data = get_etf_data(utility_etfs, utility_intro)
-    html = '''
+# --------------------- 模板（import 時編譯一次） ---------------------
+INDEX_TEMPLATE = '''
     <html>
     <head>
         <div style="display:flex; gap:16px; margin-bottom:16px;">
@@ -187,8 +276,8 @@ def index():
             <h2>指數ETF</h2>
             <table>
                 <tr>
-                    <th>名稱</th><th>類型</th><th>現價</th><th>當日漲跌幅</th>
-                    <th>年化報酬率(3年)</th><th>年化報酬率(5年)</th><th>年化報酬率(10年)</th>
+                    <th>名稱</th><th>類型</th><th>現價</th><th>當日漲跌幅</th><th>今年以來</th>
+                    <th>年化報酬率(1年)</th><th>年化報酬率(3年)</th><th>年化報酬率(5年)</th><th>年化報酬率(10年)</th><th>年化報酬率(成立以來)</th>
                     <th>內扣費</th><th>簡介</th>
                 </tr>
                 {% for etf in index_data %}
@@ -197,9 +286,12 @@ def index():
                     <td>{{ etf['類型'] }}</td>
                     <td style="color: {{ etf['color'] }}; font-weight: bold;">{{ etf['現價'] }}</td>
                     <td style="color: {{ etf['color'] }}; font-weight: bold;">{{ etf['漲跌幅'] }}</td>
+                    <td>{{ etf['今年以來'] }}</td>
+                    <td>{{ etf['年化報酬率_1y'] }}</td>
                     <td>{{ etf['年化報酬率_3y'] }}</td>
                     <td>{{ etf['年化報酬率_5y'] }}</td>
                     <td>{{ etf['年化報酬率_10y'] }}</td>
+                    <td>{{ etf['年化報酬率_成立以來'] }}</td>
                     <td>{{ etf['內扣費'] }}</td>
                     <td>{{ etf['簡介'] }}</td>
                 </tr>
@@ -209,8 +301,8 @@ def index():
             <h2>債券ETF</h2>
             <table>
                 <tr>
-                    <th>名稱</th><th>類型</th><th>現價</th><th>當日漲跌幅</th>
-                    <th>年化報酬率(3年)</th><th>年化報酬率(5年)</th><th>年化報酬率(10年)</th>
+                    <th>名稱</th><th>類型</th><th>現價</th><th>當日漲跌幅</th><th>今年以來</th>
+                    <th>年化報酬率(1年)</th><th>年化報酬率(3年)</th><th>年化報酬率(5年)</th><th>年化報酬率(10年)</th><th>年化報酬率(成立以來)</th>
                     <th>內扣費</th><th>簡介</th>
                 </tr>
                 {% for etf in bond_data %}
@@ -219,9 +311,12 @@ def index():
                     <td>{{ etf['類型'] }}</td>
                     <td style="color: {{ etf['color'] }}; font-weight: bold;">{{ etf['現價'] }}</td>
                     <td style="color: {{ etf['color'] }}; font-weight: bold;">{{ etf['漲跌幅'] }}</td>
+                    <td>{{ etf['今年以來'] }}</td>
+                    <td>{{ etf['年化報酬率_1y'] }}</td>
                     <td>{{ etf['年化報酬率_3y'] }}</td>
                     <td>{{ etf['年化報酬率_5y'] }}</td>
                     <td>{{ etf['年化報酬率_10y'] }}</td>
+                    <td>{{ etf['年化報酬率_成立以來'] }}</td>
                     <td>{{ etf['內扣費'] }}</td>
                     <td>{{ etf['簡介'] }}</td>
                 </tr>
@@ -231,8 +326,8 @@ def index():
             <h2>貴金屬ETF</h2>
             <table>
                 <tr>
-                    <th>名稱</th><th>類型</th><th>現價</th><th>當日漲跌幅</th>
-                    <th>年化報酬率(3年)</th><th>年化報酬率(5年)</th><th>年化報酬率(10年)</th>
+                    <th>名稱</th><th>類型</th><th>現價</th><th>當日漲跌幅</th><th>今年以來</th>
+                    <th>年化報酬率(1年)</th><th>年化報酬率(3年)</th><th>年化報酬率(5年)</th><th>年化報酬率(10年)</th><th>年化報酬率(成立以來)</th>
                     <th>內扣費</th><th>簡介</th>
                 </tr>
                 {% for etf in precious_data %}
@@ -241,9 +336,12 @@ def index():
                     <td>{{ etf['類型'] }}</td>
                     <td style="color: {{ etf['color'] }}; font-weight: bold;">{{ etf['現價'] }}</td>
                     <td style="color: {{ etf['color'] }}; font-weight: bold;">{{ etf['漲跌幅'] }}</td>
+                    <td>{{ etf['今年以來'] }}</td>
+                    <td>{{ etf['年化報酬率_1y'] }}</td>
                     <td>{{ etf['年化報酬率_3y'] }}</td>
                     <td>{{ etf['年化報酬率_5y'] }}</td>
                     <td>{{ etf['年化報酬率_10y'] }}</td>
+                    <td>{{ etf['年化報酬率_成立以來'] }}</td>
                     <td>{{ etf['內扣費'] }}</td>
                     <td>{{ etf['簡介'] }}</td>
                 </tr>
@@ -253,8 +351,8 @@ def index():
             <h2>公用事業ETF</h2>
             <table>
                 <tr>
-                    <th>名稱</th><th>類型</th><th>現價</th><th>當日漲跌幅</th>
-                    <th>年化報酬率(3年)</th><th>年化報酬率(5年)</th><th>年化報酬率(10年)</th>
+                    <th>名稱</th><th>類型</th><th>現價</th><th>當日漲跌幅</th><th>今年以來</th>
+                    <th>年化報酬率(1年)</th><th>年化報酬率(3年)</th><th>年化報酬率(5年)</th><th>年化報酬率(10年)</th><th>年化報酬率(成立以來)</th>
                     <th>內扣費</th><th>簡介</th>
                 </tr>
                 {% for etf in utility_data %}
@@ -263,9 +361,12 @@ def index():
                     <td>{{ etf['類型'] }}</td>
                     <td style="color: {{ etf['color'] }}; font-weight: bold;">{{ etf['現價'] }}</td>
                     <td style="color: {{ etf['color'] }}; font-weight: bold;">{{ etf['漲跌幅'] }}</td>
+                    <td>{{ etf['今年以來'] }}</td>
+                    <td>{{ etf['年化報酬率_1y'] }}</td>
                     <td>{{ etf['年化報酬率_3y'] }}</td>
                     <td>{{ etf['年化報酬率_5y'] }}</td>
                     <td>{{ etf['年化報酬率_10y'] }}</td>
+                    <td>{{ etf['年化報酬率_成立以來'] }}</td>
                     <td>{{ etf['內扣費'] }}</td>
                     <td>{{ etf['簡介'] }}</td>
                 </tr>
@@ -274,146 +375,24 @@ def index():
         </div>
     </body>
     </html>
-    '''
-    return render_template_string(html,
-                                  bond_data=bond_data,
-                                  index_data=index_data,
-                                  precious_data=precious_data,
-                                  utility_data=utility_data)
-
-# --------------------- 路由：投資組合 & 自選股績效 ---------------------
-@app.route('/portfolio')
-def portfolio():
-    # 美股投資組合
-    us_portfolio = [
-        {'symbol': 'SGOV',  'shares': 1200,  'cost': 100.40},
-        {'symbol': 'VOO',   'shares': 70.00, 'cost': 506.75},
-        # {'symbol': 'SPMO', 'shares': 60,    'cost': 114.2},
-        {'symbol': 'VEA',   'shares': 86.80, 'cost': 53.55},
-        {'symbol': 'GLD',   'shares': 16.55,  'cost': 300.10},
-        {'symbol': 'TLT',   'shares': 224.7, 'cost': 92.22},
-        {'symbol': 'BOXX',  'shares': 100,   'cost': 110.71},
-        {'symbol': 'UNH',   'shares': 22,    'cost': 310.86},
-        {'symbol': 'GOOGL', 'shares': 72,'cost': 174.71},
-        {'symbol': 'NVDA',  'shares': 32,    'cost': 120.92},
-        {'symbol': 'MSTR',  'shares': 10,    'cost': 399.34},
-        # {'symbol': 'PYPL',  'shares': 25,    'cost': 69.51},
-        {'symbol': 'XLU',   'shares': 45.32,  'cost': 84.23},
-        {'symbol': 'QCOM',  'shares': 3,     'cost': 148.51},
-        {'symbol': 'KO',    'shares': 74.47, 'cost': 68.00},
-        {'symbol': 'AEP',   'shares': 12,    'cost': 103.05},
-        # {'symbol': 'CB',    'shares': 3,     'cost': 271.52},
-        {'symbol': 'DUK',   'shares': 14,    'cost': 115.43},
-        {'symbol': 'MCD',   'shares': 10,    'cost': 299.23},
-        {'symbol': 'CEG',   'shares': 1,    'cost': 314.69},
-            {'symbol': 'LEU',   'shares': 1,    'cost': 214.64},
-            {'symbol': 'PYPL',   'shares': 26,    'cost': 69.41},
-        {'symbol': 'TSM',   'shares': 2,    'cost': 227.8},
-
-        {'symbol': 'EWT',   'shares': 100,    'cost': 61.27},
-        {'symbol': 'SNPS',   'shares': 4,    'cost': 397.15},
-        {'symbol': 'YUM',   'shares': 1,    'cost': 141.34},
-
-        {'symbol': 'XLU',   'shares': 87.71,    'cost': 83.80},
-        {'symbol': 'VT',   'shares': 50,    'cost': 133.69},
-
-
-
-    ]
-
-    # 台股投資組合
-    tw_portfolio = [
-        {'symbol': '0050.TW',   'shares': 10637, 'cost': 41.58},
-        {'symbol': '006208.TW', 'shares': 9000,  'cost': 112.67},
-        {'symbol': '00713.TW',  'shares': 10427, 'cost': 54.4},
-        {'symbol': '00687B.TW', 'shares': 25000, 'cost': 31.59},
-    ]
-
-    # 匯率（USD/TWD）
-    try:
-        usd_twd_hist = yf.Ticker('USDTWD=X').history(period='1d')
-        exchange_rate = usd_twd_hist['Close'].iloc[-1] if not usd_twd_hist.empty else 31.5
-    except Exception:
-        exchange_rate = 31.5
-
-    # ---- 美股即時數據
-    us_total_market_value = 0
-    for item in us_portfolio:
-        ticker = yf.Ticker(item['symbol'])
-        hist = ticker.history(period='1d')
-        price = hist['Close'].iloc[-1] if not hist.empty else 'N/A'
-        market_value = price * item['shares'] if price != 'N/A' else 0
-        item['price'] = price
-        item['market_value'] = market_value
-        item['profit'] = market_value - item['cost'] * item['shares'] if price != 'N/A' else 0
-        item['profit_pct'] = (item['profit'] / (item['cost'] * item['shares']) * 100) if price != 'N/A' else 0
-        us_total_market_value += market_value
-
-    # ---- 台股即時數據
-    tw_total_market_value = 0
-    for item in tw_portfolio:
-        price = get_tw_stock_price(item['symbol'])
-        market_value = price * item['shares'] if price != 'N/A' else 0
-        item['price'] = price
-        item['market_value'] = market_value
-        item['profit'] = market_value - item['cost'] * item['shares'] if price != 'N/A' else 0
-        item['profit_pct'] = (item['profit'] / (item['cost'] * item['shares']) * 100) if price != 'N/A' else 0
-        tw_total_market_value += market_value
-
-    # 排序
-    us_portfolio.sort(key=lambda x: x['market_value'], reverse=True)
-    tw_portfolio.sort(key=lambda x: x['market_value'], reverse=True)
-
-    # 各市場總結（全部持倉）
-    us_total_cost = sum(item['cost'] * item['shares'] for item in us_portfolio)
-    us_total_profit = sum(item['profit'] for item in us_portfolio)
-    us_total_profit_pct = (us_total_profit / us_total_cost * 100) if us_total_cost else 0
-
-    tw_total_cost = sum(item['cost'] * item['shares'] for item in tw_portfolio)
-    tw_total_profit = sum(item['profit'] for item in tw_portfolio)
-    tw_total_profit_pct = (tw_total_profit / tw_total_cost * 100) if tw_total_cost else 0
-
-    # ===== 自選股績效（排除 EXCLUDED_ETFS_US）=====
-    us_core = [it for it in us_portfolio if it['symbol'] not in EXCLUDED_ETFS_US]
-    us_core_total_market_value = sum(it['market_value'] for it in us_core)
-    us_core_total_cost = sum(it['cost'] * it['shares'] for it in us_core)
-    us_core_total_profit = sum(it['profit'] for it in us_core)
-    us_core_total_profit_pct = (us_core_total_profit / us_core_total_cost * 100) if us_core_total_cost else 0
-
-    # ===== 切換：是否隱藏 ETF（影響表格 & 佔比分母）=====
-    hide_etf = request.args.get('hide_etf') in ('1', 'true', 'on', 'yes')
-    us_table = us_core if hide_etf else us_portfolio
-    us_denominator = (us_core_total_market_value if hide_etf else us_total_market_value)
-
-    # 轉台幣（總覽仍以「全部持倉」計）
-    total_market_value_twd = (us_total_market_value * exchange_rate) + tw_total_market_value
-    total_cost_twd = (us_total_cost * exchange_rate) + tw_total_cost
-    total_profit_twd = (us_total_profit * exchange_rate) + tw_total_profit
-    total_profit_pct = (total_profit_twd / total_cost_twd * 100) if total_cost_twd else 0
-
-    # 今年以來績效（VOO、0050）
-    today = date.today()
-    year_start = date(today.year, 1, 1)
-
-    voo_hist = yf.Ticker('VOO').history(start=year_start.strftime('%Y-%m-%d'),
-                                        end=today.strftime('%Y-%m-%d'))
-    if not voo_hist.empty:
-        sp500_ytd = (voo_hist['Close'].iloc[-1] - voo_hist['Close'].iloc[0]) / voo_hist['Close'].iloc[0] * 100
-        sp500_ytd_str = f"{sp500_ytd:.2f}%"
-        sp500_color = 'red' if sp500_ytd > 0 else ('green' if sp500_ytd < 0 else 'black')
-    else:
-        sp500_ytd_str, sp500_color = 'N/A', 'black'
-
-    tw50_hist = yf.Ticker('0050.TW').history(start=year_start.strftime('%Y-%m-%d'),
-                                             end=today.strftime('%Y-%m-%d'))
-    if not tw50_hist.empty:
-        tw50_ytd = (tw50_hist['Close'].iloc[-1] - tw50_hist['Close'].iloc[0]) / tw50_hist['Close'].iloc[0] * 100
-        tw50_ytd_str = f"{tw50_ytd:.2f}%"
-        tw50_color = 'red' if tw50_ytd > 0 else ('green' if tw50_ytd < 0 else 'black')
-    else:
-        tw50_ytd_str, tw50_color = 'N/A', 'black'
+'''
+_INDEX_TEMPLATE = app.jinja_env.from_string(INDEX_TEMPLATE)
 
-    html = '''
+# --------------------- 路由：ETF介紹 ---------------------
+@app.route('/')
+def index():
+    closes = fetch_etf_closes(bond_etfs, index_etfs, precious_etfs, utility_etfs)
+    bond_data = get_etf_data(bond_etfs, bond_intro, closes)
+    index_data = get_etf_data(index_etfs, index_intro, closes)
+    precious_data = get_etf_data(precious_etfs, precious_intro, closes)
+    utility_data = get_etf_data(utility_etfs, utility_intro, closes)
+    return render_template(_INDEX_TEMPLATE,
+                           bond_data=bond_data,
+                           index_data=index_data,
+                           precious_data=precious_data,
+                           utility_data=utility_data)
+
+PORTFOLIO_TEMPLATE = '''
     <html>
     <head>
         <title>Chink's Portfolio</title>
@@ -588,9 +567,145 @@ def portfolio():
         </div>
     </body>
     </html>
-    '''
-    return render_template_string(
-        html,
+'''
+_PORTFOLIO_TEMPLATE = app.jinja_env.from_string(PORTFOLIO_TEMPLATE)
+
+# --------------------- 路由：投資組合 & 自選股績效 ---------------------
+@app.route('/portfolio')
+def portfolio():
+    # 美股投資組合
+    us_portfolio = [
+        {'symbol': 'SGOV',  'shares': 1200,  'cost': 100.40},
+        {'symbol': 'VOO',   'shares': 70.00, 'cost': 506.75},
+        # {'symbol': 'SPMO', 'shares': 60,    'cost': 114.2},
+        {'symbol': 'VEA',   'shares': 86.80, 'cost': 53.55},
+        {'symbol': 'GLD',   'shares': 16.55,  'cost': 300.10},
+        {'symbol': 'TLT',   'shares': 224.7, 'cost': 92.22},
+        {'symbol': 'BOXX',  'shares': 100,   'cost': 110.71},
+        {'symbol': 'UNH',   'shares': 22,    'cost': 310.86},
+        {'symbol': 'GOOGL', 'shares': 72,'cost': 174.71},
+        {'symbol': 'NVDA',  'shares': 32,    'cost': 120.92},
+        {'symbol': 'MSTR',  'shares': 10,    'cost': 399.34},
+        # {'symbol': 'PYPL',  'shares': 25,    'cost': 69.51},
+        {'symbol': 'XLU',   'shares': 45.32,  'cost': 84.23},
+        {'symbol': 'QCOM',  'shares': 3,     'cost': 148.51},
+        {'symbol': 'KO',    'shares': 74.47, 'cost': 68.00},
+        {'symbol': 'AEP',   'shares': 12,    'cost': 103.05},
+        # {'symbol': 'CB',    'shares': 3,     'cost': 271.52},
+        {'symbol': 'DUK',   'shares': 14,    'cost': 115.43},
+        {'symbol': 'MCD',   'shares': 10,    'cost': 299.23},
+        {'symbol': 'CEG',   'shares': 1,    'cost': 314.69},
+            {'symbol': 'LEU',   'shares': 1,    'cost': 214.64},
+            {'symbol': 'PYPL',   'shares': 26,    'cost': 69.41},
+        {'symbol': 'TSM',   'shares': 2,    'cost': 227.8},
+
+        {'symbol': 'EWT',   'shares': 100,    'cost': 61.27},
+        {'symbol': 'SNPS',   'shares': 4,    'cost': 397.15},
+        {'symbol': 'YUM',   'shares': 1,    'cost': 141.34},
+
+        {'symbol': 'XLU',   'shares': 87.71,    'cost': 83.80},
+        {'symbol': 'VT',   'shares': 50,    'cost': 133.69},
+
+
+
+    ]
+
+    # 台股投資組合
+    tw_portfolio = [
+        {'symbol': '0050.TW',   'shares': 10637, 'cost': 41.58},
+        {'symbol': '006208.TW', 'shares': 9000,  'cost': 112.67},
+        {'symbol': '00713.TW',  'shares': 10427, 'cost': 54.4},
+        {'symbol': '00687B.TW', 'shares': 25000, 'cost': 31.59},
+    ]
+
+    # 本頁所有報價（美股、台股、匯率、今年以來）一次並行送出
+    today = date.today()
+    year_start = date(today.year, 1, 1)
+    calls = {('us', it['symbol']): partial(_last_close, it['symbol']) for it in us_portfolio}
+    calls.update({('tw', it['symbol']): partial(get_tw_stock_price, it['symbol']) for it in tw_portfolio})
+    calls['fx'] = partial(_last_close, 'USDTWD=X')
+    calls.update({('ytd', sym): partial(_ytd_history, sym, year_start, today) for sym in ('VOO', '0050.TW')})
+    got = run_all(calls)   # 失敗／逾時的項目為 None
+
+    # 匯率（USD/TWD）
+    exchange_rate = got['fx'] if got['fx'] not in (None, 'N/A') else 31.5
+
+    # ---- 美股即時數據
+    us_total_market_value = 0
+    for item in us_portfolio:
+        price = got[('us', item['symbol'])]
+        price = 'N/A' if price is None else price
+        market_value = price * item['shares'] if price != 'N/A' else 0
+        item['price'] = price
+        item['market_value'] = market_value
+        item['profit'] = market_value - item['cost'] * item['shares'] if price != 'N/A' else 0
+        item['profit_pct'] = (item['profit'] / (item['cost'] * item['shares']) * 100) if price != 'N/A' else 0
+        us_total_market_value += market_value
+
+    # ---- 台股即時數據
+    tw_total_market_value = 0
+    for item in tw_portfolio:
+        price = got[('tw', item['symbol'])]
+        price = 'N/A' if price is None else price
+        market_value = price * item['shares'] if price != 'N/A' else 0
+        item['price'] = price
+        item['market_value'] = market_value
+        item['profit'] = market_value - item['cost'] * item['shares'] if price != 'N/A' else 0
+        item['profit_pct'] = (item['profit'] / (item['cost'] * item['shares']) * 100) if price != 'N/A' else 0
+        tw_total_market_value += market_value
+
+    # 排序
+    us_portfolio.sort(key=lambda x: x['market_value'], reverse=True)
+    tw_portfolio.sort(key=lambda x: x['market_value'], reverse=True)
+
+    # 各市場總結（全部持倉）
+    us_total_cost = sum(item['cost'] * item['shares'] for item in us_portfolio)
+    us_total_profit = sum(item['profit'] for item in us_portfolio)
+    us_total_profit_pct = (us_total_profit / us_total_cost * 100) if us_total_cost else 0
+
+    tw_total_cost = sum(item['cost'] * item['shares'] for item in tw_portfolio)
+    tw_total_profit = sum(item['profit'] for item in tw_portfolio)
+    tw_total_profit_pct = (tw_total_profit / tw_total_cost * 100) if tw_total_cost else 0
+
+    # ===== 自選股績效（排除 EXCLUDED_ETFS_US）=====
+    us_core = [it for it in us_portfolio if it['symbol'] not in EXCLUDED_ETFS_US]
+    us_core_total_market_value = sum(it['market_value'] for it in us_core)
+    us_core_total_cost = sum(it['cost'] * it['shares'] for it in us_core)
+    us_core_total_profit = sum(it['profit'] for it in us_core)
+    us_core_total_profit_pct = (us_core_total_profit / us_core_total_cost * 100) if us_core_total_cost else 0
+
+    # ===== 切換：是否隱藏 ETF（影響表格 & 佔比分母）=====
+    hide_etf = request.args.get('hide_etf') in ('1', 'true', 'on', 'yes')
+    us_table = us_core if hide_etf else us_portfolio
+    us_denominator = (us_core_total_market_value if hide_etf else us_total_market_value)
+
+    # 轉台幣（總覽仍以「全部持倉」計）
+    total_market_value_twd = (us_total_market_value * exchange_rate) + tw_total_market_value
+    total_cost_twd = (us_total_cost * exchange_rate) + tw_total_cost
+    total_profit_twd = (us_total_profit * exchange_rate) + tw_total_profit
+    total_profit_pct = (total_profit_twd / total_cost_twd * 100) if total_cost_twd else 0
+
+    # 今年以來績效（VOO、0050）
+    voo_hist = got[('ytd', 'VOO')]
+    voo_hist = pd.DataFrame() if voo_hist is None else voo_hist
+    if not voo_hist.empty:
+        sp500_ytd = (voo_hist['Close'].iloc[-1] - voo_hist['Close'].iloc[0]) / voo_hist['Close'].iloc[0] * 100
+        sp500_ytd_str = f"{sp500_ytd:.2f}%"
+        sp500_color = 'red' if sp500_ytd > 0 else ('green' if sp500_ytd < 0 else 'black')
+    else:
+        sp500_ytd_str, sp500_color = 'N/A', 'black'
+
+    tw50_hist = got[('ytd', '0050.TW')]
+    tw50_hist = pd.DataFrame() if tw50_hist is None else tw50_hist
+    if not tw50_hist.empty:
+        tw50_ytd = (tw50_hist['Close'].iloc[-1] - tw50_hist['Close'].iloc[0]) / tw50_hist['Close'].iloc[0] * 100
+        tw50_ytd_str = f"{tw50_ytd:.2f}%"
+        tw50_color = 'red' if tw50_ytd > 0 else ('green' if tw50_ytd < 0 else 'black')
+    else:
+        tw50_ytd_str, tw50_color = 'N/A', 'black'
+
+    return render_template(
+        _PORTFOLIO_TEMPLATE,
         # 原本變數
         us_portfolio=us_portfolio,
         tw_portfolio=tw_portfolio,
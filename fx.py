@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+"""
+匯率矩陣（給 web.py 用）
+
+只抓「美元兌各幣」這組基準匯價（USDTWD=X、USDJPY=X …，可與其他報價併成同一批 yf.download），
+任意兩幣的交叉匯率一律以美元三角換算，不再逐對查詢 AUDTWD=X、JPYTWD=X。
+多一種幣別只多一個基準代碼，不多一次往返。
+"""
+
+import numpy as np
+
+BASE = "USD"
+
+
+def base_symbol(currency):
+    """某幣別的基準匯價代碼（1 美元兌多少該幣）。"""
+    return f"{BASE}{currency}=X"
+
+
+def base_symbols(currencies):
+    return [base_symbol(c) for c in dict.fromkeys(currencies) if c != BASE]
+
+
+class FxMatrix:
+    """
+    usd_value[i]：1 單位 currencies[i] 值多少美元（NaN 代表取不到）。
+    matrix[i, j]：1 單位 currencies[i] 換成多少 currencies[j]。
+    """
+
+    def __init__(self, usd_value):
+        self.currencies = list(usd_value)
+        self.pos = {c: i for i, c in enumerate(self.currencies)}
+        self.usd_value = np.array([usd_value[c] for c in self.currencies], dtype='float64')
+        with np.errstate(divide='ignore', invalid='ignore'):
+            self.matrix = self.usd_value[:, None] / self.usd_value[None, :]
+
+    @classmethod
+    def from_quotes(cls, currencies, quote, fallback=None):
+        """
+        quote(symbol) → float 或 'N/A'；每個基準代碼只呼叫一次。
+        fallback：{幣別: 1 美元兌多少該幣}，基準匯價取不到時使用。
+        """
+        fallback = fallback or {}
+        usd_value = {BASE: 1.0}
+        for c in dict.fromkeys(currencies):
+            if c == BASE:
+                continue
+            q = quote(base_symbol(c))
+            per_usd = float(q) if q not in ('N/A', None) and float(q) > 0 else fallback.get(c, np.nan)
+            usd_value[c] = 1.0 / per_usd
+        return cls(usd_value)
+
+    def rate(self, frm, to, default=np.nan):
+        r = self.matrix[self.pos[frm], self.pos[to]] if frm in self.pos and to in self.pos else np.nan
+        return float(default if np.isnan(r) else r)
+
+    def convert(self, amounts, currencies, to, default=np.nan):
+        """amounts（各自以 currencies 計價）整欄換成 to；取不到的匯率以 default 代替。"""
+        col = self.matrix[:, self.pos[to]]
+        r = col[[self.pos[c] for c in currencies]] if len(currencies) else np.zeros(0)
+        return np.asarray(amounts, dtype='float64') * np.where(np.isnan(r), default, r)
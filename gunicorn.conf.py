@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+"""
+gunicorn 設定（gunicorn 會自動讀取工作目錄下的 gunicorn.conf.py）
+
+背景價格更新器不在 import 時啟動：每個 worker 載入 app 之後，
+才呼叫該 app 模組的 start_refresher()（web.py、portfolio.py 有；其他 app 沒有就略過）。
+設定環境變數 PRICE_REFRESHER=0 可關閉。
+"""
+
+import os, sys
+
+
+def post_worker_init(worker):
+    if os.environ.get("PRICE_REFRESHER", "1") == "0":
+        return
+    uri = getattr(worker.app, "app_uri", None) or worker.cfg.wsgi_app or ""
+    module = sys.modules.get(uri.split(":")[0])
+    start = getattr(module, "start_refresher", None)
+    if start is not None:
+        start()
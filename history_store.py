@@ -0,0 +1,253 @@
+# -*- coding: utf-8 -*-
+"""
+本機日線 OHLCV 歷史庫（給 web.py / etf_intro.py 共用）
+
+- 每個代碼一個 .npz：日期（int64 ns）與各欄位各自一個陣列，讀寫都不經 pickle。
+- 只向 yfinance 補抓「最後一根之後」的資料（含最後一根，因為當日 K 棒盤中會變）；
+  查詢更早的區間時才往前回補一次。
+- 價格是還原權值後的：新 K 棒帶來本機沒記到的除權息／分割時，更早的價格全部作廢重抓。
+- period= / start= / end= 查詢全部在本機切片；重啟後直接讀檔即可服務。
+
+目錄：環境變數 HISTORY_STORE_DIR，預設為本檔旁的 .history/
+"""
+
+import os, re, threading, time
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+from price_cache import yf_history
+
+STORE_DIR = os.environ.get("HISTORY_STORE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".history"))
+
+_FIELDS = ("Open", "High", "Low", "Close", "Volume", "Dividends", "Stock Splits")
+_SINCE_INCEPTION = np.iinfo("int64").min   # covered_from 的特殊值：已抓過 period='max'
+_PERIOD_RE = re.compile(r"^(\d+)(d|wk|mo|y)$")
+
+
+def _today():
+    return pd.Timestamp(datetime.today().date())
+
+def _to_day(ts):
+    """任意日期表示 → 不含時區的當日 00:00（日線以交易日為鍵）。"""
+    ts = pd.Timestamp(ts)
+    if ts.tzinfo is not None:
+        ts = ts.tz_localize(None)
+    return ts.normalize()
+
+def _normalize(df):
+    """yfinance 的 history()（帶交易所時區）與 download()（無時區）統一成以日期為索引。"""
+    if df is None or df.empty:
+        return pd.DataFrame(columns=list(_FIELDS), dtype="float64")
+    idx = df.index
+    if isinstance(idx, pd.DatetimeIndex) and idx.tz is not None:
+        idx = idx.tz_localize(None)
+    out = pd.DataFrame(index=pd.DatetimeIndex(idx).normalize().as_unit("ns"))
+    for f in _FIELDS:
+        out[f] = df[f].to_numpy(dtype="float64") if f in df else 0.0
+    out.index.name = "Date"
+    out = out[out["Close"].notna() | out["Open"].notna()]
+    return out[~out.index.duplicated(keep="last")].sort_index()
+
+def _window(period, start, end):
+    """
+    查詢 → (需要的起日, 迄日(不含), 只取最後幾根)。
+    'Nd' 依 Yahoo 的習慣視為「最近 N 根」，起日只是保守的回補下限。
+    """
+    today = _today()
+    stop = _to_day(end) if end is not None else None
+    if period is None:
+        return (_to_day(start) if start is not None else None), stop, None
+    if period == "max":
+        return None, stop, None
+    if period == "ytd":
+        return pd.Timestamp(today.year, 1, 1), stop, None
+    m = _PERIOD_RE.match(period)
+    if not m:
+        raise ValueError(f"unsupported period: {period!r}")
+    n, unit = int(m.group(1)), m.group(2)
+    if unit == "d":
+        return today - timedelta(days=n * 2 + 7), stop, n
+    if unit == "wk":
+        return today - timedelta(weeks=n), stop, None
+    if unit == "mo":
+        return today - pd.DateOffset(months=n), stop, None
+    return today - pd.DateOffset(years=n), stop, None
+
+def _span_start(period):
+    """Yahoo 回傳的 period 結果實際涵蓋的起日（append 用）；'Nd' 是最近 N 個日曆天。"""
+    if period == "max":
+        return None
+    want_start, _, tail = _window(period, None, None)
+    return _today() - timedelta(days=tail) if tail else want_start
+
+def _actions(df):
+    return df[(df["Dividends"] != 0) | (df["Stock Splits"] != 0)]
+
+def _new_actions(df, got):
+    """got 裡有 df 沒記到的除權息／分割嗎？有的話 df 裡的還原價格都已過時。"""
+    acts = _actions(got)
+    if acts.empty or df is None or df.empty:
+        return False
+    old = df.reindex(acts.index).fillna(0.0)
+    return bool(((old["Dividends"] != acts["Dividends"]) | (old["Stock Splits"] != acts["Stock Splits"])).any())
+
+
+class HistoryStore:
+    """以代碼為鍵的日線庫；同一代碼的讀寫以各自的鎖序列化，多 worker 靠原子換檔共用。"""
+
+    def __init__(self, root=STORE_DIR, fetch=None):
+        self.root = root
+        self._fetch = fetch or self._fetch_yf
+        self._mem = {}                # symbol -> (mtime, df, covered_from_ns, synced_at)
+        self._locks = {}
+        self._locks_guard = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    # ---- 上游 ----
+    @staticmethod
+    def _fetch_yf(symbol, start=None, end=None):
+        """查無資料回空表；傳輸失敗往外丟（見 price_cache.yf_history）。"""
+        if start is None:
+            return yf_history(symbol, period="max")
+        return yf_history(symbol, start=start.strftime("%Y-%m-%d"),
+                          end=end.strftime("%Y-%m-%d") if end is not None else None)
+
+    # ---- 磁碟 ----
+    def _lock(self, symbol):
+        with self._locks_guard:
+            return self._locks.setdefault(symbol, threading.Lock())
+
+    def _path(self, symbol):
+        return os.path.join(self.root, re.sub(r"[^A-Za-z0-9._=-]", "_", symbol) + ".npz")
+
+    def _load(self, symbol):
+        path = self._path(symbol)
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            return None, None, 0.0
+        hit = self._mem.get(symbol)
+        if hit and hit[0] == mtime:
+            return hit[1:]
+        with np.load(path, allow_pickle=False) as z:
+            df = pd.DataFrame({f: z[f"f{i}"] for i, f in enumerate(_FIELDS)},
+                              index=pd.DatetimeIndex(z["dates"].astype("datetime64[ns]"), name="Date"))
+            covered_from, synced_at = int(z["covered_from"]), float(z["synced_at"])
+        self._mem[symbol] = (mtime, df, covered_from, synced_at)
+        return df, covered_from, synced_at
+
+    def _save(self, symbol, df, covered_from, synced_at):
+        path = self._path(symbol)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        arrays = {f"f{i}": df[f].to_numpy(dtype="float64") for i, f in enumerate(_FIELDS)}
+        with open(tmp, "wb") as fh:
+            np.savez(fh, dates=df.index.as_unit("ns").asi8, covered_from=np.int64(covered_from),
+                     synced_at=np.float64(synced_at), **arrays)
+        os.replace(tmp, path)
+        self._mem[symbol] = (os.stat(path).st_mtime_ns, df, covered_from, synced_at)
+
+    # ---- 查詢 ----
+    def _covers(self, df, covered_from, want_start, tail=None):
+        if df is None or df.empty:
+            return False
+        if want_start is None:
+            return covered_from == _SINCE_INCEPTION
+        if tail and covered_from <= (_today() - timedelta(days=tail)).value:
+            return True   # 'Nd'：已涵蓋 Yahoo 同一查詢會回的最近 N 個日曆天（例如 append 進來的批次結果）
+        return covered_from <= want_start.value
+
+    @staticmethod
+    def _slice(df, want_start, stop, tail):
+        out = df
+        if want_start is not None and tail is None:
+            out = out[out.index >= want_start]
+        if stop is not None:
+            out = out[out.index < stop]
+        return out.tail(tail) if tail else out
+
+    def peek(self, symbol, *, period=None, start=None, end=None, max_age=0):
+        """只看本機：範圍已涵蓋且 max_age 秒內同步過才回傳切片，否則回 None（不打上游）。"""
+        want_start, stop, tail = _window(period, start, end)
+        with self._lock(symbol):
+            df, covered_from, synced_at = self._load(symbol)
+        if not self._covers(df, covered_from, want_start, tail):
+            return None
+        if stop is None and time.time() - synced_at >= max_age:
+            return None
+        return self._slice(df, want_start, stop, tail)
+
+    def history(self, symbol, *, period=None, start=None, end=None, max_age=0):
+        """
+        與 Ticker.history 相同的查詢方式。缺的區間（往前回補／最後一根之後）才打上游，
+        其餘在本機切片；只查過去區間（有 end）時不需補尾巴。上游例外直接往外丟。
+        """
+        want_start, stop, tail = _window(period, start, end)
+        with self._lock(symbol):
+            df, covered_from, synced_at = self._load(symbol)
+            now = time.time()
+            changed = synced_now = False
+            if not self._covers(df, covered_from, want_start, tail):
+                first = df.index[0] if df is not None and not df.empty else None
+                got = _normalize(self._fetch(symbol, want_start, first + timedelta(days=1) if first is not None else None))
+                if got.empty and first is None:
+                    return got
+                df = got if df is None else pd.concat([got[got.index < first], df])
+                covered_from = _SINCE_INCEPTION if want_start is None else want_start.value
+                if first is None:   # 第一次抓就一路抓到今天，尾巴不用再補
+                    synced_at, synced_now = now, True
+                changed = True
+            need_tail = stop is None or stop > df.index[-1] + timedelta(days=1)
+            if need_tail and not synced_now and now - synced_at >= max_age:
+                got = _normalize(self._fetch(symbol, df.index[-1], None))
+                if _new_actions(df, got):
+                    # 新的除權息／分割：本機的還原價格全部過時，整段重抓
+                    start = None if covered_from == _SINCE_INCEPTION else pd.Timestamp(covered_from)
+                    full = _normalize(self._fetch(symbol, start, None))
+                    if not full.empty:
+                        df = got = full
+                if not got.empty:
+                    df = pd.concat([df[df.index < got.index[0]], got])
+                synced_at = now
+                changed = True
+            if changed:
+                self._save(symbol, df, covered_from, synced_at)
+        return self._slice(df, want_start, stop, tail)
+
+    def append(self, symbol, frame, period=None):
+        """
+        把外部已抓到的近期 K 棒（例如批次 yf.download 的結果）併入；
+        只有和既有資料銜接得上（或本機還沒資料）時才寫，避免中間留洞。
+        period 是 frame 對應的查詢：frame 就是該區間的完整結果，之後同樣的 peek 不必上網。
+        frame 帶來本機沒記到的除權息／分割時，丟掉更早的（還原價格已過時）K 棒，需要時再回補。
+        """
+        got = _normalize(frame)
+        if got.empty:
+            return False
+        start = got.index[0].value
+        if period is not None:
+            span = _span_start(period)
+            start = _SINCE_INCEPTION if span is None else min(start, span.value)
+        with self._lock(symbol):
+            df, covered_from, _ = self._load(symbol)
+            if df is None or df.empty or _new_actions(df, got):
+                df, covered_from = got, start
+            elif got.index[0] <= df.index[-1]:
+                df = pd.concat([df[df.index < got.index[0]], got])
+                covered_from = min(covered_from, start)
+            else:
+                return False
+            self._save(symbol, df, covered_from, time.time())
+        return True
+
+
+_default = None
+_default_guard = threading.Lock()
+
+def default_store():
+    """每個行程共用一個 HistoryStore（目錄見 STORE_DIR）。"""
+    global _default
+    with _default_guard:
+        if _default is None:
+            _default = HistoryStore()
+        return _default
@@ -0,0 +1,191 @@
+# -*- coding: utf-8 -*-
+"""
+欄式持倉估值引擎（給 web.py 用）
+
+每個部位（book）載入成平行的 NumPy 陣列：代碼、數量、成本價、幣別；
+同一代碼的多筆稅批（lot）只查一次價，再以 inverse index 展開回每一列。
+市值／損益／權重／分組小計都是整欄運算，字串格式化延到模板真正讀取時才做。
+"""
+
+import numpy as np
+
+
+class Book:
+    """
+    一個部位的持倉表。rows 為 [{'symbol','shares' 或 'amount','cost'}, ...]。
+    fmt：各欄位的顯示格式（callable），只在渲染時呼叫。
+    """
+
+    def __init__(self, rows, amount_key='shares', currency='USD', fmt=None):
+        self.amount_key = amount_key
+        self.symbols = np.array([r['symbol'] for r in rows], dtype=object)
+        self.qty = np.array([r[amount_key] for r in rows], dtype='float64')
+        self.cost = np.array([r['cost'] for r in rows], dtype='float64')
+        self.currency = np.array([r.get('currency', currency) for r in rows], dtype=object)
+        # 原始輸入值留給顯示用（整數股數與浮點數的字串格式不同）
+        self.qty_raw = [r[amount_key] for r in rows]
+        self.cost_raw = [r['cost'] for r in rows]
+        self.cost_total = self.qty * self.cost
+        if len(rows):
+            self.uniq, self.inv = np.unique(self.symbols.astype(str), return_inverse=True)
+        else:
+            self.uniq, self.inv = np.array([], dtype=str), np.array([], dtype='intp')
+        self.fmt = {**USD_FMT, **(fmt or {})}
+
+    def __len__(self):
+        return len(self.symbols)
+
+    def value(self, price_of):
+        """price_of(symbol) → float 或 'N/A'；每個不重複代碼只呼叫一次。"""
+        prices = np.array([_as_float(price_of(s)) for s in self.uniq], dtype='float64')
+        return self.value_with(prices)
+
+    def value_with(self, prices):
+        """prices 對齊 self.uniq（NaN 代表取不到價）。"""
+        return Valuation(self, prices[self.inv] if len(self) else np.zeros(0))
+
+    def mask_not_in(self, symbols):
+        return ~np.isin(self.symbols, list(symbols))
+
+    def group_codes(self, groups):
+        """groups：依優先順序的代碼集合；不屬於任何一組的歸到最後一組（len(groups)）。"""
+        conds = [np.isin(self.symbols, list(g)) for g in groups]
+        return np.select(conds, list(range(len(groups))), default=len(groups)) if conds else np.zeros(len(self), int)
+
+
+class Valuation:
+    """Book × 價格向量 的估值結果（全部為整欄陣列）。"""
+
+    def __init__(self, book, price, mask=None):
+        self.book = book
+        self.mask = np.ones(len(book), dtype=bool) if mask is None else mask
+        self.price = price
+        self.priced = ~np.isnan(price)
+        ok = self.priced & (book.cost_total != 0)
+        self.market_value = np.where(ok, np.nan_to_num(price) * book.qty, 0.0)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            self.profit_pct = np.where(ok, (self.market_value - book.cost_total) / book.cost_total * 100, 0.0)
+        m = self.mask
+        self.total_market_value = float(self.market_value[m].sum())
+        self.total_cost = float(book.cost_total[m].sum())
+        self.total_profit = self.total_market_value - self.total_cost
+        self.total_profit_pct = (self.total_profit / self.total_cost * 100) if self.total_cost else 0.0
+
+    def subset(self, mask):
+        return Valuation(self.book, self.price, self.mask & mask)
+
+    def group_totals(self, groups):
+        """各組市值小計（最後一個為「其他」）。"""
+        codes = self.book.group_codes(groups)[self.mask]
+        return np.bincount(codes, weights=self.market_value[self.mask], minlength=len(groups) + 1)
+
+    def _order(self):
+        idx = np.flatnonzero(self.mask)
+        return idx[np.argsort(-self.market_value[idx], kind='stable')]
+
+    def rows(self, weight_denominator=None):
+        """依市值由大到小排序的列（lazy 格式化）；給定分母時附上佔比。"""
+        return [Row(self, i, weight_denominator) for i in self._order()]
+
+    def columns(self):
+        """與 rows() 同順序的整欄資料（給 API／CSV／Arrow）；取不到價的 price 為 NaN。"""
+        order, b = self._order(), self.book
+        return {
+            'symbol': b.symbols[order].astype(str),
+            'currency': b.currency[order].astype(str),
+            b.amount_key: b.qty[order],
+            'cost': b.cost[order],
+            'price': self.price[order],
+            'market_value': self.market_value[order],
+            'profit_pct': self.profit_pct[order],
+        }
+
+    def totals(self):
+        return {
+            'market_value': self.total_market_value, 'cost': self.total_cost,
+            'profit': self.total_profit, 'profit_pct': self.total_profit_pct,
+        }
+
+
+class Row:
+    """表格的一列；模板讀到 *_str 時才格式化。"""
+
+    __slots__ = ('_v', '_i', '_w')
+
+    def __init__(self, valuation, i, weight_denominator=None):
+        self._v, self._i, self._w = valuation, i, weight_denominator
+
+    def __getitem__(self, key):
+        return getattr(self, key)
+
+    @property
+    def symbol(self):
+        return self._v.book.symbols[self._i]
+
+    @property
+    def price(self):
+        return float(self._v.price[self._i]) if self._v.priced[self._i] else 'N/A'
+
+    @property
+    def cost(self):
+        return self._v.book.cost_raw[self._i]
+
+    @property
+    def shares(self):
+        return self._v.book.qty_raw[self._i]
+
+    amount = shares
+
+    @property
+    def market_value(self):
+        return float(self._v.market_value[self._i])
+
+    @property
+    def profit_pct(self):
+        return float(self._v.profit_pct[self._i])
+
+    @property
+    def price_str(self):
+        p = self.price
+        return self._v.book.fmt['price'](p) if p != 'N/A' else 'N/A'
+
+    @property
+    def cost_str(self):
+        return self._v.book.fmt['cost'](self.cost)
+
+    @property
+    def shares_str(self):
+        return self._v.book.fmt['qty'](self.shares)
+
+    amount_str = shares_str
+
+    @property
+    def mv_str(self):
+        return self._v.book.fmt['mv'](self.market_value)
+
+    @property
+    def profit_pct_str(self):
+        return f"{self.profit_pct:.2f}%" if self._v.priced[self._i] else 'N/A'
+
+    @property
+    def weight_str(self):
+        return f"{(self.market_value / self._w * 100):.2f}%" if self._w else ''
+
+
+def _as_float(p):
+    return np.nan if p == 'N/A' or p is None else float(p)
+
+
+# 顯示格式（沿用各表原本的寫法）
+USD_FMT = {
+    'price': lambda p: f"{p:,.2f}",
+    'cost':  lambda c: f"{c:,.2f}",
+    'qty':   lambda q: f"{q:,.4f}".rstrip('0').rstrip('.'),
+    'mv':    lambda v: f"{v:,.2f}",
+}
+TWD_FMT = {
+    'price': lambda p: f"{p:.2f}",
+    'cost':  lambda c: f"{c:.2f}",
+    'qty':   lambda q: f"{q:,}".rstrip('0').rstrip('.'),
+    'mv':    lambda v: f"{v:,.0f}",
+}
@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+"""
+交易時段感知的快取 TTL（給 web.py / portfolio.py / web_nochart.py 共用）
+
+收盤後到下一次開盤之間價格不會變，不必每分鐘重抓：
+- 美股（NYSE/Nasdaq）：紐約時間 09:30–16:00，含半日市；
+- 台股（TWSE/TPEx）：台北時間 09:00–13:30；
+- 外匯／期貨（=X / =F）：紐約時間週日 17:00 至週五 17:00；
+- 加密貨幣（-USD）：全天候。
+
+在盤中（含收盤後 GRACE 緩衝，等報價商補齊最後一根）照原本的 TTL；
+休市時抓到的資料可一路用到下一次開盤，但最多 CLOSED_TTL_CAP 秒
+（假日表漏列／臨時停市如颱風假時，最壞也只舊這麼久）。
+
+假日表內建於下方 _US_HOLIDAYS / _TW_HOLIDAYS，每年年底依交易所公告補上隔年；
+表上沒有的年份只看週末。
+
+  python market_calendar.py   # 模擬一週，比較固定 TTL 與依時段 TTL 的上游呼叫次數
+"""
+
+from datetime import date, datetime, time as dtime, timedelta
+from functools import lru_cache
+from zoneinfo import ZoneInfo
+
+CLOSED_TTL_CAP = 3 * 3600   # 秒：休市時延長 TTL 的上限
+
+_NY = ZoneInfo("America/New_York")
+_TPE = ZoneInfo("Asia/Taipei")
+
+# NYSE 全日休市
+_US_HOLIDAYS = {
+    "2025-01-01", "2025-01-09", "2025-01-20", "2025-02-17", "2025-04-18", "2025-05-26",
+    "2025-06-19", "2025-07-04", "2025-09-01", "2025-11-27", "2025-12-25",
+    "2026-01-01", "2026-01-19", "2026-02-16", "2026-04-03", "2026-05-25", "2026-06-19",
+    "2026-07-03", "2026-09-07", "2026-11-26", "2026-12-25",
+    "2027-01-01", "2027-01-18", "2027-02-15", "2027-03-26", "2027-05-31", "2027-06-18",
+    "2027-07-05", "2027-09-06", "2027-11-25", "2027-12-24",
+}
+# NYSE 半日市（13:00 收盤）
+_US_EARLY_CLOSE = {
+    "2025-07-03", "2025-11-28", "2025-12-24",
+    "2026-11-27", "2026-12-24",
+    "2027-11-26",
+}
+# 證交所休市（含農曆年前後無交易日與補假）
+_TW_HOLIDAYS = {
+    "2025-01-01", "2025-01-23", "2025-01-24", "2025-01-27", "2025-01-28", "2025-01-29",
+    "2025-01-30", "2025-01-31", "2025-02-28", "2025-04-03", "2025-04-04", "2025-05-01",
+    "2025-05-30", "2025-09-29", "2025-10-06", "2025-10-10", "2025-10-24", "2025-12-25",
+    "2026-01-01", "2026-02-12", "2026-02-13", "2026-02-16", "2026-02-17", "2026-02-18",
+    "2026-02-19", "2026-02-20", "2026-02-27", "2026-04-03", "2026-04-06", "2026-05-01",
+    "2026-06-19", "2026-09-25", "2026-09-28", "2026-10-09", "2026-10-26", "2026-12-25",
+}
+
+
+class Session:
+    """單一交易所的日盤：開收盤時間（當地時區）、假日、半日市。"""
+
+    def __init__(self, tz, open_, close, holidays=(), early_close=(), early_close_at=None, grace=1800):
+        self.tz = tz
+        self.open, self.close = open_, close
+        self.holidays = {date.fromisoformat(d) for d in holidays}
+        self.early_close = {date.fromisoformat(d) for d in early_close}
+        self.early_close_at = early_close_at
+        self.grace = grace
+
+    def _trades(self, d):
+        return d.weekday() < 5 and d not in self.holidays
+
+    def _bounds(self, d):
+        close = self.early_close_at if d in self.early_close else self.close
+        return (datetime.combine(d, self.open, self.tz).timestamp(),
+                datetime.combine(d, close, self.tz).timestamp() + self.grace)
+
+    def next_open(self, t):
+        """t（epoch 秒）時若在盤中（含緩衝）回 None，否則回下一次開盤的 epoch 秒。"""
+        d = datetime.fromtimestamp(t, self.tz).date()
+        for i in range(15):
+            day = d + timedelta(days=i)
+            if not self._trades(day):
+                continue
+            opens, closes = self._bounds(day)
+            if t < opens:
+                return opens
+            if t < closes:
+                return None
+        return None   # 連續兩週沒有交易日：多半是假日表有誤，照一般 TTL
+
+
+class WeeklySession:
+    """週日晚上開到週五收的連續盤（外匯、期貨），以紐約時間 17:00 為界。"""
+
+    def __init__(self, tz=_NY, roll=dtime(17, 0), grace=1800):
+        self.tz, self.roll, self.grace = tz, roll, grace
+
+    def next_open(self, t):
+        now = datetime.fromtimestamp(t, self.tz)
+        friday = now.date() - timedelta(days=(now.weekday() - 4) % 7)
+        closes = datetime.combine(friday, self.roll, self.tz).timestamp() + self.grace
+        opens = datetime.combine(friday + timedelta(days=2), self.roll, self.tz).timestamp()
+        return opens if closes <= t < opens else None
+
+
+class AlwaysOpen:
+    def next_open(self, t):
+        return None
+
+
+US = Session(_NY, dtime(9, 30), dtime(16, 0), _US_HOLIDAYS, _US_EARLY_CLOSE, dtime(13, 0))
+TW = Session(_TPE, dtime(9, 0), dtime(13, 30), _TW_HOLIDAYS, grace=2700)   # Yahoo 台股報價延遲約 20 分鐘
+FX = WeeklySession()
+CRYPTO = AlwaysOpen()
+
+
+def session_for(symbol):
+    """yfinance 代碼 → 所屬交易時段。"""
+    s = symbol.upper()
+    if s.endswith("-USD"):
+        return CRYPTO
+    if s.endswith("=X") or s.endswith("=F"):
+        return FX
+    if s.endswith((".TW", ".TWO", ".TPE")) or s[:1].isdigit():
+        return TW
+    return US
+
+
+@lru_cache(maxsize=8192)
+def expires_at(symbol, fetched_at, ttl):
+    """
+    在 fetched_at 抓到的資料何時過期：盤中為 fetched_at + ttl；
+    休市時延到下一次開盤（不短於 ttl，不長於 CLOSED_TTL_CAP）。
+    同一筆快取項目每次查詢的參數都一樣，結果記起來，熱路徑上不必重算時區。
+    """
+    opens = session_for(symbol).next_open(fetched_at)
+    if opens is None:
+        return fetched_at + ttl
+    return min(max(opens, fetched_at + ttl), fetched_at + max(ttl, CLOSED_TTL_CAP))
+
+
+def _simulate(symbol, ttl, start, days=7, step=10):
+    """以 step 秒為刻度模擬每次到期就重抓，回傳 (固定 TTL 次數, 依時段次數)。"""
+    end = start + days * 86400
+    fixed = int((end - start) // ttl)
+    n, t, exp = 0, start, start
+    while t < end:
+        if t >= exp:
+            n += 1
+            exp = expires_at(symbol, t, ttl)
+        t += step
+    return fixed, n
+
+
+if __name__ == "__main__":
+    monday = datetime(2026, 10, 12, tzinfo=_TPE).timestamp()
+    total_fixed = total = 0
+    print("一週上游呼叫次數（每檔；合計依 web.py 首頁的代碼組成加權）")
+    # (代表代碼, TTL, 首頁上同類代碼的檔數)
+    for symbol, ttl, count in (("VOO", 60, 38), ("0050.TW", 60, 3), ("BTC-USD", 60, 4), ("USDTWD=X", 3600, 4)):
+        fixed, n = _simulate(symbol, ttl, monday)
+        total_fixed, total = total_fixed + fixed * count, total + n * count
+        print(f"  {symbol:<10} ttl={ttl:<5} ×{count:<3} 固定 {fixed:6d}  依時段 {n:6d}  (-{(1 - n / fixed) * 100:.0f}%)")
+    print(f"  合計 固定 {total_fixed}  依時段 {total}  (-{(1 - total / total_fixed) * 100:.0f}%)")
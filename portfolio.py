@@ -9,12 +9,11 @@ Render（建議 Start Command）：
   gunicorn portfolio:app --bind 0.0.0.0:$PORT --access-logfile - --error-logfile - --timeout 120 --forwarded-allow-ips='*'
 """
 
-from flask import Flask, render_template_string
+from flask import Flask, render_template
 from datetime import datetime
 from werkzeug.middleware.proxy_fix import ProxyFix
-import yfinance as yf
-import pandas as pd
-import threading, time, os, logging
+import time, os, logging
+from price_cache import REFRESH_AHEAD, PriceCache, Refresher, fresh
 from pytz import timezone
 
 app = Flask(__name__)
@@ -87,46 +86,40 @@ FULL_PORTFOLIO = [
 # ================== 輕量 TTL 快取 ==================
 _TTL_FAST   = 60        # 1 分鐘：即時/當日
 _TTL_NORMAL = 300       # 5 分鐘：一般
-_cache = {}
-_cache_lock = threading.Lock()
 
 def _now(): return time.time()
-def _get_cache(key):
-    with _cache_lock:
-        return _cache.get(key)
-def _set_cache(key, value):
-    with _cache_lock:
-        _cache[key] = value
-
-def cached_history(symbol, *, period=None, start=None, end=None, ttl=_TTL_NORMAL):
-    """以 TTL 記憶 yfinance history；抓失敗時回上次成功的舊值（stale）。"""
-    key = ("history", symbol, period, start, end)
-    entry = _get_cache(key)
+_fresh = fresh
+
+# 記憶體快取、single-flight 與快取項目的取用路徑見 price_cache；
+# 背景更新器暖機後，請求端只讀記憶體，過期的舊值由更新器負責換新
+_prices = PriceCache(serve_stale=lambda: _refresher_warm.is_set(), normal_ttl=_TTL_NORMAL)
+_cache = _prices.backend
+_get_cache, _set_cache = _prices.get, _prices.set
+_fetch_history, _cached_entry = _prices.fetch, _prices.entry
+cached_history, cached_close = _prices.history, _prices.close
+
+# ================== 背景價格更新器（見 price_cache.Refresher） ==================
+def _refresh_once():
+    """跑一輪：先補齊自選股的 7d 快取，再依各鍵自己的 TTL 提前更新。"""
+    for sym in dict.fromkeys(r['symbol'] for r in FULL_PORTFOLIO if r['symbol'] not in EXCLUDED_ETFS_US):
+        if _get_cache(("history", sym, "7d", None, None)) is None:
+            try:
+                _fetch_history(sym, period="7d", ttl=_TTL_FAST)
+            except Exception:
+                pass
     now = _now()
-    if entry and (now - entry["ts"] < ttl) and entry["data"] is not None:
-        return entry["data"]
-    try:
-        tkr = yf.Ticker(symbol)
-        df = tkr.history(period=period) if period else tkr.history(start=start, end=end)
-        _set_cache(key, {"ts": now, "data": df})
-        return df
-    except Exception:
-        if entry and entry["data"] is not None:
-            return entry["data"]
-        return pd.DataFrame()
-
-def cached_close(symbol, ttl=_TTL_FAST):
-    """
-    取最近一筆有效收盤價：先試 7d，再退 1mo；各自帶 TTL。
-    避免假日／停牌導致 period='1d' 為空而報「possibly delisted」。
-    """
-    for period, t in (("7d", ttl), ("1mo", max(ttl, _TTL_NORMAL))):
-        df = cached_history(symbol, period=period, ttl=t)
-        if not df.empty and "Close" in df:
-            close = df["Close"].dropna()
-            if not close.empty:
-                return float(close.iloc[-1])
-    return 'N/A'
+    for key, ts, ttl in _cache.stamps(_TTL_NORMAL):
+        _, sym, period, start, end = key
+        if _fresh(sym, ts, ttl, now, REFRESH_AHEAD):
+            continue
+        try:
+            _fetch_history(sym, period=period, start=start, end=end, ttl=ttl)
+        except Exception:
+            pass  # 保留舊值，下一輪再試
+
+_refresher = Refresher(_refresh_once)
+_refresher_warm = _refresher.warm
+start_refresher = _refresher.start
 
 # ================== HTML 模板（僅自選股） ==================
 TEMPLATE = r"""
@@ -195,6 +188,7 @@ TEMPLATE = r"""
 </body>
 </html>
 """
+_TEMPLATE = app.jinja_env.from_string(TEMPLATE)   # import 時編譯一次，請求只做 render
 
 # ================== 路由 ==================
 @app.route("/")
@@ -246,8 +240,8 @@ def watchlist_only():
     # 排序（市值大到小）
     core_items.sort(key=lambda x: x["market_value"], reverse=True)
 
-    return render_template_string(
-        TEMPLATE,
+    return render_template(
+        _TEMPLATE,
         updated_at_tw=updated_at_tw,
 
         core_items=core_items,
@@ -257,11 +251,15 @@ def watchlist_only():
         core_total_pct=core_total_pct,
     )
 
+app.add_url_rule("/cache/stats", "cache_stats", _prices.stats)
+
 @app.get("/health")
 def health():
     return {"status": "ok"}
 
 # 本機執行（Render 用 gunicorn，不會跑到這裡）
 if __name__ == "__main__":
+    if os.environ.get("PRICE_REFRESHER", "1") != "0":
+        start_refresher()
     port = int(os.environ.get("PORT", 5000))
     app.run(host="0.0.0.0", port=port, debug=False)
@@ -0,0 +1,234 @@
+# -*- coding: utf-8 -*-
+"""
+報價快取的取用路徑（給 web.py / portfolio.py / web_nochart.py 共用）
+
+- 快取項目：{"ts", "ttl", "data", "close"}，close 為精簡的 CloseRecord（見 bounded_cache）；
+- fresh()：TTL 依交易時段延長（見 market_calendar），ahead < 1 代表提前視為過期；
+- single-flight：同一個鍵同時 miss 時只讓第一個呼叫者（leader）打上游，其餘等它的結果；
+- 抓取失敗時回上次成功的舊值，沒有舊值回標記 failed 的空項目；
+  「上游正常回應但沒有資料」才是真的空，呼叫端可以據此判斷代碼不存在（見 yf_history / close(strict=True)）；
+- Refresher：背景價格更新器，在 TTL 到期前先重抓，請求端不用等 yfinance。
+
+後端預設是 BoundedCache（有位元組上限的 LRU，閒置的鍵會自動到期），loader 預設直接打 yfinance（yf_history）；
+web.py 換成 SQLiteCache 與經本機歷史庫的 loader。各 app 只提供「一輪要更新什麼」（refresh_once），其餘都在這裡。
+"""
+
+import logging, threading, time
+from contextlib import contextmanager
+
+import pandas as pd
+import yfinance as yf
+from yfinance.exceptions import YFInvalidPeriodError, YFTickerMissingError
+
+from bounded_cache import BoundedCache, CloseRecord
+from market_calendar import expires_at
+
+TTL_FAST   = 60     # 1 分鐘：即時／當日
+TTL_NORMAL = 300    # 5 分鐘：一般
+
+REFRESH_INTERVAL = 10     # 秒：背景更新器每輪檢查間隔
+REFRESH_AHEAD    = 0.8    # 存活超過 TTL 的 80% 就提前更新
+
+# 上游正常回應「查無資料」的例外；其餘例外（逾時、DNS、HTTP 錯誤、限流）都是傳輸失敗。
+# 只有在 hide_exceptions=False 時才成立：預設 yfinance 會把傳輸失敗吞掉，之後再丟 YFTzMissingError 之類的「查無資料」。
+_NO_DATA = (YFTickerMissingError, YFInvalidPeriodError)
+_surface_lock = threading.Lock()
+_surfacing = 0       # 目前有幾個 yf_history 需要 yfinance 把例外丟出來（受 _surface_lock 保護）
+_saved_hide = True   # 第一個進來前的原設定
+
+
+class FetchError(Exception):
+    """抓不到資料，但原因是傳輸失敗（或斷路器打開），不代表上游沒有這個代碼。"""
+
+
+@contextmanager
+def _surface_exceptions():
+    """
+    呼叫期間關掉 yfinance 的 debug.hide_exceptions（行程共用的設定）。
+    以計數處理並行：第一個進來的關、最後一個離開的還原，期間不會被別的呼叫者提早打開。
+    """
+    global _surfacing, _saved_hide
+    with _surface_lock:
+        if _surfacing == 0:
+            _saved_hide = yf.config.debug.hide_exceptions
+            yf.config.debug.hide_exceptions = False
+        _surfacing += 1
+    try:
+        yield
+    finally:
+        with _surface_lock:
+            _surfacing -= 1
+            if _surfacing == 0:
+                yf.config.debug.hide_exceptions = _saved_hide
+
+
+def yf_history(symbol, period=None, start=None, end=None):
+    """
+    Ticker.history，但把兩種「空」分開：查無資料回空表，傳輸失敗往外丟。
+    yfinance 預設兩者都吞成空表（見 _surface_exceptions）。
+    """
+    tkr = yf.Ticker(symbol)
+    kw = {"period": period} if period else {"start": start, "end": end}
+    with _surface_exceptions():
+        try:
+            return tkr.history(**kw)
+        except _NO_DATA:
+            return pd.DataFrame()
+
+
+def fresh(symbol, ts, ttl, now=None, ahead=1.0):
+    """ts 抓到的資料現在還能用嗎？休市期間依交易時段延長；ahead < 1 代表提前視為過期。"""
+    return (time.time() if now is None else now) < expires_at(symbol, ts, ttl) - ttl * (1 - ahead)
+
+
+def empty_entry(failed=False):
+    """failed=True：抓取失敗或被斷路器擋下（不寫入快取），與上游正常回應的空表區分。"""
+    return {"ts": 0.0, "ttl": 0, "data": pd.DataFrame(), "close": CloseRecord.EMPTY, "failed": failed}
+
+
+class _Flight:
+    __slots__ = ("done", "data")
+    def __init__(self):
+        self.done = threading.Event()
+        self.data = None
+
+
+class PriceCache:
+    """
+    backend：有 get(key) / set(key, value) / stats() 的快取後端，預設 BoundedCache()。
+    loader(symbol, period, start, end) → DataFrame；拋例外代表這次抓取失敗。預設 yf_history。
+    serve_stale()：回 True 時過期的舊值直接回傳、不打上游（背景更新器暖機後由它負責換新）。
+    allow(symbol)：回 False 時不打上游（斷路器），有舊值回舊值，否則回空項目。
+    """
+
+    def __init__(self, backend=None, loader=yf_history, *, serve_stale=None, allow=None, normal_ttl=TTL_NORMAL):
+        self.backend = BoundedCache() if backend is None else backend
+        self._loader = loader
+        self._serve_stale = serve_stale or (lambda: False)
+        self._allow = allow or (lambda symbol: True)
+        self.normal_ttl = normal_ttl
+        self._lock = threading.Lock()   # 保護 _inflight 與 _stats
+        self._inflight = {}             # key -> _Flight
+        self._stats = {"fetches": 0, "collapsed": 0}   # 實際打上游的次數／被合併掉的重複抓取
+
+    def get(self, key):
+        return self.backend.get(key)
+
+    def set(self, key, value):
+        value["close"] = CloseRecord.from_frame(value["data"])
+        self.backend.set(key, value)
+
+    def fetch(self, symbol, *, period=None, start=None, end=None, ttl=TTL_NORMAL):
+        """實際打上游並寫入快取（不看 TTL），回傳寫入的項目；例外交由呼叫端處理。"""
+        df = self._loader(symbol, period, start, end)
+        entry = {"ts": time.time(), "data": df, "ttl": ttl}
+        self.set(("history", symbol, period, start, end), entry)
+        return entry
+
+    def _join(self, key):
+        """回傳 (flight, is_leader)；leader 負責抓取，其餘呼叫者等它的結果。"""
+        with self._lock:
+            flight = self._inflight.get(key)
+            if flight is not None:
+                self._stats["collapsed"] += 1
+                return flight, False
+            flight = self._inflight[key] = _Flight()
+            return flight, True
+
+    def _land(self, key, flight, data):
+        flight.data = data
+        with self._lock:
+            self._inflight.pop(key, None)
+        flight.done.set()
+
+    def entry(self, symbol, *, period=None, start=None, end=None, ttl=TTL_NORMAL):
+        """整個快取項目（含 "close"）；抓取失敗時為舊項目或空項目。"""
+        key = ("history", symbol, period, start, end)
+        entry = self.get(key)
+        if entry and entry["data"] is not None and (fresh(symbol, entry["ts"], ttl) or self._serve_stale()):
+            return entry
+        if not self._allow(symbol):
+            return entry if entry and entry["data"] is not None else empty_entry(failed=True)
+        flight, leader = self._join(key)
+        if not leader:
+            flight.done.wait()
+            return flight.data
+        # leader：抓成功回新值；失敗時把舊值（或空表）同樣分給所有等待者
+        result = empty_entry(failed=True)
+        try:
+            # 前一個 leader 可能剛寫回快取，再確認一次以免重抓（這條路不算一次抓取）
+            entry = self.get(key) or entry
+            if entry and fresh(symbol, entry["ts"], ttl) and entry["data"] is not None:
+                result = entry
+                return result
+            with self._lock:
+                self._stats["fetches"] += 1
+            result = self.fetch(symbol, period=period, start=start, end=end, ttl=ttl)
+        except Exception:
+            if entry and entry["data"] is not None:
+                result = entry
+        finally:
+            self._land(key, flight, result)
+        return result
+
+    def history(self, symbol, *, period=None, start=None, end=None, ttl=TTL_NORMAL):
+        """以 TTL 記憶上游 history；抓失敗時回上次成功的舊值（stale）。"""
+        return self.entry(symbol, period=period, start=start, end=end, ttl=ttl)["data"]
+
+    def close(self, symbol, ttl=TTL_FAST, strict=False):
+        """
+        最近一筆有效收盤價：先試 7d，再退 1mo；各自帶 TTL。
+        避免假日／停牌導致 period='1d' 為空而報「可能下市」。取不到回 'N/A'；
+        strict=True 時，取不到且其中有一段是抓取失敗就丟 FetchError（只有上游確實回空才回 'N/A'）。
+        """
+        failed = False
+        for period, t in (("7d", ttl), ("1mo", max(ttl, self.normal_ttl))):
+            entry = self.entry(symbol, period=period, ttl=t)
+            if entry["close"].last is not None:
+                return entry["close"].last
+            failed = failed or entry.get("failed", False)
+        if strict and failed:
+            raise FetchError(symbol)
+        return 'N/A'
+
+    def flight_stats(self):
+        with self._lock:
+            return {"inflight": len(self._inflight), **self._stats}
+
+    def stats(self):
+        """/cache/stats 的內容：項目數、single-flight 計數與後端自己的統計。"""
+        return {"entries": len(self.backend), **self.flight_stats(), **self.backend.stats()}
+
+
+class Refresher:
+    """
+    背景價格更新器：每 interval 秒呼叫一次 refresh_once()（一輪要更新什麼由 app 決定）。
+    不在 import 時啟動：gunicorn 由 gunicorn.conf.py 在每個 worker 載入 app 後呼叫 app 的 start_refresher()，
+    本機直接執行時由 __main__ 啟動；設定環境變數 PRICE_REFRESHER=0 可關閉（回到請求內同步更新）。
+    warm：第一輪跑完才設，之後 PriceCache(serve_stale=…) 讓請求端改讀舊值。
+    """
+
+    def __init__(self, refresh_once, interval=REFRESH_INTERVAL):
+        self.refresh_once = refresh_once
+        self.interval = interval
+        self.warm = threading.Event()
+        self.stop = threading.Event()
+        self.thread = None
+
+    def _loop(self):
+        while True:
+            try:
+                self.refresh_once()
+            except Exception:
+                logging.getLogger(__name__).exception("price refresh failed")
+            self.warm.set()
+            if self.stop.wait(self.interval):
+                return
+
+    def start(self):
+        """啟動背景更新執行緒（每個 gunicorn worker 各一條；重複呼叫無副作用）。"""
+        if self.thread is not None and self.thread.is_alive():
+            return
+        self.stop.clear()
+        self.thread = threading.Thread(target=self._loop, name="price-refresher", daemon=True)
+        self.thread.start()
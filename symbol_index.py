@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+"""
+台股代碼解析索引（給 web.py / web_nochart.py / etf_intro.py 的 get_tw_stock_price 共用）
+
+記住每個台股代碼實際在哪個後綴（.TW / .TWO / 裸代碼 …）取得到價，
+並對確定不存在的後綴做負快取；之後直接打對的交易所，不再逐一試錯。
+索引存成 JSON（環境變數 SYMBOL_INDEX_PATH，預設為本檔旁的 .symbol_index.json），
+啟動時讀回即可使用。
+"""
+
+import json, os, threading, time
+
+INDEX_PATH = os.environ.get("SYMBOL_INDEX_PATH",
+                            os.path.join(os.path.dirname(os.path.abspath(__file__)), ".symbol_index.json"))
+NEGATIVE_TTL = 24 * 3600   # 秒：確定不存在的後綴多久後才再試一次
+
+
+class SymbolIndex:
+    def __init__(self, path=INDEX_PATH, negative_ttl=NEGATIVE_TTL):
+        self.path = path
+        self.negative_ttl = negative_ttl
+        self._resolved = {}   # code -> 已確認可用的 yfinance 代碼
+        self._missing = {}    # yfinance 代碼 -> 被判定不存在的時間
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, encoding="utf-8") as fh:
+                data = json.load(fh)
+        except (OSError, ValueError):
+            return
+        self._resolved = dict(data.get("resolved", {}))
+        self._missing = {k: float(v) for k, v in data.get("missing", {}).items()}
+
+    def _save(self):
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as fh:
+            json.dump({"resolved": self._resolved, "missing": self._missing}, fh, ensure_ascii=False, indent=1)
+        os.replace(tmp, self.path)
+
+    def preferred(self, code, default):
+        with self._lock:
+            return self._resolved.get(code, default)
+
+    def order(self, code, candidates):
+        """要嘗試的順序：已解析的放最前面，負快取期限內的候選直接略過。"""
+        now = time.time()
+        with self._lock:
+            first = self._resolved.get(code)
+            rest = [c for c in candidates
+                    if c != first and now - self._missing.get(c, -self.negative_ttl) >= self.negative_ttl]
+        return ([first] if first else []) + rest
+
+    def record(self, code, hit, misses=()):
+        """
+        hit 取到價時呼叫；misses 為同一輪中在它之前失敗的候選。
+        全部候選都失敗時不要呼叫（多半是網路問題，不該寫進負快取）。
+        """
+        now = time.time()
+        with self._lock:
+            changed = self._resolved.get(code) != hit
+            self._resolved[code] = hit
+            self._missing.pop(hit, None)
+            for m in misses:
+                if m != hit:
+                    self._missing[m] = now
+                    changed = True
+            if changed:
+                try:
+                    self._save()
+                except OSError:
+                    pass   # 唯讀環境就只留在記憶體
+
+    def snapshot(self):
+        with self._lock:
+            return {"resolved": dict(self._resolved), "missing": dict(self._missing)}
+
+
+_default = None
+_default_guard = threading.Lock()
+
+def default_index():
+    """每個行程共用一個 SymbolIndex（路徑見 INDEX_PATH）。"""
+    global _default
+    with _default_guard:
+        if _default is None:
+            _default = SymbolIndex()
+        return _default
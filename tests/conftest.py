@@ -0,0 +1,12 @@
+# -*- coding: utf-8 -*-
+"""pytest 共用設定：專案根目錄放進 sys.path；歷史庫與台股代碼索引寫到暫存目錄，不動到真正的檔案。"""
+
+import os, sys, tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+_tmp = tempfile.mkdtemp(prefix="pytest_portfolio_")
+os.environ.setdefault("HISTORY_STORE_DIR", os.path.join(_tmp, "history"))
+os.environ.setdefault("SYMBOL_INDEX_PATH", os.path.join(_tmp, "symbol_index.json"))
+os.environ.pop("PRICE_CACHE_DB", None)
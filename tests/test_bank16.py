@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+"""bank16：陣列版與純 Python 版逐位元相同；奇數尺寸、br*bc != 16、每種像素格式都要往返一致。"""
+
+import numpy as np
+import pytest
+
+from bank16 import (PIXEL_FORMATS, AddrMap, BankLayout, addr_map_np, as_words, from_words,
+                    load_stream_banks, make_test_frame, make_test_image, make_test_image_np,
+                    pack_to_16banks, pack_to_16banks_np, reconstruct_from_16banks_np, reference_banks,
+                    simulate_conflicts, stream_pack, window_pattern)
+
+SIZES = [(8, 16), (37, 53), (1, 7), (5, 3)]            # 含奇數、不是 br／bc 倍數、比格子還小
+MAPPINGS = [(4, 4), (3, 5), (5, 7), (2, 8), (1, 1)]    # 含 br*bc != 16 與非 2 的次方
+
+
+@pytest.mark.parametrize("H,W", SIZES)
+@pytest.mark.parametrize("br,bc", MAPPINGS)
+def test_numpy_matches_pure_python(H, W, br, bc):
+    img = make_test_image(H, W)
+    banks, addr_map = pack_to_16banks(img, br, bc)
+    img_np = make_test_image_np(H, W)
+    assert img_np.tolist() == img
+    banks_np = pack_to_16banks_np(img_np, br, bc)
+    assert [b.tolist() for b in banks_np] == banks
+    assert addr_map_np(H, W, br, bc).tolist() == [list(t) for t in addr_map]
+    assert list(AddrMap(H, W, br, bc)) == addr_map
+    assert np.array_equal(reconstruct_from_16banks_np(banks_np, H, W, br, bc), img_np)
+
+
+@pytest.mark.parametrize("br,bc", MAPPINGS)
+def test_addr_map_lookup_and_inverse(br, bc):
+    H, W = 37, 53
+    amap = AddrMap(H, W, br, bc)
+    table = addr_map_np(H, W, br, bc)
+    bank, addr = amap.lookup(table[:, 0], table[:, 1])
+    assert np.array_equal(bank, table[:, 2]) and np.array_equal(addr, table[:, 3])
+    ys, xs = amap.locate(bank, addr)
+    assert np.array_equal(ys, table[:, 0]) and np.array_equal(xs, table[:, 1])
+
+
+@pytest.mark.parametrize("fmt", sorted(PIXEL_FORMATS))
+@pytest.mark.parametrize("H,W", [(37, 53), (8, 16)])
+@pytest.mark.parametrize("br,bc", [(4, 4), (3, 5), (1, 1)])
+def test_pixel_format_round_trip(fmt, H, W, br, bc, tmp_path):
+    dtype, ch, _ = PIXEL_FORMATS[fmt]
+    img = make_test_frame(H, W, fmt)
+    layout = BankLayout(H, W, br, bc)
+
+    banks = layout.pack(img)
+    assert all(np.array_equal(a, e) for a, e in zip(banks, reference_banks(img, br, bc)))
+    assert np.array_equal(layout.unpack(banks), img)
+
+    words = layout.pack(as_words(img))
+    assert all(np.array_equal(from_words(w, dtype, ch).reshape(a.shape), a) for w, a in zip(words, banks))
+
+    groups = layout.pack_planar(img)
+    assert np.array_equal(layout.unpack_planar(groups), img)
+
+    src = tmp_path / "frame.raw"
+    img.tofile(src)
+    regions = stream_pack(str(src), H, W, str(tmp_path / "packed.raw"), dtype, br, bc,
+                          band_bytes=W * img.itemsize * ch * br, channels=ch)
+    assert all(np.array_equal(s, a) for s, a in zip(load_stream_banks(regions, dtype, ch), banks))
+
+
+@pytest.mark.parametrize("fmt", ["gray8", "rgb8", "rgba8"])
+def test_pack_returns_owned_buffers(fmt):
+    """br=bc=1 時唯一的 bank 就是整張圖：pack() 仍要回傳自有的緩衝，改它不能動到原圖。"""
+    img = make_test_frame(6, 9, fmt)
+    before = img.copy()
+    layout = BankLayout(6, 9, 1, 1)
+    for bank in (layout.pack(img)[0], layout.pack(img, 0)):
+        assert not np.shares_memory(bank, img)
+        bank[...] = 0
+    assert np.array_equal(img, before)
+
+
+def test_window_matching_bank_grid_has_no_conflicts():
+    H, W = 64, 96
+    result = simulate_conflicts(window_pattern(H, W, 4), 4, 4)
+    assert result["worst_stall"] == 0 and result["pixels_per_cycle"] == 16
+    assert simulate_conflicts(window_pattern(H, W, 4), 2, 2)["worst_stall"] == 3
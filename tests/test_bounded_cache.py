@@ -0,0 +1,27 @@
+# -*- coding: utf-8 -*-
+"""bounded_cache：沒有背景更新器的 app 靠請求路徑上的 maybe_expire() 清掉閒置的鍵。"""
+
+import time
+
+import web_nochart
+from bounded_cache import BoundedCache
+
+
+def test_maybe_expire_is_rate_limited():
+    cache = BoundedCache(idle_ttl=10)
+    cache.set("a", 1)
+    t0 = time.time()
+    assert cache.maybe_expire(every=60, now=t0 + 20) == 1
+    cache.set("b", 2)
+    assert cache.maybe_expire(every=60, now=t0 + 50) == 0    # 間隔內不清
+    assert cache.keys() == ["b"]
+    assert cache.maybe_expire(every=60, now=t0 + 81) == 1
+    assert cache.stats()["expired"] == 2
+
+
+def test_web_nochart_requests_expire_idle_keys(monkeypatch):
+    cache = BoundedCache(idle_ttl=-1)   # 一寫入就算閒置
+    monkeypatch.setattr(web_nochart, "_cache", cache)
+    cache.set(("history", "SPY", "7d", None, None), {"ts": 0.0, "ttl": 60, "data": None})
+    assert web_nochart.app.test_client().get("/health").status_code == 200
+    assert len(cache) == 0 and cache.stats()["expired"] == 1
@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+"""web 斷路器：批次 prefetch_history 佔走的半開探測名額，沒抓到資料時也要歸還。"""
+
+import pandas as pd
+import pytest
+
+import web
+
+SYMBOL = "PROBETEST"
+
+
+@pytest.fixture()
+def half_open(monkeypatch):
+    """SYMBOL 已連續失敗、退避期滿：下一次 _breaker_allow 會佔走探測名額。"""
+    b = web._Breaker()
+    b.failures, b.retry_at = web._BREAKER_THRESHOLD, 0.0
+    monkeypatch.setitem(web._breakers, SYMBOL, b)
+    return b
+
+
+def _download_returning(frame):
+    def download(tickers, **kw):
+        return frame
+    return download
+
+
+@pytest.mark.parametrize("download", [
+    _download_returning(pd.concat({"OTHER": pd.DataFrame({"Close": [1.0]})}, axis=1)),   # 批次裡沒有這一欄
+    _download_returning(pd.DataFrame()),                                                   # 整批空
+    _download_returning(None),
+])
+def test_batch_without_data_releases_probe(half_open, monkeypatch, download):
+    monkeypatch.setattr(web.yf, "download", download)
+    web.prefetch_history({SYMBOL: 60})
+    assert half_open.probe_at is None
+    assert half_open.failures == web._BREAKER_THRESHOLD + 1 and half_open.last_error == "empty"
+    assert half_open.retry_at > web._now()   # 再退避，而不是卡在探測逾時
+
+
+def test_batch_exception_releases_probe(half_open, monkeypatch):
+    def download(tickers, **kw):
+        raise ConnectionError("Could not resolve host")
+    monkeypatch.setattr(web.yf, "download", download)
+    assert web.prefetch_history({SYMBOL: 60}) == 0
+    assert half_open.probe_at is None
+    assert half_open.last_error.startswith("ConnectionError")
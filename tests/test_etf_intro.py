@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+"""etf_intro：calc_returns 的錨點；run_all 的請求期限。"""
+
+import threading, time
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+import etf_intro
+from etf_intro import calc_returns, run_all
+
+
+def _series(start, end):
+    """start..end 的每個工作日，收盤價逐日 +1。"""
+    idx = pd.bdate_range(start, end)
+    return pd.Series(np.arange(100.0, 100.0 + len(idx)), index=idx)
+
+
+def test_ytd_anchors_on_last_close_before_new_year():
+    today = date.today()
+    close = _series(today - timedelta(days=800), today)
+    prev = close[close.index < pd.Timestamp(today.year, 1, 1)].iloc[-1]
+    out = calc_returns(close)
+    assert out['ytd'] == f"{(close.iloc[-1] / prev - 1) * 100:.2f}%"
+
+
+def test_ytd_for_fund_listed_this_year_uses_first_bar():
+    today = date.today()
+    close = _series(date(today.year, 1, 1), today)
+    if len(close) < 2:
+        return
+    out = calc_returns(close)
+    assert out['ytd'] == f"{(close.iloc[-1] / close.iloc[0] - 1) * 100:.2f}%"
+
+
+def test_horizons_longer_than_history_are_na():
+    today = date.today()
+    close = _series(today - timedelta(days=800), today)   # 約 2.2 年
+    out = calc_returns(close)
+    assert out['1y'] != 'N/A'
+    assert out['3y'] == out['5y'] == out['10y'] == 'N/A'
+    assert out['inception'] != 'N/A'
+
+
+def test_hung_call_does_not_delay_next_request():
+    release, ran = threading.Event(), []
+    try:
+        hung = {i: release.wait for i in range(etf_intro.FETCH_CONCURRENCY)}
+        hung['late'] = lambda: ran.append('late')   # 排在卡住的呼叫後面，期限過了就不該再跑
+        assert run_all(hung, deadline=0.2, default='N/A') == {**{i: 'N/A' for i in range(etf_intro.FETCH_CONCURRENCY)},
+                                                               'late': 'N/A'}
+        t0 = time.monotonic()
+        assert run_all({'a': lambda: 1, 'b': lambda: 2}, deadline=5) == {'a': 1, 'b': 2}
+        assert time.monotonic() - t0 < 1
+    finally:
+        release.set()
+    time.sleep(0.1)
+    assert ran == []
@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+"""history_store：append 進來的批次結果可以直接被 peek 命中；新的除權息／分割讓本機的還原價格整段重抓。"""
+
+from datetime import timedelta
+
+import pandas as pd
+
+from history_store import HistoryStore, _today
+
+
+def _bars(days, close=100.0, dividends=None):
+    """最近 days 個日曆天的日線（含今天）；dividends={距今天數: 金額}。"""
+    idx = pd.DatetimeIndex([_today() - timedelta(days=d) for d in range(days - 1, -1, -1)])
+    df = pd.DataFrame({"Open": close, "High": close, "Low": close, "Close": close,
+                       "Volume": 1000.0, "Dividends": 0.0, "Stock Splits": 0.0}, index=idx)
+    for d, amount in (dividends or {}).items():
+        df.loc[_today() - timedelta(days=d), "Dividends"] = amount
+    return df
+
+
+def test_peek_serves_window_seeded_by_append(tmp_path):
+    def offline(symbol, start=None, end=None):
+        raise AssertionError("peek/append must not hit upstream")
+    store = HistoryStore(root=str(tmp_path), fetch=offline)
+    assert store.append("SPY", _bars(7), period="7d")
+    got = store.peek("SPY", period="7d", max_age=60)
+    assert got is not None and len(got) == 7
+
+    store.append("QQQ", _bars(32), period="1mo")
+    assert store.peek("QQQ", period="1mo", max_age=60) is not None
+    # 批次只涵蓋 7 天，不能拿來回答更長的區間
+    assert store.peek("SPY", period="1mo", max_age=60) is None
+
+
+def test_new_dividend_refetches_full_range(tmp_path):
+    calls = []
+    def fetch(symbol, start=None, end=None):
+        calls.append(start)
+        if start is None:                          # 整段：上游已把舊價格依新的配息還原
+            return _bars(40, close=95.0, dividends={0: 5.0})
+        return _bars(2, close=100.0, dividends={0: 5.0})   # 補尾巴：今天除息
+    store = HistoryStore(root=str(tmp_path), fetch=fetch)
+    store.append("VTI", _bars(40, close=100.0)[:-1], period="max")
+
+    df = store.history("VTI", period="max")
+    assert calls == [_today() - timedelta(days=1), None]
+    assert (df["Close"] == 95.0).all() and len(df) == 40
+
+    # 同一筆配息已記錄：下次補尾巴不再整段重抓
+    calls.clear()
+    store.history("VTI", period="max")
+    assert calls == [_today()]
+
+
+def test_append_with_new_split_drops_stale_prices(tmp_path):
+    store = HistoryStore(root=str(tmp_path), fetch=lambda *a, **k: _bars(1))
+    store.append("TSLA", _bars(30, close=300.0), period="1mo")
+    split = _bars(7, close=100.0)
+    split.loc[_today(), "Stock Splits"] = 3.0
+    assert store.append("TSLA", split, period="7d")
+    assert store.peek("TSLA", period="7d", max_age=60)["Close"].eq(100.0).all()
+    assert store.peek("TSLA", period="1mo", max_age=60) is None   # 舊的未還原價格已丟掉，要再回補
@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+"""price_cache：同鍵同時 miss 只抓一次；fetches 只計實際打上游的次數；失敗回舊值；失敗與查無資料分開。"""
+
+import threading, time
+
+import pandas as pd
+import pytest
+import yfinance as yf
+from yfinance.data import YfData
+
+from bounded_cache import BoundedCache
+from history_store import HistoryStore
+from price_cache import FetchError, PriceCache, TTL_NORMAL, yf_history
+
+SYMBOL = "TEST"   # 不在任何交易所日曆上：TTL 不因休市延長
+
+
+def _frame(close=100.0):
+    return pd.DataFrame({"Close": [close]}, index=pd.DatetimeIndex(["2024-01-02"]))
+
+
+def test_concurrent_misses_collapse_into_one_fetch():
+    calls, gate = [], threading.Event()
+    def loader(symbol, period, start, end):
+        calls.append(symbol)
+        gate.wait(5)
+        return _frame()
+    prices = PriceCache(BoundedCache(), loader)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(prices.close(SYMBOL))) for _ in range(5)]
+    for t in threads:
+        t.start()
+    deadline = time.time() + 5
+    while prices.flight_stats()["collapsed"] < 4 and time.time() < deadline:
+        time.sleep(0.01)
+    gate.set()
+    for t in threads:
+        t.join(5)
+    assert calls == [SYMBOL]
+    assert results == [100.0] * 5
+    assert prices.flight_stats() == {"inflight": 0, "fetches": 1, "collapsed": 4}
+
+
+def test_recheck_hit_is_not_counted_as_fetch():
+    """leader 拿到旗標後發現前一個 leader 剛寫回新值：直接用，不算一次抓取。"""
+    calls = []
+    fresh_entry = {"ts": time.time(), "ttl": TTL_NORMAL, "data": _frame(42.0)}
+
+    class LateBackend(BoundedCache):
+        """第一次 get 落空，之後回傳剛寫入的新值（模擬另一個 leader 在兩次檢查之間完成）。"""
+        reads = 0
+        def get(self, key):
+            self.reads += 1
+            return None if self.reads == 1 else fresh_entry
+
+    prices = PriceCache(LateBackend(), lambda *a: calls.append(a) or _frame())
+    assert prices.history(SYMBOL, period="7d") is fresh_entry["data"]
+    assert calls == []
+    assert prices.flight_stats()["fetches"] == 0
+
+
+def test_failed_fetch_serves_stale_entry():
+    def loader(symbol, period, start, end):
+        raise TimeoutError("upstream timed out")
+    prices = PriceCache(BoundedCache(), loader)
+    prices.set(("history", SYMBOL, "7d", None, None), {"ts": 0.0, "ttl": TTL_NORMAL, "data": _frame(7.0)})
+    assert prices.close(SYMBOL) == 7.0
+    assert prices.flight_stats()["fetches"] == 1
+
+
+def test_strict_close_tells_failure_from_no_data():
+    def timeout(symbol, period, start, end):
+        raise TimeoutError("upstream timed out")
+    prices = PriceCache(BoundedCache(), timeout)
+    assert prices.close(SYMBOL) == 'N/A'
+    with pytest.raises(FetchError):
+        prices.close(SYMBOL, strict=True)
+
+    prices = PriceCache(BoundedCache(), lambda *a: pd.DataFrame())
+    assert prices.close(SYMBOL, strict=True) == 'N/A'
+
+
+def test_timezone_lookup_transport_failure_is_fetch_error(monkeypatch, tmp_path):
+    """yfinance 預設會吞掉時區查詢的 DNS／逾時錯誤、改丟「查無資料」；這裡必須當成傳輸失敗。"""
+    def down(self, url, params=None, timeout=30):
+        raise ConnectionError("Could not resolve host: query2.finance.yahoo.com")
+    monkeypatch.setattr(YfData, "get", down)
+    monkeypatch.setattr(YfData, "cache_get", down)
+
+    with pytest.raises(ConnectionError):
+        yf_history("PCTEST1", start="2024-01-02")
+    with pytest.raises(ConnectionError):
+        HistoryStore(root=str(tmp_path)).history("PCTEST2", period="max")
+    prices = PriceCache(BoundedCache(), yf_history)
+    with pytest.raises(FetchError):
+        prices.close("PCTEST3", strict=True)
+    assert yf.config.debug.hide_exceptions is True   # 只在呼叫期間關掉
@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+import threading
+
+import portfolio
+import web
+from price_cache import Refresher
+
+
+def _refresher_threads():
+    return [t for t in threading.enumerate() if t.name == "price-refresher"]
+
+
+def test_import_does_not_start_refresher():
+    assert web._refresher.thread is None
+    assert portfolio._refresher.thread is None
+    assert _refresher_threads() == []
+
+
+def _gunicorn_conf():
+    import importlib.util, os
+    from conftest import ROOT
+    spec = importlib.util.spec_from_file_location("gunicorn_conf", os.path.join(ROOT, "gunicorn.conf.py"))
+    mod = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(mod)
+    return mod
+
+
+def test_gunicorn_hook_starts_refresher_of_loaded_app(monkeypatch):
+    from types import SimpleNamespace
+    calls = []
+    monkeypatch.setattr(web, "start_refresher", lambda: calls.append("web"))
+    monkeypatch.delenv("PRICE_REFRESHER", raising=False)
+    worker = SimpleNamespace(app=SimpleNamespace(app_uri="web:app"), cfg=SimpleNamespace(wsgi_app=None))
+    _gunicorn_conf().post_worker_init(worker)
+    assert calls == ["web"]
+
+    monkeypatch.setenv("PRICE_REFRESHER", "0")
+    _gunicorn_conf().post_worker_init(worker)
+    assert calls == ["web"]
+
+
+def test_refresher_warms_after_first_round_and_survives_errors():
+    rounds = []
+    def refresh_once():
+        rounds.append(len(rounds))
+        if len(rounds) == 1:
+            raise RuntimeError("upstream down")   # 記 log、照樣暖機，下一輪再試
+    refresher = Refresher(refresh_once, interval=0.01)
+    refresher.start()
+    try:
+        assert refresher.warm.wait(5)
+        first = refresher.thread
+        refresher.start()                        # 重複呼叫不會多開一條
+        assert refresher.thread is first and first.name == "price-refresher"
+    finally:
+        refresher.stop.set()
+        refresher.thread.join(5)
+    assert not refresher.thread.is_alive() and len(rounds) >= 1
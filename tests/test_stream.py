@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+"""/stream：事件 id 是共用的資料版本；不認得的 Last-Event-ID 一律拿到完整的 reset；觀看者有上限；每次更新遠小於整頁。"""
+
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import web
+
+
+def _write(symbol, price):
+    idx = pd.date_range(end=pd.Timestamp.today().normalize(), periods=5, freq="B")
+    close = np.full(5, price)
+    df = pd.DataFrame({"Open": close, "High": close, "Low": close, "Close": close, "Volume": 1e6}, index=idx)
+    web._set_cache(("history", symbol, "7d", None, None), {"ts": time.time(), "data": df, "ttl": 10 ** 9})
+
+
+@pytest.fixture()
+def client():
+    """首頁所有代碼都先寫進快取（不連網）；暖機旗標讓請求端只讀記憶體。"""
+    symbols = list(web._page_symbols())
+    for i, s in enumerate(symbols):
+        _write(s, 32.0 if s == "USDTWD=X" else 1.0 if s.endswith("=X") else 50.0 + 10 * i)
+    web._refresher_warm.set()
+    try:
+        yield web.app.test_client(), symbols
+    finally:
+        web._refresher_warm.clear()
+
+
+def _first_event(client, last_id=None):
+    headers = {"Last-Event-ID": last_id} if last_id is not None else {}
+    it = iter(client.get("/stream", headers=headers, buffered=False).response)
+    try:
+        return next(it).decode("utf-8")
+    finally:
+        it.close()
+
+
+def _event(chunk):
+    fields = dict(line.split(": ", 1) for line in chunk.strip().splitlines())
+    return fields["event"], fields["id"]
+
+
+def test_event_id_is_the_shared_data_version(client):
+    client, _ = client
+    event, event_id = _event(_first_event(client))
+    assert event == "reset"
+    assert event_id == f"{web._cache.line}.{web._cache.version()[0]}"
+
+
+def test_stale_or_foreign_last_event_id_gets_reset(client):
+    client, symbols = client
+    _, old_id = _event(_first_event(client))
+    _write(symbols[0], 123.45)
+    _, new_id = _event(_first_event(client, old_id))   # 上一個版本：補差異
+    assert new_id != old_id
+
+    _write(symbols[0], 67.89)
+    for last_id in (old_id,                              # 落後超過一個版本
+                    f"other.{web._cache.version()[0]}",  # 另一條版本序列（例如別的行程的記憶體快取）
+                    "17", "garbage"):                    # 舊格式／亂碼
+        event, event_id = _event(_first_event(client, last_id))
+        assert event == "reset", last_id
+        assert event_id == f"{web._cache.line}.{web._cache.version()[0]}"
+
+
+def test_previous_version_gets_patch(client):
+    client, symbols = client
+    _, old_id = _event(_first_event(client))
+    _write(symbols[1], 321.0)
+    event, _ = _event(_first_event(client, old_id))
+    assert event == "patch"
+
+
+def test_viewers_over_the_cap_get_503(client, monkeypatch):
+    client, _ = client
+    monkeypatch.setattr(web, "_STREAM_MAX_VIEWERS", 2)
+    open_streams = [iter(client.get("/stream", buffered=False).response) for _ in range(2)]
+    try:
+        for it in open_streams:
+            next(it)
+        resp = client.get("/stream")
+        assert resp.status_code == 503
+        assert resp.headers["Retry-After"] == str(web._STREAM_RETRY_AFTER)
+    finally:
+        for it in open_streams:
+            it.close()
+    assert web._stream_hub.viewers == 0   # 關閉回應就歸還名額
+    it = iter(client.get("/stream", buffered=False).response)
+    try:
+        assert next(it).startswith(b"id: ")
+    finally:
+        it.close()
+
+
+def test_patch_bytes_per_update_far_below_full_reload(client):
+    """假的價格來源每次更新改幾檔報價：SSE 每位觀看者收到的位元組遠小於重新載入一次首頁。"""
+    client, symbols = client
+    it = iter(client.get("/stream", buffered=False).response)
+    reload_bytes, sse_bytes = [], []
+    try:
+        next(it)                                     # 連上時的完整 reset 不算
+        for tick in range(5):
+            for i, s in enumerate(symbols[:3]):
+                if not s.endswith("=X"):
+                    _write(s, 60.0 + tick + i)
+            assert web.publish_stream()
+            chunk = next(it)
+            assert _event(chunk.decode("utf-8"))[0] == "patch"
+            sse_bytes.append(len(chunk))
+            reload_bytes.append(len(client.get("/").data))
+    finally:
+        it.close()
+    assert sum(sse_bytes) * 5 < sum(reload_bytes)
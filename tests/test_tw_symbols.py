@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+"""get_tw_stock_price：只有上游確實回空的後綴才進負快取，逾時／HTTP 錯誤不算。"""
+
+import pandas as pd
+import pytest
+
+import web, web_nochart
+from symbol_index import SymbolIndex
+
+
+def _frame(close):
+    return pd.DataFrame({"Close": [close]}, index=pd.DatetimeIndex(["2024-01-02"]))
+
+
+@pytest.fixture(params=[web, web_nochart], ids=["web", "web_nochart"])
+def app(request, monkeypatch, tmp_path):
+    mod = request.param
+    monkeypatch.setattr(mod, "_tw_index", SymbolIndex(str(tmp_path / "index.json")))
+    return mod
+
+
+def _loader(monkeypatch, app, answers):
+    def load(symbol, period, start, end):
+        got = answers[symbol]
+        if isinstance(got, Exception):
+            raise got
+        return got
+    monkeypatch.setattr(app._prices, "_loader", load)
+
+
+def test_timeout_is_not_recorded_as_missing(app, monkeypatch):
+    _loader(monkeypatch, app, {"9901.TW": TimeoutError("read timed out"), "9901.TWO": _frame(12.5)})
+    assert app.get_tw_stock_price("9901.TW") == 12.5
+    snap = app._tw_index.snapshot()
+    assert snap["resolved"] == {"9901": "9901.TWO"}
+    assert snap["missing"] == {}
+
+
+def test_empty_response_is_recorded_as_missing(app, monkeypatch):
+    _loader(monkeypatch, app, {"9902.TW": pd.DataFrame(), "9902.TWO": _frame(7.0)})
+    assert app.get_tw_stock_price("9902.TW") == 7.0
+    assert set(app._tw_index.snapshot()["missing"]) == {"9902.TW"}
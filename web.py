@@ -1,21 +1,36 @@
 # -*- coding: utf-8 -*-
 """
 本機：
-  pip install flask yfinance
+  pip install flask yfinance matplotlib
   python portfolio.py
 開啟：http://127.0.0.1:5000/
 
 Render（建議 Start Command）：
   gunicorn portfolio:app --bind 0.0.0.0:$PORT --access-logfile - --error-logfile - --timeout 120 --forwarded-allow-ips='*'
+
+多 worker 共用價格快取（選用，同一台機器）：
+  PRICE_CACHE_DB=/tmp/price_cache.sqlite3 gunicorn web:app -w 4 ...
 """
 
-from flask import Flask, render_template_string, request
+from flask import Flask, render_template, request, make_response, Response
 from datetime import datetime
 from werkzeug.middleware.proxy_fix import ProxyFix
 import yfinance as yf
 import pandas as pd
-import threading, time, os, logging
+import numpy as np
+import threading, time, os, logging, sqlite3, io, json, ast, hashlib, re, secrets
+from history_store import default_store
+from price_cache import REFRESH_AHEAD, FetchError, PriceCache, Refresher, fresh
+from bounded_cache import BoundedCache, CloseRecord
+from chart import FORMATS as CHART_FORMATS, pie_spec, spec_key, render as render_chart, stats as chart_stats
+from fx import FxMatrix, base_symbols
+from holdings import Book, TWD_FMT
+from symbol_index import default_index
 from pytz import timezone
+try:
+    import pyarrow as pa   # 選用：只有 /api/*?format=arrow 需要
+except ImportError:
+    pa = None
 
 app = Flask(__name__)
 # 代理相容（雲端反向代理下正確判斷 https/host）
@@ -128,74 +143,366 @@ _TTL_FAST   = 60      # 1 分鐘：即時／當日
 _TTL_NORMAL = 300     # 5 分鐘：一般
 _TTL_LONG   = 3600    # 1 小時：較長週期
 
-_cache = {}
-_cache_lock = threading.Lock()
+# ---- 快取後端：預設為行程內 LRU（有位元組上限，見 bounded_cache）；設定 PRICE_CACHE_DB=路徑 則改用 SQLite（WAL），
+# ---- 讓同一台機器上的多個 gunicorn worker 共用同一份已暖機的快取。
+# 項目格式一律為 {"ts": 寫入時間, "ttl": 該鍵的 TTL, "data": DataFrame}。
+# 每個後端另外維護「資料版本」：只有某個鍵的內容真的變了才 +1，
+# 整頁快取（_page_cache）就靠它判斷 HTML 還能不能沿用。
+# line 標示版本號屬於哪一條序列（行程內快取每個行程一條，SQLite 每個資料庫一條），
+# 不同序列的版本號不能互相比較（SSE 的事件 id 即「line.版本」）。
+def _same_frame(a, b):
+    return a is b or (a is not None and b is not None and a.equals(b))
+
+class MemoryCache(BoundedCache):
+    """行程內快取：有上限的 LRU，外加資料版本。"""
+    def __init__(self):
+        super().__init__()
+        self._version, self._changed_at = 0, None
+        self.line = secrets.token_hex(4)
+    def _on_set(self, old, value):
+        if old is None or not _same_frame(old["data"], value["data"]):
+            self._version += 1
+            self._changed_at = value["ts"]
+    def version(self):
+        """(資料版本, 最後一次內容變動的時間)。"""
+        with self._lock:
+            return self._version, self._changed_at
+    def stamps(self):
+        return super().stamps(_TTL_NORMAL)
+
+def _pack_frame(df):
+    """DataFrame → (meta JSON, npz bytes)：逐欄存成原生 dtype 陣列，不用 pickle。"""
+    idx = df.index
+    meta = {
+        "columns": [str(c) for c in df.columns],
+        "index_name": idx.name,
+        "tz": str(idx.tz) if isinstance(idx, pd.DatetimeIndex) and idx.tz is not None else None,
+    }
+    arrays = {f"c{i}": df[c].to_numpy() for i, c in enumerate(df.columns)}
+    arrays["index"] = idx.as_unit("ns").asi8 if isinstance(idx, pd.DatetimeIndex) else np.zeros(0, dtype="int64")
+    buf = io.BytesIO()
+    np.savez_compressed(buf, **arrays)
+    return json.dumps(meta), buf.getvalue()
+
+def _unpack_frame(meta, blob):
+    meta = json.loads(meta)
+    with np.load(io.BytesIO(blob), allow_pickle=False) as z:
+        cols = {c: z[f"c{i}"] for i, c in enumerate(meta["columns"])}
+        ns = z["index"]
+    if not cols:
+        return pd.DataFrame()
+    idx = pd.DatetimeIndex(pd.to_datetime(ns, unit="ns", utc=meta["tz"] is not None), name=meta["index_name"])
+    if meta["tz"] is not None:
+        idx = idx.tz_convert(meta["tz"])
+    return pd.DataFrame(cols, index=idx)
+
+class SQLiteCache:
+    """
+    跨 worker 共用的 SQLite 快取（WAL 模式：多讀一寫互不阻塞，不需要額外服務）。
+    每條執行緒一個連線；同一鍵的 ts 沒變時直接用本行程已解碼的 DataFrame。
+    已解碼的項目放在有上限的 LRU（_decoded）裡；背景更新器只更新本行程最近讀過的鍵，
+    沒人讀的列不再被重抓，超過 ROW_MAX_AGE 沒被寫過就從資料表刪除。
+    """
+    ROW_MAX_AGE = 24 * 3600
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._decoded = BoundedCache()   # repr(key) -> entry
+        conn = self._conn()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache ("
+            " key TEXT PRIMARY KEY, ts REAL NOT NULL, ttl REAL NOT NULL, meta TEXT NOT NULL, data BLOB NOT NULL)"
+        )
+        conn.execute("CREATE TABLE IF NOT EXISTS version ("
+                     " id INTEGER PRIMARY KEY CHECK (id = 0), n INTEGER, changed_at REAL, line TEXT NOT NULL)")
+        conn.execute("INSERT OR IGNORE INTO version (id, n, changed_at, line) VALUES (0, 0, NULL, ?)", (secrets.token_hex(4),))
+        self.line = conn.execute("SELECT line FROM version WHERE id = 0").fetchone()[0]
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        k = repr(key)
+        row = self._conn().execute("SELECT ts FROM cache WHERE key=?", (k,)).fetchone()
+        if row is None:
+            return None
+        hit = self._decoded.get(k)
+        if hit and hit["ts"] == row[0]:
+            return hit
+        row = self._conn().execute("SELECT ts, ttl, meta, data FROM cache WHERE key=?", (k,)).fetchone()
+        if row is None:
+            return None
+        data = _unpack_frame(row[2], row[3])
+        entry = {"ts": row[0], "ttl": row[1], "data": data, "close": CloseRecord.from_frame(data)}
+        self._decoded.set(k, entry)
+        return entry
+
+    def set(self, key, value):
+        k = repr(key)
+        meta, blob = _pack_frame(value["data"])
+        ttl = value.get("ttl", _TTL_NORMAL)
+        conn = self._conn()
+        with conn:   # 同一筆交易：比對舊內容、寫入、必要時把共用版本 +1
+            conn.execute("BEGIN IMMEDIATE")
+            old = conn.execute("SELECT meta, data FROM cache WHERE key=?", (k,)).fetchone()
+            conn.execute(
+                "INSERT OR REPLACE INTO cache (key, ts, ttl, meta, data) VALUES (?, ?, ?, ?, ?)",
+                (k, value["ts"], ttl, meta, blob),
+            )
+            if old is None or old[0] != meta or old[1] != blob:
+                conn.execute("UPDATE version SET n = n + 1, changed_at = ? WHERE id = 0", (value["ts"],))
+        self._decoded.set(k, {**value, "ttl": ttl})
+
+    def version(self):
+        n, changed_at = self._conn().execute("SELECT n, changed_at FROM version WHERE id = 0").fetchone()
+        return n, changed_at
+
+    def stamps(self):
+        self._decoded.expire_idle()
+        live = set(self._decoded.keys())
+        conn = self._conn()
+        with conn:
+            conn.execute("DELETE FROM cache WHERE ts < ?", (_now() - self.ROW_MAX_AGE,))
+        rows = conn.execute("SELECT key, ts, ttl FROM cache").fetchall()
+        return [(ast.literal_eval(k), ts, ttl) for k, ts, ttl in rows if k in live]
+
+    def stats(self):
+        return self._decoded.stats()
+
+    def __len__(self):
+        return self._conn().execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+
+def _make_cache():
+    path = os.environ.get("PRICE_CACHE_DB")
+    return SQLiteCache(path) if path else MemoryCache()
+
+_cache = _make_cache()
+_history_store = default_store()
+_tw_index = default_index()
 def _now(): return time.time()
-def _get_cache(key):
-    with _cache_lock:
-        return _cache.get(key)
-def _set_cache(key, value):
-    with _cache_lock:
-        _cache[key] = value
-
-def cached_history(symbol, *, period=None, start=None, end=None, ttl=_TTL_NORMAL):
-    """以 TTL 記憶 yfinance history；抓失敗時回上次成功的舊值（stale）。"""
-    key = ("history", symbol, period, start, end)
-    entry = _get_cache(key)
-    now = _now()
-    if entry and (now - entry["ts"] < ttl) and entry["data"] is not None:
-        return entry["data"]
+_fresh = fresh
+
+# ---- 斷路器：下市／打錯的代碼連續失敗 _BREAKER_THRESHOLD 次就「打開」，
+# ---- 退避期間直接回舊值（或空表）不打上游；期滿放一個半開探測，成功即復原，失敗則退避加倍。
+_BREAKER_THRESHOLD = 3       # 連續失敗幾次打開
+_BREAKER_BACKOFF   = 30      # 秒：第一次打開的退避時間，之後每次加倍
+_BREAKER_MAX       = 3600    # 秒：退避上限
+_PROBE_TIMEOUT     = 60      # 秒：半開探測多久沒回報就再放一個
+_breakers = {}               # symbol -> _Breaker（只放有失敗紀錄的代碼）
+_breaker_lock = threading.Lock()
+_breaker_stats = {"skipped": 0}
+
+class _Breaker:
+    __slots__ = ("failures", "retry_at", "probe_at", "last_error", "skipped")
+    def __init__(self):
+        self.failures, self.retry_at, self.probe_at, self.last_error, self.skipped = 0, 0.0, None, None, 0
+    def state(self, now):
+        if self.failures < _BREAKER_THRESHOLD:
+            return "closed"
+        return "open" if now < self.retry_at else "half_open"
+
+def _breaker_allow(symbol):
+    """這次可以打上游嗎？open 期間一律拒絕；half_open 同時只放一個探測。"""
+    with _breaker_lock:
+        b = _breakers.get(symbol)
+        if b is None:
+            return True
+        now = _now()
+        state = b.state(now)
+        if state == "closed":
+            return True
+        if state == "open" or (b.probe_at is not None and now - b.probe_at < _PROBE_TIMEOUT):
+            b.skipped += 1
+            _breaker_stats["skipped"] += 1
+            return False
+        b.probe_at = now
+        return True
+
+def _breaker_record(symbol, error=None):
+    """回報一次抓取結果；error=None 代表成功（清掉紀錄）。"""
+    with _breaker_lock:
+        if error is None:
+            _breakers.pop(symbol, None)
+            return
+        b = _breakers.setdefault(symbol, _Breaker())
+        b.failures += 1
+        b.last_error = error
+        b.probe_at = None
+        if b.failures >= _BREAKER_THRESHOLD:
+            b.retry_at = _now() + min(_BREAKER_BACKOFF * 2 ** (b.failures - _BREAKER_THRESHOLD), _BREAKER_MAX)
+
+def _load_history(symbol, period, start, end):
+    """
+    經本機歷史庫取資料；歷史庫只向 yfinance 補抓缺的 K 棒，其餘在本機切片。
+    例外與空表都算一次失敗，回報給斷路器；例外交由 price_cache 處理（回舊值或空項目）。
+    """
     try:
-        tkr = yf.Ticker(symbol)
-        df = tkr.history(period=period) if period else tkr.history(start=start, end=end)
-        _set_cache(key, {"ts": now, "data": df})
-        return df
-    except Exception:
-        if entry and entry["data"] is not None:
-            return entry["data"]
-        return pd.DataFrame()
+        df = _history_store.history(symbol, period=period, start=start, end=end)
+    except Exception as e:
+        _breaker_record(symbol, f"{type(e).__name__}: {e}"[:200])
+        raise
+    _breaker_record(symbol, "empty" if df.empty else None)
+    return df
 
-def cached_close(symbol, ttl=_TTL_FAST):
+# single-flight 與快取項目的取用路徑見 price_cache；
+# 背景更新器暖機後，請求端只讀記憶體，過期的舊值由更新器負責換新；斷路器打開時不打上游
+_prices = PriceCache(_cache, _load_history, serve_stale=lambda: _refresher_warm.is_set(), allow=_breaker_allow,
+                     normal_ttl=_TTL_NORMAL)
+_get_cache, _set_cache = _prices.get, _prices.set
+_fetch_history, _cached_entry = _prices.fetch, _prices.entry
+cached_history, cached_close = _prices.history, _prices.close
+
+# ============== 批次報價（一次 yf.download 取多檔） ==============
+_BATCH_PERIOD = "7d"   # 與 cached_close 第一段相同，批次結果可直接被命中
+
+def _page_symbols():
     """
-    取最近一筆有效收盤價：先試 7d，再退 1mo；各自帶 TTL。
-    避免假日／停牌導致 period='1d' 為空而報「可能下市」。
+    收集首頁會用到的所有 yfinance 代碼 → 對應 TTL。
+    代碼格式須與 cached_close / get_tw_stock_price / fx_matrix 實際查詢的一致。
     """
-    for period, t in (("7d", ttl), ("1mo", max(ttl, _TTL_NORMAL))):
-        df = cached_history(symbol, period=period, ttl=t)
-        if not df.empty and "Close" in df:
-            close = df["Close"].dropna()
-            if not close.empty:
-                return float(close.iloc[-1])
-    return 'N/A'
+    wanted = {}
+    for book in (US_PORTFOLIO, GOLD_PORTFOLIO, SHORT_TERM_BONDS, LONG_TERM_BONDS):
+        for r in book:
+            wanted[r['symbol']] = _TTL_FAST
+    for r in CRYPTO_PORTFOLIO:
+        wanted[f"{r['symbol']}-USD"] = _TTL_FAST
+    for r in TW_PORTFOLIO:
+        base = r['symbol'].replace('.TW', '')
+        wanted[_tw_index.preferred(base, f"{base}.TW")] = _TTL_FAST
+    for sym in base_symbols(FX_CURRENCIES):
+        wanted[sym] = _TTL_LONG
+    return wanted
+
+def prefetch_history(wanted, period=_BATCH_PERIOD, ahead=1.0):
+    """
+    把 {symbol: ttl} 中已過期／未快取的代碼合併成一次 yf.download，
+    再拆回各自的 cached_history 快取項目。回傳實際抓取的代碼數。
+    ahead < 1 代表存活超過 ttl*ahead 就提前重抓（給背景更新器用）。
+    批次失敗時不寫入任何東西，交由 cached_history 逐檔後援。
+    每個進批次的代碼都要回報斷路器（_breaker_allow 在半開時已佔走探測名額，不回報就要等 _PROBE_TIMEOUT）。
+    """
+    now = _now()
+    stale = []
+    for sym, ttl in wanted.items():
+        entry = _get_cache(("history", sym, period, None, None))
+        if entry and _fresh(sym, entry["ts"], ttl, now, ahead) and entry["data"] is not None:
+            continue
+        # 重啟後記憶體是空的：歷史庫在 TTL 內同步過就直接用，不必上網
+        df = _history_store.peek(sym, period=period, max_age=ttl * ahead)
+        if df is not None:
+            _set_cache(("history", sym, period, None, None), {"ts": now, "data": df, "ttl": ttl})
+        elif _breaker_allow(sym):
+            stale.append(sym)
+    if not stale:
+        return 0
+    try:
+        # actions=True：帶回除權息／分割欄位，歷史庫靠它判斷本機的還原價格是否過時
+        raw = yf.download(stale, period=period, group_by="ticker", auto_adjust=True,
+                          actions=True, threads=True, progress=False)
+    except Exception as e:
+        for sym in stale:
+            _breaker_record(sym, f"{type(e).__name__}: {e}"[:200])
+        return 0
+    if raw is None or raw.empty:
+        for sym in stale:
+            _breaker_record(sym, "empty")
+        return 0
+    if not isinstance(raw.columns, pd.MultiIndex):
+        raw = pd.concat({stale[0]: raw}, axis=1)
+    fetched = set(raw.columns.get_level_values(0))
+    for sym in stale:
+        # 多檔合併時交易日不同（加密貨幣含週末），拆回後去掉沒有收盤價的日期
+        df = raw[sym].dropna(subset=["Close"]) if sym in fetched else None
+        if df is None or df.empty:
+            # 批次把單檔的逾時／錯誤吞成空欄，分不出「查無資料」：不寫入，交由 cached_history 逐檔判斷
+            _breaker_record(sym, "empty")
+            continue
+        _history_store.append(sym, df, period=period)
+        _breaker_record(sym)
+        _set_cache(("history", sym, period, None, None), {"ts": now, "data": df, "ttl": wanted[sym]})
+    return len(stale)
 
 def get_tw_stock_price(symbol):
     """
     台股 ETF/股票的強韌代碼嘗試：.TW → .TWO → 裸代碼 → .TPE
     取最近有效收盤價（搭配 cached_close）。
+    解析過的後綴記在 _tw_index，之後直接查；確定不存在的後綴在負快取期限內不再試。
     """
     base = symbol.replace(".TW", "")
-    candidates = [f"{base}.TW", f"{base}.TWO", base, f"{base}.TPE"]
-    seen = set()
-    for sym in candidates:
-        if sym in seen:
-            continue
-        seen.add(sym)
-        price = cached_close(sym, ttl=_TTL_FAST)
+    candidates = list(dict.fromkeys([f"{base}.TW", f"{base}.TWO", base, f"{base}.TPE"]))
+    misses = []
+    for sym in _tw_index.order(base, candidates):
+        try:
+            price = cached_close(sym, ttl=_TTL_FAST, strict=True)
+        except FetchError:
+            continue   # 逾時／HTTP 錯誤不代表這個後綴不存在，不記負快取
         if price != 'N/A':
+            _tw_index.record(base, sym, misses)
             return price
+        misses.append(sym)
     return 'N/A'
 
 def get_crypto_price(symbol):
     """取加密貨幣對 USD 的價格"""
     return cached_close(f"{symbol}-USD", ttl=_TTL_FAST)
 
+# ============== 匯率（美元基準三角換算，見 fx.py） ==============
+FX_CURRENCIES = list(dict.fromkeys(['USD', 'TWD'] + [r['currency'] for r in CASH_HOLDINGS]))
+_FX_FALLBACK = {'TWD': 32.5}   # 1 美元兌多少該幣；基準匯價取不到時使用
+_fx_memo = (None, None)        # (資料版本, FxMatrix)
+_fx_lock = threading.Lock()
+
+def _fx_quote(symbol):
+    return cached_close(symbol, ttl=_TTL_LONG)
+
+def fx_matrix():
+    """以目前快取的基準匯價建好的匯率矩陣；資料版本沒變就沿用上一次的。"""
+    global _fx_memo
+    version = _cache.version()[0]
+    with _fx_lock:
+        if _fx_memo[0] == version:
+            return _fx_memo[1]
+    fx = FxMatrix.from_quotes(FX_CURRENCIES, _fx_quote, _FX_FALLBACK)
+    with _fx_lock:
+        _fx_memo = (version, fx)
+    return fx
+
 def get_currency_rate(pair, default=1.0):
-    """取匯率，例如 'USDTWD=X'"""
-    for suffix in ['=X', '']:
-        price = cached_close(f"{pair}{suffix}", ttl=_TTL_LONG)
-        if price != 'N/A':
-            return price
-    return default
+    """取匯率，例如 'USDTWD'、'AUDTWD'（交叉匯率由美元基準三角換算）"""
+    pair = pair.replace('=X', '')
+    frm, to = pair[:3], pair[3:]
+    fx = fx_matrix()
+    if frm not in fx.pos or to not in fx.pos:
+        fx = FxMatrix.from_quotes([frm, to], _fx_quote)
+    return fx.rate(frm, to, default)
+
+# ============== 背景價格更新器（見 price_cache.Refresher） ==============
+def _refresh_once():
+    """跑一輪：首頁代碼走批次；其餘已快取的鍵（1mo、起訖日期等）依各自 TTL 逐檔更新；最後推給串流觀看者。"""
+    wanted = _page_symbols()
+    prefetch_history(wanted, ahead=REFRESH_AHEAD)
+    now = _now()
+    for key, ts, ttl in _cache.stamps():
+        _, sym, period, start, end = key
+        if period == _BATCH_PERIOD and sym in wanted:
+            continue
+        if _fresh(sym, ts, ttl, now, REFRESH_AHEAD) or not _breaker_allow(sym):
+            continue
+        try:
+            _fetch_history(sym, period=period, start=start, end=end, ttl=ttl)
+        except Exception:
+            pass  # 保留舊值，下一輪再試
+    publish_stream()
+
+_refresher = Refresher(_refresh_once)
+_refresher_warm = _refresher.warm   # 第一輪抓完才讓 cached_history 改讀舊值
+start_refresher = _refresher.start
 
 # ============== 模板（投資組合） ==============
 TEMPLATE = r"""
@@ -203,8 +510,6 @@ TEMPLATE = r"""
 <head>
     <meta charset="utf-8">
     <title>Ching's Portfolio</title>
-    <script src="https://cdn.jsdelivr.net/npm/chart.js"></script>
-    <script src="https://cdn.jsdelivr.net/npm/chartjs-plugin-datalabels@2.2.0/dist/chartjs-plugin-datalabels.min.js"></script>
     <style>
         body { font-family: "微軟正黑體", Arial, sans-serif; background: #f4f6f8; color: #333; }
         .container { max-width: 1200px; margin: 32px auto; background: #fff; padding: 28px; border-radius: 12px; box-shadow: 0 2px 10px rgba(0,0,0,.06); }
@@ -216,6 +521,7 @@ TEMPLATE = r"""
         .summary { background:#f8f9fa; padding:18px; border-radius:10px; margin:18px 0; }
         .summary-row { display:flex; justify-content:space-between; margin:6px 0; font-size: 1.1em; }
         .chart-container { max-width: 450px; margin: 24px auto; }
+        .chart-container img { display: block; width: 100%; height: auto; }
         table { width:100%; border-collapse: collapse; margin-top: 14px; }
         th, td { border: 1px solid #eaecef; padding: 10px 12px; text-align: left; }
         th { background: #f0f3f6; font-weight: 600; }
@@ -233,33 +539,34 @@ TEMPLATE = r"""
     </div>
 
     <h1>Ching's Portfolio</h1>
-    <div class="meta">更新時間：{{ updated_at }}</div>
-    <div class="meta">美金兌台幣匯率：<b>{{ '%.3f' % exchange_rate }}</b></div>
+    <div class="meta">更新時間：<span data-cell="updated_at">{{ updated_at }}</span></div>
+    <div class="meta">美金兌台幣匯率：<b data-cell="exchange_rate">{{ '%.3f' % exchange_rate }}</b></div>
 
     <div class="summary">
         <div class="summary-row">
             <span>總資產市值 (TWD)：</span>
-            <span class="right"><b>{{ '%.0f' % grand_total_market_value_twd }}</b></span>
+            <span data-cell="sum:grand_total_market_value_twd" class="right"><b>{{ '%.0f' % grand_total_market_value_twd }}</b></span>
         </div>
         <div class="summary-row">
             <span>總投入成本 (TWD)：</span>
-            <span class="right"><b>{{ '%.0f' % grand_total_cost_twd }}</b></span>
+            <span data-cell="sum:grand_total_cost_twd" class="right"><b>{{ '%.0f' % grand_total_cost_twd }}</b></span>
         </div>
         <div class="summary-row">
             <span>總報酬 (TWD)：</span>
-            <span class="right {% if grand_total_profit_twd > 0 %}gain{% elif grand_total_profit_twd < 0 %}loss{% endif %}">
+            <span data-cell="sum:grand_total_profit_twd" class="right {% if grand_total_profit_twd > 0 %}gain{% elif grand_total_profit_twd < 0 %}loss{% endif %}">
                 <b>{{ '%.0f' % grand_total_profit_twd }}</b> ({{ '%.2f' % grand_total_profit_pct }}%)
             </span>
         </div>
     </div>
     
+    <!-- 圓餅圖由伺服器畫好（/charts/*.svg，見 chart.py）；網址帶資料雜湊，資料變了才換圖 -->
     <div class="chart-container">
-        <canvas id="assetAllocationChart"></canvas>
+        <span data-cell="chart:allocation"><img src="/charts/allocation.svg?v={{ chart_keys.allocation }}" alt="資產分佈 (TWD)" width="432" height="461"></span>
     </div>
 
     <!-- 新增：美股部位四大類圓餅圖 -->
     <div class="chart-container">
-        <canvas id="usGroupChart"></canvas>
+        <span data-cell="chart:us_groups"><img src="/charts/us_groups.svg?v={{ chart_keys.us_groups }}" alt="美股部位：產業/性質分類 (USD)" width="432" height="461"></span>
     </div>
 
     <h2>美股投資組合 (USD)</h2>
@@ -278,7 +585,7 @@ TEMPLATE = r"""
         </tr>
         {% for it in us_table %}
         <tr>
-            <td>{{ it.symbol }}</td><td class="right">{{ it.price_str }}</td><td class="right">{{ it.cost_str }}</td><td class="right">{{ it.shares_str }}</td><td class="right">{{ it.mv_str }}</td><td class="right">{{ it.weight_str }}</td><td class="right {% if it.profit_pct > 0 %}gain{% elif it.profit_pct < 0 %}loss{% endif %}">{{ it.profit_pct_str }}</td>
+            <td>{{ it.symbol }}</td><td data-cell="us:{{ it.symbol }}:price" class="right">{{ it.price_str }}</td><td class="right">{{ it.cost_str }}</td><td class="right">{{ it.shares_str }}</td><td data-cell="us:{{ it.symbol }}:mv" class="right">{{ it.mv_str }}</td><td data-cell="us:{{ it.symbol }}:weight" class="right">{{ it.weight_str }}</td><td data-cell="us:{{ it.symbol }}:pct" class="right {% if it.profit_pct > 0 %}gain{% elif it.profit_pct < 0 %}loss{% endif %}">{{ it.profit_pct_str }}</td>
         </tr>
         {% endfor %}
     </table>
@@ -286,14 +593,14 @@ TEMPLATE = r"""
     <div class="summary">
         <h3>美股總結 (全部持倉)</h3>
         <div class="summary-row">
-            <span>總市值：</span><span class="right"><b>{{ '%.2f' % us_total_market_value }}</b> USD ({{ '%.0f' % (us_total_market_value * exchange_rate) }} TWD)</span>
+            <span>總市值：</span><span data-cell="sum:us_total_market_value" class="right"><b>{{ '%.2f' % us_total_market_value }}</b> USD ({{ '%.0f' % (us_total_market_value * exchange_rate) }} TWD)</span>
         </div>
         <div class="summary-row">
-            <span>總成本：</span><span class="right"><b>{{ '%.2f' % us_total_cost }}</b> USD ({{ '%.0f' % (us_total_cost * exchange_rate) }} TWD)</span>
+            <span>總成本：</span><span data-cell="sum:us_total_cost" class="right"><b>{{ '%.2f' % us_total_cost }}</b> USD ({{ '%.0f' % (us_total_cost * exchange_rate) }} TWD)</span>
         </div>
         <div class="summary-row">
             <span>總報酬：</span>
-            <span class="right {% if us_total_profit_pct > 0 %}gain{% elif us_total_profit_pct < 0 %}loss{% endif %}">
+            <span data-cell="sum:us_total_profit_pct" class="right {% if us_total_profit_pct > 0 %}gain{% elif us_total_profit_pct < 0 %}loss{% endif %}">
                 <b>{{ '%.2f' % us_total_profit }}</b> USD ({{ '%.0f' % (us_total_profit * exchange_rate) }} TWD, {{ '%.2f' % us_total_profit_pct }}%)
             </span>
         </div>
@@ -302,14 +609,14 @@ TEMPLATE = r"""
     <div class="summary">
         <h3>美股自選股績效 (已扣除 {{ excluded_join }})</h3>
         <div class="summary-row">
-            <span>總市值：</span><span class="right"><b>{{ '%.2f' % us_core_total_market_value }}</b> USD ({{ '%.0f' % (us_core_total_market_value * exchange_rate) }} TWD)</span>
+            <span>總市值：</span><span data-cell="sum:us_core_total_market_value" class="right"><b>{{ '%.2f' % us_core_total_market_value }}</b> USD ({{ '%.0f' % (us_core_total_market_value * exchange_rate) }} TWD)</span>
         </div>
         <div class="summary-row">
-            <span>總成本：</span><span class="right"><b>{{ '%.2f' % us_core_total_cost }}</b> USD ({{ '%.0f' % (us_core_total_cost * exchange_rate) }} TWD)</span>
+            <span>總成本：</span><span data-cell="sum:us_core_total_cost" class="right"><b>{{ '%.2f' % us_core_total_cost }}</b> USD ({{ '%.0f' % (us_core_total_cost * exchange_rate) }} TWD)</span>
         </div>
         <div class="summary-row">
             <span>總報酬：</span>
-            <span class="right {% if us_core_total_profit_pct > 0 %}gain{% elif us_core_total_profit_pct < 0 %}loss{% endif %}">
+            <span data-cell="sum:us_core_total_profit_pct" class="right {% if us_core_total_profit_pct > 0 %}gain{% elif us_core_total_profit_pct < 0 %}loss{% endif %}">
                 <b>{{ '%.2f' % us_core_total_profit }}</b> USD ({{ '%.0f' % (us_core_total_profit * exchange_rate) }} TWD, {{ '%.2f' % us_core_total_profit_pct }}%)
             </span>
         </div>
@@ -322,20 +629,20 @@ TEMPLATE = r"""
         </tr>
         {% for it in tw_table %}
         <tr>
-            <td>{{ it.symbol }}</td><td class="right">{{ it.price_str }}</td><td class="right">{{ it.cost_str }}</td><td class="right">{{ it.shares_str }}</td><td class="right">{{ it.mv_str }}</td><td class="right">{{ it.weight_str }}</td><td class="right {% if it.profit_pct > 0 %}gain{% elif it.profit_pct < 0 %}loss{% endif %}">{{ it.profit_pct_str }}</td>
+            <td>{{ it.symbol }}</td><td data-cell="tw:{{ it.symbol }}:price" class="right">{{ it.price_str }}</td><td class="right">{{ it.cost_str }}</td><td class="right">{{ it.shares_str }}</td><td data-cell="tw:{{ it.symbol }}:mv" class="right">{{ it.mv_str }}</td><td data-cell="tw:{{ it.symbol }}:weight" class="right">{{ it.weight_str }}</td><td data-cell="tw:{{ it.symbol }}:pct" class="right {% if it.profit_pct > 0 %}gain{% elif it.profit_pct < 0 %}loss{% endif %}">{{ it.profit_pct_str }}</td>
         </tr>
         {% endfor %}
     </table>
     <div class="summary">
         <div class="summary-row">
-            <span>台股總市值：</span><span class="right"><b>{{ '%.0f' % tw_total_market_value }}</b> TWD</span>
+            <span>台股總市值：</span><span data-cell="sum:tw_total_market_value" class="right"><b>{{ '%.0f' % tw_total_market_value }}</b> TWD</span>
         </div>
         <div class="summary-row">
-            <span>台股總成本：</span><span class="right"><b>{{ '%.0f' % tw_total_cost }}</b> TWD</span>
+            <span>台股總成本：</span><span data-cell="sum:tw_total_cost" class="right"><b>{{ '%.0f' % tw_total_cost }}</b> TWD</span>
         </div>
         <div class="summary-row">
             <span>台股總報酬：</span>
-            <span class="right {% if tw_total_profit_pct > 0 %}gain{% elif tw_total_profit_pct < 0 %}loss{% endif %}">
+            <span data-cell="sum:tw_total_profit_pct" class="right {% if tw_total_profit_pct > 0 %}gain{% elif tw_total_profit_pct < 0 %}loss{% endif %}">
                 <b>{{ '%.0f' % tw_total_profit }}</b> TWD ({{ '%.2f' % tw_total_profit_pct }}%)
             </span>
         </div>
@@ -348,20 +655,20 @@ TEMPLATE = r"""
         </tr>
         {% for it in gold_table %}
         <tr>
-            <td>{{ it.symbol }}</td><td class="right">{{ it.price_str }}</td><td class="right">{{ it.cost_str }}</td><td class="right">{{ it.shares_str }}</td><td class="right">{{ it.mv_str }}</td><td class="right {% if it.profit_pct > 0 %}gain{% elif it.profit_pct < 0 %}loss{% endif %}">{{ it.profit_pct_str }}</td>
+            <td>{{ it.symbol }}</td><td data-cell="gold:{{ it.symbol }}:price" class="right">{{ it.price_str }}</td><td class="right">{{ it.cost_str }}</td><td class="right">{{ it.shares_str }}</td><td data-cell="gold:{{ it.symbol }}:mv" class="right">{{ it.mv_str }}</td><td data-cell="gold:{{ it.symbol }}:pct" class="right {% if it.profit_pct > 0 %}gain{% elif it.profit_pct < 0 %}loss{% endif %}">{{ it.profit_pct_str }}</td>
         </tr>
         {% endfor %}
     </table>
     <div class="summary">
         <div class="summary-row">
-            <span>黃金總市值：</span><span class="right"><b>{{ '%.2f' % gold_total_market_value_usd }}</b> USD ({{ '%.0f' % (gold_total_market_value_usd * exchange_rate) }} TWD)</span>
+            <span>黃金總市值：</span><span data-cell="sum:gold_total_market_value_usd" class="right"><b>{{ '%.2f' % gold_total_market_value_usd }}</b> USD ({{ '%.0f' % (gold_total_market_value_usd * exchange_rate) }} TWD)</span>
         </div>
         <div class="summary-row">
-            <span>黃金總成本：</span><span class="right"><b>{{ '%.2f' % gold_total_cost_usd }}</b> USD ({{ '%.0f' % (gold_total_cost_usd * exchange_rate) }} TWD)</span>
+            <span>黃金總成本：</span><span data-cell="sum:gold_total_cost_usd" class="right"><b>{{ '%.2f' % gold_total_cost_usd }}</b> USD ({{ '%.0f' % (gold_total_cost_usd * exchange_rate) }} TWD)</span>
         </div>
         <div class="summary-row">
             <span>黃金總報酬：</span>
-            <span class="right {% if gold_total_profit_pct > 0 %}gain{% elif gold_total_profit_pct < 0 %}loss{% endif %}">
+            <span data-cell="sum:gold_total_profit_pct" class="right {% if gold_total_profit_pct > 0 %}gain{% elif gold_total_profit_pct < 0 %}loss{% endif %}">
                 <b>{{ '%.2f' % gold_total_profit_usd }}</b> USD ({{ '%.0f' % (gold_total_profit_usd * exchange_rate) }} TWD, {{ '%.2f' % gold_total_profit_pct }}%)
             </span>
         </div>
@@ -374,20 +681,20 @@ TEMPLATE = r"""
         </tr>
         {% for it in short_term_bonds_table %}
         <tr>
-            <td>{{ it.symbol }}</td><td class="right">{{ it.price_str }}</td><td class="right">{{ it.cost_str }}</td><td class="right">{{ it.shares_str }}</td><td class="right">{{ it.mv_str }}</td><td class="right {% if it.profit_pct > 0 %}gain{% elif it.profit_pct < 0 %}loss{% endif %}">{{ it.profit_pct_str }}</td>
+            <td>{{ it.symbol }}</td><td data-cell="short_bonds:{{ it.symbol }}:price" class="right">{{ it.price_str }}</td><td class="right">{{ it.cost_str }}</td><td class="right">{{ it.shares_str }}</td><td data-cell="short_bonds:{{ it.symbol }}:mv" class="right">{{ it.mv_str }}</td><td data-cell="short_bonds:{{ it.symbol }}:pct" class="right {% if it.profit_pct > 0 %}gain{% elif it.profit_pct < 0 %}loss{% endif %}">{{ it.profit_pct_str }}</td>
         </tr>
         {% endfor %}
     </table>
     <div class="summary">
         <div class="summary-row">
-            <span>短債總市值：</span><span class="right"><b>{{ '%.2f' % short_term_bonds_total_market_value_usd }}</b> USD ({{ '%.0f' % (short_term_bonds_total_market_value_usd * exchange_rate) }} TWD)</span>
+            <span>短債總市值：</span><span data-cell="sum:short_term_bonds_total_market_value_usd" class="right"><b>{{ '%.2f' % short_term_bonds_total_market_value_usd }}</b> USD ({{ '%.0f' % (short_term_bonds_total_market_value_usd * exchange_rate) }} TWD)</span>
         </div>
         <div class="summary-row">
-            <span>短債總成本：</span><span class="right"><b>{{ '%.2f' % short_term_bonds_total_cost_usd }}</b> USD ({{ '%.0f' % (short_term_bonds_total_cost_usd * exchange_rate) }} TWD)</span>
+            <span>短債總成本：</span><span data-cell="sum:short_term_bonds_total_cost_usd" class="right"><b>{{ '%.2f' % short_term_bonds_total_cost_usd }}</b> USD ({{ '%.0f' % (short_term_bonds_total_cost_usd * exchange_rate) }} TWD)</span>
         </div>
         <div class="summary-row">
             <span>短債總報酬：</span>
-            <span class="right {% if short_term_bonds_total_profit_pct > 0 %}gain{% elif short_term_bonds_total_profit_pct < 0 %}loss{% endif %}">
+            <span data-cell="sum:short_term_bonds_total_profit_pct" class="right {% if short_term_bonds_total_profit_pct > 0 %}gain{% elif short_term_bonds_total_profit_pct < 0 %}loss{% endif %}">
                 <b>{{ '%.2f' % short_term_bonds_total_profit_usd }}</b> USD ({{ '%.0f' % (short_term_bonds_total_profit_usd * exchange_rate) }} TWD, {{ '%.2f' % short_term_bonds_total_profit_pct }}%)
             </span>
         </div>
@@ -400,20 +707,20 @@ TEMPLATE = r"""
         </tr>
         {% for it in long_term_bonds_table %}
         <tr>
-            <td>{{ it.symbol }}</td><td class="right">{{ it.price_str }}</td><td class="right">{{ it.cost_str }}</td><td class="right">{{ it.shares_str }}</td><td class="right">{{ it.mv_str }}</td><td class="right {% if it.profit_pct > 0 %}gain{% elif it.profit_pct < 0 %}loss{% endif %}">{{ it.profit_pct_str }}</td>
+            <td>{{ it.symbol }}</td><td data-cell="long_bonds:{{ it.symbol }}:price" class="right">{{ it.price_str }}</td><td class="right">{{ it.cost_str }}</td><td class="right">{{ it.shares_str }}</td><td data-cell="long_bonds:{{ it.symbol }}:mv" class="right">{{ it.mv_str }}</td><td data-cell="long_bonds:{{ it.symbol }}:pct" class="right {% if it.profit_pct > 0 %}gain{% elif it.profit_pct < 0 %}loss{% endif %}">{{ it.profit_pct_str }}</td>
         </tr>
         {% endfor %}
     </table>
     <div class="summary">
         <div class="summary-row">
-            <span>長債總市值：</span><span class="right"><b>{{ '%.2f' % long_term_bonds_total_market_value_usd }}</b> USD ({{ '%.0f' % (long_term_bonds_total_market_value_usd * exchange_rate) }} TWD)</span>
+            <span>長債總市值：</span><span data-cell="sum:long_term_bonds_total_market_value_usd" class="right"><b>{{ '%.2f' % long_term_bonds_total_market_value_usd }}</b> USD ({{ '%.0f' % (long_term_bonds_total_market_value_usd * exchange_rate) }} TWD)</span>
         </div>
         <div class="summary-row">
-            <span>長債總成本：</span><span class="right"><b>{{ '%.2f' % long_term_bonds_total_cost_usd }}</b> USD ({{ '%.0f' % (long_term_bonds_total_cost_usd * exchange_rate) }} TWD)</span>
+            <span>長債總成本：</span><span data-cell="sum:long_term_bonds_total_cost_usd" class="right"><b>{{ '%.2f' % long_term_bonds_total_cost_usd }}</b> USD ({{ '%.0f' % (long_term_bonds_total_cost_usd * exchange_rate) }} TWD)</span>
         </div>
         <div class="summary-row">
             <span>長債總報酬：</span>
-            <span class="right {% if long_term_bonds_total_profit_pct > 0 %}gain{% elif long_term_bonds_total_profit_pct < 0 %}loss{% endif %}">
+            <span data-cell="sum:long_term_bonds_total_profit_pct" class="right {% if long_term_bonds_total_profit_pct > 0 %}gain{% elif long_term_bonds_total_profit_pct < 0 %}loss{% endif %}">
                 <b>{{ '%.2f' % long_term_bonds_total_profit_usd }}</b> USD ({{ '%.0f' % (long_term_bonds_total_profit_usd * exchange_rate) }} TWD, {{ '%.2f' % long_term_bonds_total_profit_pct }}%)
             </span>
         </div>
@@ -426,13 +733,13 @@ TEMPLATE = r"""
         </tr>
         {% for it in cash_table %}
         <tr>
-            <td>{{ it.currency }}</td><td class="right">{{ it.amount_str }}</td><td class="right">{{ it.mv_twd_str }}</td>
+            <td>{{ it.currency }}</td><td class="right">{{ it.amount_str }}</td><td data-cell="cash:{{ it.currency }}:mv" class="right">{{ it.mv_twd_str }}</td>
         </tr>
         {% endfor %}
     </table>
     <div class="summary">
         <div class="summary-row">
-            <span>現金總部位 (TWD)：</span><span class="right"><b>{{ '%.0f' % cash_total_value_twd }}</b> TWD</span>
+            <span>現金總部位 (TWD)：</span><span data-cell="sum:cash_total_value_twd" class="right"><b>{{ '%.0f' % cash_total_value_twd }}</b> TWD</span>
         </div>
     </div>
 
@@ -443,20 +750,20 @@ TEMPLATE = r"""
         </tr>
         {% for it in crypto_table %}
         <tr>
-            <td>{{ it.symbol }}</td><td class="right">{{ it.price_str }}</td><td class="right">{{ it.cost_str }}</td><td class="right">{{ it.amount_str }}</td><td class="right">{{ it.mv_str }}</td><td class="right {% if it.profit_pct > 0 %}gain{% elif it.profit_pct < 0 %}loss{% endif %}">{{ it.profit_pct_str }}</td>
+            <td>{{ it.symbol }}</td><td data-cell="crypto:{{ it.symbol }}:price" class="right">{{ it.price_str }}</td><td class="right">{{ it.cost_str }}</td><td class="right">{{ it.amount_str }}</td><td data-cell="crypto:{{ it.symbol }}:mv" class="right">{{ it.mv_str }}</td><td data-cell="crypto:{{ it.symbol }}:pct" class="right {% if it.profit_pct > 0 %}gain{% elif it.profit_pct < 0 %}loss{% endif %}">{{ it.profit_pct_str }}</td>
         </tr>
         {% endfor %}
     </table>
     <div class="summary">
         <div class="summary-row">
-            <span>加密貨幣總市值：</span><span class="right"><b>{{ '%.2f' % crypto_total_market_value_usd }}</b> USD ({{ '%.0f' % (crypto_total_market_value_usd * exchange_rate) }} TWD)</span>
+            <span>加密貨幣總市值：</span><span data-cell="sum:crypto_total_market_value_usd" class="right"><b>{{ '%.2f' % crypto_total_market_value_usd }}</b> USD ({{ '%.0f' % (crypto_total_market_value_usd * exchange_rate) }} TWD)</span>
         </div>
         <div class="summary-row">
-            <span>加密貨幣總成本：</span><span class="right"><b>{{ '%.2f' % crypto_total_cost_usd }}</b> USD ({{ '%.0f' % (crypto_total_cost_usd * exchange_rate) }} TWD)</span>
+            <span>加密貨幣總成本：</span><span data-cell="sum:crypto_total_cost_usd" class="right"><b>{{ '%.2f' % crypto_total_cost_usd }}</b> USD ({{ '%.0f' % (crypto_total_cost_usd * exchange_rate) }} TWD)</span>
         </div>
         <div class="summary-row">
             <span>加密貨幣總報酬：</span>
-            <span class="right {% if crypto_total_profit_pct > 0 %}gain{% elif crypto_total_profit_pct < 0 %}loss{% endif %}">
+            <span data-cell="sum:crypto_total_profit_pct" class="right {% if crypto_total_profit_pct > 0 %}gain{% elif crypto_total_profit_pct < 0 %}loss{% endif %}">
                 <b>{{ '%.2f' % crypto_total_profit_usd }}</b> USD ({{ '%.0f' % (crypto_total_profit_usd * exchange_rate) }} TWD, {{ '%.2f' % crypto_total_profit_pct }}%)
             </span>
         </div>
@@ -464,294 +771,172 @@ TEMPLATE = r"""
 
 </div>
 <script>
-document.addEventListener('DOMContentLoaded', function () {
-    Chart.register(ChartDataLabels);
-    const ctx = document.getElementById('assetAllocationChart').getContext('2d');
-    const data = {
-        labels: ['股票', '現金', '加密貨幣', '黃金', '短債', '長債'],
-        datasets: [{
-            label: '資產分佈 (TWD)',
-            data: [
-                {{ total_stock_value_twd or 0 }},
-                {{ cash_total_value_twd or 0 }},
-                {{ total_crypto_value_twd or 0 }},
-                {{ gold_total_value_twd or 0 }},
-                {{ short_term_bonds_total_value_twd or 0 }},
-                {{ long_term_bonds_total_value_twd or 0 }}
-            ],
-            backgroundColor: [
-                'rgba(75, 192, 192, 0.7)',
-                'rgba(54, 162, 235, 0.7)',
-                'rgba(255, 206, 86, 0.7)',
-                'rgba(255, 99, 132, 0.7)',
-                'rgba(153, 102, 255, 0.7)',
-                'rgba(255, 159, 64, 0.7)'
-            ],
-            borderColor: '#fff',
-            borderWidth: 2
-        }]
-    };
-    const config = {
-        type: 'pie',
-        data: data,
-        options: {
-            responsive: true,
-            plugins: {
-                legend: {
-                    position: 'top',
-                },
-                title: {
-                    display: true,
-                    text: '資產分佈 (TWD)',
-                    font: { size: 18 }
-                },
-                tooltip: {
-                    callbacks: {
-                        label: function(context) {
-                            let label = context.label || '';
-                            if (label) { label += ': '; }
-                            if (context.parsed !== null) {
-                                const total = context.chart.data.datasets[0].data.reduce((a, b) => a + b, 0);
-                                const percentage = ((context.parsed / total) * 100).toFixed(2);
-                                label += new Intl.NumberFormat('en-US', { style: 'currency', currency: 'TWD', maximumFractionDigits: 0 }).format(context.parsed) + ` (${percentage}%)`;
-                            }
-                            return label;
-                        }
-                    }
-                },
-                datalabels: {
-                    formatter: (value, ctx) => {
-                        const total = ctx.chart.data.datasets[0].data.reduce((a, b) => a + b, 0);
-                        if (total === 0) return '0%';
-                        const percentage = value / total * 100;
-                        return percentage > 2 ? percentage.toFixed(1) + '%' : '';
-                    },
-                    color: '#fff',
-                    font: {
-                        weight: 'bold',
-                        size: 14,
-                    },
-                    textStrokeColor: '#333',
-                    textStrokeWidth: 2
-                }
-            }
-        },
-    };
-    new Chart(ctx, config);
-
-    // ===== 美股部位四大類圓餅圖 =====
-    const ctxUS = document.getElementById('usGroupChart').getContext('2d');
-    const usData = {
-        labels: ['電力股', '指數投資', '防禦股', '科技股(其他)'],
-        datasets: [{
-            label: '美股部位 (USD)',
-            data: [
-                {{ power_total_usd or 0 }},
-                {{ index_total_usd or 0 }},
-                {{ defense_total_usd or 0 }},
-                {{ tech_other_total_usd or 0 }}
-            ],
-            backgroundColor: [
-                'rgba(255, 159, 64, 0.7)',   // 電力
-                'rgba(54, 162, 235, 0.7)',   // 指數
-                'rgba(75, 192, 192, 0.7)',   // 防禦
-                'rgba(153, 102, 255, 0.7)'   // 科技(其他)
-            ],
-            borderColor: '#fff',
-            borderWidth: 2
-        }]
-    };
-    const usConfig = {
-        type: 'pie',
-        data: usData,
-        options: {
-            responsive: true,
-            plugins: {
-                legend: { position: 'top' },
-                title: {
-                    display: true,
-                    text: '美股部位：產業/性質分類 (USD)',
-                    font: { size: 18 }
-                },
-                tooltip: {
-                    callbacks: {
-                        label: function(context) {
-                            let label = context.label ? context.label + ': ' : '';
-                            if (context.parsed !== null) {
-                                const total = context.chart.data.datasets[0].data.reduce((a,b)=>a+b,0);
-                                const pct = total ? (context.parsed/total*100).toFixed(2) : '0.00';
-                                label += new Intl.NumberFormat('en-US', { style: 'currency', currency: 'USD', maximumFractionDigits: 0 }).format(context.parsed);
-                                label += ` (${pct}%)`;
-                            }
-                            return label;
-                        }
-                    }
-                },
-                datalabels: {
-                    formatter: (value, ctx) => {
-                        const total = ctx.chart.data.datasets[0].data.reduce((a,b)=>a+b,0);
-                        if (!total) return '0%';
-                        const pct = value / total * 100;
-                        return pct > 2 ? pct.toFixed(1) + '%' : '';
-                    },
-                    color: '#fff',
-                    font: { weight: 'bold', size: 14 },
-                    textStrokeColor: '#333',
-                    textStrokeWidth: 2
-                }
-            }
+// 即時更新：/stream 以 SSE 推送有變動的儲存格，原地替換，不必整頁重新載入
+(function () {
+    if (!window.EventSource) return;
+    const cells = {};
+    document.querySelectorAll('[data-cell]').forEach(function (el) { cells[el.dataset.cell] = el; });
+    const es = new EventSource('/stream{{ "?hide_etf=1" if hide_etf else "" }}');
+    function apply(e) {
+        const changed = JSON.parse(e.data);
+        for (const id in changed) {
+            const el = cells[id];
+            if (el) { el.className = changed[id][0]; el.innerHTML = changed[id][1]; }
         }
+    }
+    es.addEventListener('patch', apply);
+    es.addEventListener('reset', apply);
+    // 伺服器串流名額已滿（503）時 EventSource 不會自己重連：改成定時重新載入整頁
+    es.onerror = function () {
+        if (es.readyState === EventSource.CLOSED) setTimeout(function () { location.reload(); }, {{ stream_retry_ms }});
     };
-    new Chart(ctxUS, usConfig);
-});
+})();
 </script>
 </body>
 </html>
 """
+_TEMPLATE = app.jinja_env.from_string(TEMPLATE)   # import 時編譯一次，請求只做 render
 
-# ============== Helper Function ==============
-def process_usd_asset_portfolio(portfolio, price_fetcher, amount_key='shares'):
-    """通用函式，處理以美元計價的資產組合"""
-    items = []
-    for row in portfolio:
-        price = price_fetcher(row['symbol'])
-        cost_total = row['cost'] * row[amount_key]
-        if price == 'N/A' or cost_total == 0:
-            mv, profit_pct = 0.0, 0.0
-        else:
-            mv = price * row[amount_key]
-            profit_pct = (mv - cost_total) / cost_total * 100
-        items.append({"symbol": row['symbol'], "price": price, amount_key: row[amount_key],"cost": row['cost'], "market_value": mv, "profit_pct": profit_pct})
-    
-    total_market_value = sum(it["market_value"] for it in items)
-    total_cost = sum(r['cost'] * r[amount_key] for r in portfolio)
-    total_profit = total_market_value - total_cost
-    total_profit_pct = (total_profit / total_cost * 100) if total_cost else 0.0
-    
-    table_items = []
-    for it in items:
-        table_items.append({
-            **it,
-            "price_str": f"{it['price']:,.2f}" if it['price'] != 'N/A' else 'N/A',
-            "cost_str": f"{it['cost']:,.2f}",
-            f"{amount_key}_str": f"{it[amount_key]:,.4f}".rstrip('0').rstrip('.'),
-            "mv_str": f"{it['market_value']:,.2f}",
-            "profit_pct_str": f"{it['profit_pct']:.2f}%" if it['price'] != 'N/A' else 'N/A',
-        })
-    table_items.sort(key=lambda x: x["market_value"], reverse=True)
-
-    # 為了讓模板的 key 一致，統一命名為 'shares_str' 或 'amount_str' 供 HTML 使用
-    if amount_key == 'amount':
-        for item in table_items:
-            item['amount_str'] = item[f'{amount_key}_str']
-    else: # 預設為 shares
-        for item in table_items:
-            item['shares_str'] = item[f'{amount_key}_str']
+# ============== 部位估值（欄式引擎，見 holdings.py） ==============
+# 持倉設定是常數，import 時就載成欄式陣列；每次請求只換價格向量
+US_BOOK     = Book(US_PORTFOLIO)
+TW_BOOK     = Book(TW_PORTFOLIO, currency='TWD', fmt=TWD_FMT)
+GOLD_BOOK   = Book(GOLD_PORTFOLIO)
+SHORT_BOOK  = Book(SHORT_TERM_BONDS)
+LONG_BOOK   = Book(LONG_TERM_BONDS)
+CRYPTO_BOOK = Book(CRYPTO_PORTFOLIO, amount_key='amount')
 
+def process_usd_asset_portfolio(book, price_fetcher):
+    """通用函式，處理以美元計價的資產組合（表格列為 lazy 格式化的 Row）。"""
+    val = book.value(price_fetcher)
     return {
-        "table": table_items,
-        "total_market_value_usd": total_market_value,
-        "total_cost_usd": total_cost,
-        "total_profit_usd": total_profit,
-        "total_profit_pct": total_profit_pct
+        "valuation": val,
+        "table": val.rows(),
+        "total_market_value_usd": val.total_market_value,
+        "total_cost_usd": val.total_cost,
+        "total_profit_usd": val.total_profit,
+        "total_profit_pct": val.total_profit_pct,
     }
 
 
 # ============== 路由 ==============
+# ---- 整頁快取：同一組查詢參數、同一個資料版本 → HTML 逐位元組相同，直接回傳並帶強 ETag
+_page_cache = {}          # hide_etf -> (data_version, body, etag)
+_page_cache_lock = threading.Lock()
+
+# ---- 快照：某個資料版本下所有部位的估值與總計；首頁與 /api/* 共用，同一版本只算一次
+_snapshot = None
+_snapshot_lock = threading.Lock()
+
+def current_snapshot():
+    """目前資料版本的快照（見 compute_snapshot）；版本沒變就直接回傳上一次算好的。"""
+    global _snapshot
+    # 先一次批次抓齊本頁所有代碼，後面的 cached_close 幾乎都會命中快取；
+    # 背景更新器暖機後這一步交給它，請求端只讀記憶體
+    if not _refresher_warm.is_set():
+        prefetch_history(_page_symbols())
+    version, changed_at = _cache.version()
+    with _snapshot_lock:
+        if _snapshot is None or _snapshot["version"] != version:
+            # 更新時間＝報價最後一次變動的時間，資料沒變時頁面才會完全一樣
+            updated_at_tw = datetime.fromtimestamp(changed_at or _now(), timezone('Asia/Taipei')).strftime("%Y-%m-%d %H:%M:%S")
+            _snapshot = compute_snapshot(version, updated_at_tw)
+        return _snapshot
+
+def _page_body(hide_etf, snap):
+    """(HTML, ETag)；同一資料版本只渲染一次。"""
+    with _page_cache_lock:
+        hit = _page_cache.get(hide_etf)
+    if hit and hit[0] == snap["version"]:
+        return hit[1], hit[2]
+    body = render_home(hide_etf, snap)
+    etag = hashlib.sha1(body.encode("utf-8")).hexdigest()
+    with _page_cache_lock:
+        _page_cache[hide_etf] = (snap["version"], body, etag)
+    return body, etag
+
 @app.route("/")
 def home():
-    updated_at_tw = datetime.now(timezone('Asia/Taipei')).strftime("%Y-%m-%d %H:%M:%S")
-    exchange_rate = get_currency_rate('USDTWD', default=32.5)
+    hide_etf = request.args.get('hide_etf') in ('1', 'true', 'on', 'yes')
+    body, etag = _page_body(hide_etf, current_snapshot())
+    resp = make_response(body)
+    resp.set_etag(etag)
+    resp.cache_control.no_cache = True   # 瀏覽器每次都回來驗證，資料沒變就拿 304
+    return resp.make_conditional(request)
+
+def compute_snapshot(version, updated_at_tw):
+    """
+    計算所有部位的估值與總計（不渲染）。回傳：
+    args（首頁模板參數，不含 hide_etf／us_table）、books（各部位的 Valuation）、
+    cash（各幣別現金與折台幣）、totals_twd（總覽）。
+    """
+    fx = fx_matrix()
+    exchange_rate = fx.rate('USD', 'TWD')
 
     # ---- 美股資料
-    us_data = process_usd_asset_portfolio(US_PORTFOLIO, cached_close)
+    us_data = process_usd_asset_portfolio(US_BOOK, cached_close)
+    us_val = us_data['valuation']
     us_total_market_value = us_data['total_market_value_usd']
     us_total_cost = us_data['total_cost_usd']
     us_total_profit = us_data['total_profit_usd']
     us_total_profit_pct = us_data['total_profit_pct']
 
     # ---- 美股部位四大類（以全部美股持倉計算，含 ETF；單位 USD）
-    power_total_usd = 0.0
-    index_total_usd = 0.0
-    defense_total_usd = 0.0
-    tech_other_total_usd = 0.0
-    for it in us_data['table']:  # it: {'symbol','market_value',...}
-        sym = it['symbol']
-        mv  = it['market_value']
-        if sym in US_GROUP_POWER:
-            power_total_usd += mv
-        elif sym in US_GROUP_INDEX:
-            index_total_usd += mv
-        elif sym in US_GROUP_DEFENSE:
-            defense_total_usd += mv
-        else:
-            tech_other_total_usd += mv
+    power_total_usd, index_total_usd, defense_total_usd, tech_other_total_usd = (
+        float(v) for v in us_val.group_totals((US_GROUP_POWER, US_GROUP_INDEX, US_GROUP_DEFENSE)))
 
     # ===== 美股「自選股」摘要（排除 ETF）=====
-    us_core_items = [it for it in us_data['table'] if it["symbol"] not in EXCLUDED_ETFS_US]
-    us_core_total_market_value = sum(it["market_value"] for it in us_core_items)
-    us_core_total_cost = sum(r['cost'] * r['shares'] for r in US_PORTFOLIO if r['symbol'] not in EXCLUDED_ETFS_US)
-    us_core_total_profit = us_core_total_market_value - us_core_total_cost
-    us_core_total_profit_pct = (us_core_total_profit / us_core_total_cost * 100) if us_core_total_cost else 0.0
-
-    # 切換：隱藏 ETF（影響表格與佔比分母）
-    hide_etf = request.args.get('hide_etf') in ('1', 'true', 'on', 'yes')
-    us_table_src = us_core_items if hide_etf else us_data['table']
-    us_denominator = sum(it["market_value"] for it in us_table_src) or 1
-    for it in us_table_src:
-        it["weight_str"] = f"{(it['market_value'] / us_denominator * 100):.2f}%"
-    us_table = us_table_src
+    us_core_val = us_val.subset(US_BOOK.mask_not_in(EXCLUDED_ETFS_US))
+    us_core_total_market_value = us_core_val.total_market_value
+    us_core_total_cost = us_core_val.total_cost
+    us_core_total_profit = us_core_val.total_profit
+    us_core_total_profit_pct = us_core_val.total_profit_pct
 
     # ---- 台股資料
-    tw_items = []
-    for row in TW_PORTFOLIO:
-        price = get_tw_stock_price(row['symbol'])
-        cost_total = row['cost'] * row['shares']
-        if price == 'N/A' or cost_total == 0: mv, profit_pct = 0.0, 0.0
-        else: mv, profit_pct = price * row['shares'], ((price * row['shares']) - cost_total) / cost_total * 100
-        tw_items.append({"symbol": row['symbol'], "price": price, "shares": row['shares'], "cost": row['cost'], "market_value": mv, "profit_pct": profit_pct})
-    tw_total_market_value = sum(it["market_value"] for it in tw_items)
-    tw_total_cost = sum(r['cost'] * r['shares'] for r in TW_PORTFOLIO)
-    tw_total_profit = tw_total_market_value - tw_total_cost
-    tw_total_profit_pct = (tw_total_profit / tw_total_cost * 100) if tw_total_cost else 0.0
-    tw_denominator = tw_total_market_value or 1
-    tw_table = []
-    for it in tw_items:
-        tw_table.append({**it, "price_str": f"{it['price']:.2f}" if it['price']!='N/A' else 'N/A', "cost_str": f"{it['cost']:.2f}", "shares_str": f"{it['shares']:,}".rstrip('0').rstrip('.'), "mv_str": f"{it['market_value']:,.0f}", "profit_pct_str": f"{it['profit_pct']:.2f}%" if it['price']!='N/A' else 'N/A', "weight_str": f"{(it['market_value']/tw_denominator*100):.2f}%"})
-    tw_table.sort(key=lambda x: x["market_value"], reverse=True)
+    tw_val = TW_BOOK.value(get_tw_stock_price)
+    tw_total_market_value = tw_val.total_market_value
+    tw_total_cost = tw_val.total_cost
+    tw_total_profit = tw_val.total_profit
+    tw_total_profit_pct = tw_val.total_profit_pct
+    tw_table = tw_val.rows(weight_denominator=tw_total_market_value or 1)
 
     # ---- 債券 & 加密貨幣 & 現金 & 黃金
-    short_term_bonds_data = process_usd_asset_portfolio(SHORT_TERM_BONDS, cached_close)
-    long_term_bonds_data = process_usd_asset_portfolio(LONG_TERM_BONDS, cached_close)
-    crypto_data = process_usd_asset_portfolio(CRYPTO_PORTFOLIO, get_crypto_price, amount_key='amount')
-    gold_data = process_usd_asset_portfolio(GOLD_PORTFOLIO, cached_close)
-    
-    cash_table = []
-    cash_total_value_twd = 0.0
-    for row in CASH_HOLDINGS:
-        rate = 1.0 if row['currency'] == 'TWD' else get_currency_rate(f"{row['currency']}TWD", 1.0)
-        mv_twd = row['amount'] * rate
-        cash_total_value_twd += mv_twd
-        cash_table.append({"currency": row['currency'], "amount_str": f"{row['amount']:,.2f}", "mv_twd_str": f"{mv_twd:,.0f}"})
-    
-    # ---- 總覽（折台幣）
-    total_stock_value_twd = (us_total_market_value * exchange_rate) + tw_total_market_value
-    short_term_bonds_total_value_twd = short_term_bonds_data['total_market_value_usd'] * exchange_rate
-    long_term_bonds_total_value_twd = long_term_bonds_data['total_market_value_usd'] * exchange_rate
-    total_crypto_value_twd = crypto_data['total_market_value_usd'] * exchange_rate
-    gold_total_value_twd = gold_data['total_market_value_usd'] * exchange_rate
-    
-    grand_total_market_value_twd = total_stock_value_twd + cash_total_value_twd + total_crypto_value_twd + short_term_bonds_total_value_twd + long_term_bonds_total_value_twd + gold_total_value_twd
+    short_term_bonds_data = process_usd_asset_portfolio(SHORT_BOOK, cached_close)
+    long_term_bonds_data = process_usd_asset_portfolio(LONG_BOOK, cached_close)
+    crypto_data = process_usd_asset_portfolio(CRYPTO_BOOK, get_crypto_price)
+    gold_data = process_usd_asset_portfolio(GOLD_BOOK, cached_close)
     
-    grand_total_cost_twd = (us_total_cost * exchange_rate) + tw_total_cost + (short_term_bonds_data['total_cost_usd'] * exchange_rate) + (long_term_bonds_data['total_cost_usd'] * exchange_rate) + cash_total_value_twd + (crypto_data['total_cost_usd'] * exchange_rate) + (gold_data['total_cost_usd'] * exchange_rate)
+    cash_twd = fx.convert([r['amount'] for r in CASH_HOLDINGS], [r['currency'] for r in CASH_HOLDINGS], 'TWD', default=1.0)
+    cash_total_value_twd = float(cash_twd.sum())
+    cash_table = [{"currency": row['currency'], "amount_str": f"{row['amount']:,.2f}", "mv_twd_str": f"{mv_twd:,.0f}"}
+                  for row, mv_twd in zip(CASH_HOLDINGS, cash_twd)]
+
+    # ---- 總覽（折台幣）：各部位的 (計價幣別, 市值, 成本) 排成一欄，一次乘上匯率矩陣
+    legs = [
+        ('USD', us_total_market_value, us_total_cost),
+        ('TWD', tw_total_market_value, tw_total_cost),
+        ('USD', short_term_bonds_data['total_market_value_usd'], short_term_bonds_data['total_cost_usd']),
+        ('USD', long_term_bonds_data['total_market_value_usd'], long_term_bonds_data['total_cost_usd']),
+        ('USD', crypto_data['total_market_value_usd'], crypto_data['total_cost_usd']),
+        ('USD', gold_data['total_market_value_usd'], gold_data['total_cost_usd']),
+    ]
+    leg_ccy = [c for c, _, _ in legs]
+    mv_twd = fx.convert([mv for _, mv, _ in legs], leg_ccy, 'TWD')
+    cost_twd = fx.convert([cost for _, _, cost in legs], leg_ccy, 'TWD')
+    us_mv_twd, tw_mv_twd, short_term_bonds_total_value_twd, long_term_bonds_total_value_twd, \
+        total_crypto_value_twd, gold_total_value_twd = (float(v) for v in mv_twd)
+    total_stock_value_twd = us_mv_twd + tw_mv_twd
+
+    grand_total_market_value_twd = float(mv_twd.sum()) + cash_total_value_twd
+    grand_total_cost_twd = float(cost_twd.sum()) + cash_total_value_twd
     
     grand_total_profit_twd = grand_total_market_value_twd - grand_total_cost_twd
     grand_total_profit_pct = (grand_total_profit_twd / grand_total_cost_twd * 100) if grand_total_cost_twd else 0.0
     
     # ---- 組合樣板參數 ----
     template_args = {
-        'updated_at': updated_at_tw, 'exchange_rate': exchange_rate, 'hide_etf': hide_etf, 'excluded_join': "、".join(sorted(EXCLUDED_ETFS_US)),
-        'us_table': us_table, 'us_total_market_value': us_total_market_value, 'us_total_cost': us_total_cost, 'us_total_profit': us_total_profit, 'us_total_profit_pct': us_total_profit_pct,
+        'updated_at': updated_at_tw, 'exchange_rate': exchange_rate, 'excluded_join': "、".join(sorted(EXCLUDED_ETFS_US)),
+        'us_total_market_value': us_total_market_value, 'us_total_cost': us_total_cost, 'us_total_profit': us_total_profit, 'us_total_profit_pct': us_total_profit_pct,
         'us_core_total_market_value': us_core_total_market_value, 'us_core_total_cost': us_core_total_cost, 'us_core_total_profit': us_core_total_profit, 'us_core_total_profit_pct': us_core_total_profit_pct,
         'tw_table': tw_table, 'tw_total_market_value': tw_total_market_value, 'tw_total_cost': tw_total_cost, 'tw_total_profit': tw_total_profit, 'tw_total_profit_pct': tw_total_profit_pct,
         'cash_table': cash_table, 'cash_total_value_twd': cash_total_value_twd,
@@ -769,13 +954,291 @@ def home():
         'tech_other_total_usd': tech_other_total_usd,
     }
 
+    # ---- 圓餅圖資料（/charts/*，由 chart.py 在伺服器端畫）；模板只放資料雜湊當圖片網址參數
+    charts = {
+        "allocation": pie_spec('資產分佈 (TWD)', ['股票', '現金', '加密貨幣', '黃金', '短債', '長債'],
+                               [total_stock_value_twd, cash_total_value_twd, total_crypto_value_twd, gold_total_value_twd,
+                                short_term_bonds_total_value_twd, long_term_bonds_total_value_twd],
+                               colors=['teal', 'blue', 'yellow', 'red', 'purple', 'orange'], currency='TWD'),
+        "us_groups": pie_spec('美股部位：產業/性質分類 (USD)', ['電力股', '指數投資', '防禦股', '科技股(其他)'],
+                              [power_total_usd, index_total_usd, defense_total_usd, tech_other_total_usd],
+                              colors=['orange', 'blue', 'teal', 'purple'], currency='USD'),
+    }
+    template_args['chart_keys'] = {name: spec_key(spec) for name, spec in charts.items()}
+
     # 使用清晰的前綴來合併字典
     for prefix, data_dict in [('short_term_bonds', short_term_bonds_data), ('long_term_bonds', long_term_bonds_data), ('crypto', crypto_data), ('gold', gold_data)]:
         for key, value in data_dict.items():
             template_args[f'{prefix}_{key}'] = value
 
-    return render_template_string(TEMPLATE, **template_args)
+    return {
+        "version": version,
+        "updated_at": updated_at_tw,
+        "exchange_rate": exchange_rate,
+        "args": template_args,
+        "books": {
+            "us": us_val, "us_core": us_core_val, "tw": tw_val, "gold": gold_data['valuation'],
+            "short_bonds": short_term_bonds_data['valuation'], "long_bonds": long_term_bonds_data['valuation'],
+            "crypto": crypto_data['valuation'],
+        },
+        "charts": charts,
+        "cash": {
+            "currency": np.array([r['currency'] for r in CASH_HOLDINGS], dtype=object),
+            "amount": np.array([r['amount'] for r in CASH_HOLDINGS], dtype='float64'),
+            "market_value_twd": cash_twd,
+        },
+        "totals_twd": {
+            "stocks": total_stock_value_twd, "short_bonds": short_term_bonds_total_value_twd,
+            "long_bonds": long_term_bonds_total_value_twd, "crypto": total_crypto_value_twd,
+            "gold": gold_total_value_twd, "cash": cash_total_value_twd,
+            "market_value": grand_total_market_value_twd, "cost": grand_total_cost_twd,
+            "profit": grand_total_profit_twd, "profit_pct": grand_total_profit_pct,
+        },
+    }
+
+def render_home(hide_etf, snap):
+    """以快照渲染首頁 HTML；只有美股表格（與佔比分母）依 hide_etf 切換。"""
+    us_table_val = snap["books"]["us_core" if hide_etf else "us"]
+    us_table = us_table_val.rows(weight_denominator=us_table_val.total_market_value or 1)
+    return render_template(_TEMPLATE, **snap["args"], hide_etf=hide_etf, us_table=us_table,
+                           stream_retry_ms=_STREAM_RETRY_AFTER * 1000)
+
+
+# ---- JSON／欄式 API：與首頁共用同一份快照，監控不必再解析 HTML
+_API_BOOKS = ("us", "us_core", "tw", "gold", "short_bonds", "long_bonds", "crypto", "cash")
+
+def _api_columns(snap, name):
+    if name == "cash":
+        return dict(snap["cash"])
+    return snap["books"][name].columns()
 
+def _json_value(v):
+    v = v.item() if isinstance(v, np.generic) else v
+    return None if isinstance(v, float) and np.isnan(v) else v
+
+def _json_columns(cols):
+    return {k: [_json_value(v) for v in a] for k, a in cols.items()}
+
+def _api_book(snap, name):
+    cols = _api_columns(snap, name)
+    if name == "cash":
+        return {"currency": "TWD", "totals": {"market_value": snap["totals_twd"]["cash"]}, "columns": _json_columns(cols)}
+    val = snap["books"][name]
+    return {"currency": "TWD" if name == "tw" else "USD", "totals": val.totals(), "columns": _json_columns(cols)}
+
+def _json_response(payload):
+    body = json.dumps(payload, ensure_ascii=False, separators=(",", ":"))
+    resp = make_response(body)
+    resp.mimetype = "application/json"
+    resp.set_etag(hashlib.sha1(body.encode("utf-8")).hexdigest())
+    resp.cache_control.no_cache = True
+    return resp.make_conditional(request)
+
+def _csv_stream(cols):
+    """逐列產生 CSV（大部位也不必先組出整份字串）。"""
+    names = list(cols)
+    yield ",".join(names) + "\n"
+    for row in zip(*(cols[n] for n in names)):
+        yield ",".join("" if v is None else str(v) for v in map(_json_value, row)) + "\n"
+
+def _arrow_body(cols):
+    table = pa.table({k: (a.astype(str) if a.dtype == object else a) for k, a in cols.items()})
+    sink = io.BytesIO()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue()
+
+@app.get("/api/snapshot")
+def api_snapshot():
+    """所有部位的持倉與總計（JSON，欄式）。"""
+    snap = current_snapshot()
+    return _json_response({
+        "updated_at": snap["updated_at"],
+        "exchange_rate": snap["exchange_rate"],
+        "totals_twd": snap["totals_twd"],
+        "books": {name: _api_book(snap, name) for name in _API_BOOKS},
+    })
+
+@app.get("/api/books/<name>")
+def api_book(name):
+    """單一部位；?format=json（預設）／csv（串流）／arrow（Arrow IPC stream，需安裝 pyarrow）。"""
+    if name not in _API_BOOKS:
+        return {"error": f"unknown book: {name}", "books": list(_API_BOOKS)}, 404
+    fmt = request.args.get("format", "json")
+    snap = current_snapshot()
+    if fmt == "json":
+        return _json_response({"updated_at": snap["updated_at"], **_api_book(snap, name)})
+    if fmt == "csv":
+        return Response(_csv_stream(_api_columns(snap, name)), mimetype="text/csv")
+    if fmt == "arrow":
+        if pa is None:
+            return {"error": "format=arrow requires pyarrow"}, 406
+        return Response(_arrow_body(_api_columns(snap, name)), mimetype="application/vnd.apache.arrow.stream")
+    return {"error": f"unknown format: {fmt}", "formats": ["json", "csv", "arrow"]}, 400
+
+
+# ---- 伺服器端圓餅圖：與首頁共用快照，同一份資料只畫一次（見 chart.py）
+@app.get("/charts/<name>.<fmt>")
+def chart_image(name, fmt):
+    """/charts/allocation.svg、/charts/us_groups.svg（也可 .png）。
+    網址帶的 ?v= 等於目前資料雜湊時可長期快取；否則每次回來驗證 ETag。"""
+    snap = current_snapshot()
+    spec = snap["charts"].get(name)
+    if spec is None or fmt not in CHART_FORMATS:
+        return {"error": f"unknown chart: {name}.{fmt}", "charts": sorted(snap["charts"]), "formats": list(CHART_FORMATS)}, 404
+    key, body = render_chart(spec, fmt)
+    resp = make_response(body)
+    resp.mimetype = CHART_FORMATS[fmt]
+    resp.set_etag(f"{key}-{fmt}")
+    if request.args.get("v") == key:
+        resp.cache_control.public = True
+        resp.cache_control.max_age = 365 * 86400
+        resp.cache_control.immutable = True
+    else:
+        resp.cache_control.no_cache = True
+    return resp.make_conditional(request)
+
+
+# ---- 即時串流（SSE）：資料版本一變，就把首頁上有變動的儲存格推給所有開著的頁面。
+# 儲存格直接從已渲染（且已快取）的首頁 HTML 中的 data-cell 取出，格式與整頁完全一致；
+# 每個版本只算一次差異、編碼一次，之後每位觀看者只是把同一段位元組送出去。
+# 事件 id 是共用的資料版本（"line.版本"，與 ETag 同一個來源），換到別的 worker 重連也看得懂；
+# Last-Event-ID 不是這個 worker 上一次或目前的版本（或屬於別條序列）時一律送完整的 reset。
+# 每條 SSE 連線整段期間都佔著一個 gthread 執行緒（Procfile：--threads 16），所以每個 worker 只開少數幾個名額，
+# 其餘執行緒留給一般請求；額滿回 503，頁面改成定時重新載入（輪詢）。連線也不留太久，名額會輪替。
+_STREAM_HEARTBEAT   = 15   # 秒：沒有變動時送註解行保持連線（也順便檢查資料版本）
+_STREAM_MAX_AGE     = 120  # 秒：連線最長保留時間，到期後瀏覽器會自動帶 Last-Event-ID 重連
+_STREAM_MAX_VIEWERS = int(os.environ.get("STREAM_MAX_VIEWERS", 4))   # 每個 worker 同時開著的串流上限
+_STREAM_RETRY_AFTER = 60   # 秒：額滿時請頁面隔多久重新載入
+_CELL_RE = re.compile(r'<(td|span|b) data-cell="([^"]+)"(?: class="([^"]*)")?>(.*?)</\1>', re.S)
+
+def _page_cells(body):
+    """首頁 HTML → {cell_id: [class, innerHTML]}。"""
+    return {cid: [cls, inner.strip()] for _, cid, cls, inner in _CELL_RE.findall(body)}
+
+def _sse(event, event_id, payload):
+    return f"id: {event_id}\nevent: {event}\ndata: {json.dumps(payload, ensure_ascii=False, separators=(',', ':'))}\n\n".encode("utf-8")
+
+def _event_id(version):
+    return f"{_cache.line}.{version}"
+
+class _StreamHub:
+    """最新的儲存格狀態與事件（依 hide_etf 分兩份）；觀看者以 Condition 等下一個事件 id。"""
+    def __init__(self):
+        self.cond = threading.Condition()
+        self.event_id = None   # 目前狀態的事件 id
+        self.base_id = None    # patch 的起點（上一次發佈的事件 id）
+        self.version = None
+        self.viewers = 0
+        self.cells = {False: {}, True: {}}
+        self.patch = {False: b"", True: b""}   # base_id → event_id 的差異
+        self.reset = {False: b"", True: b""}   # event_id 時的完整狀態（給落後、剛連上或 id 不認得的觀看者）
+        self.stats = {"published": 0, "bytes_sent": 0, "rejected": 0}
+
+    def join(self):
+        """佔一個觀看者名額；額滿回 False。名額在回應關閉時由 leave() 歸還。"""
+        with self.cond:
+            if self.viewers >= _STREAM_MAX_VIEWERS:
+                self.stats["rejected"] += 1
+                return False
+            self.viewers += 1
+            return True
+
+    def leave(self):
+        with self.cond:
+            self.viewers -= 1
+
+_stream_hub = _StreamHub()
+
+def publish_stream():
+    """資料版本變了就算出新的儲存格並通知觀看者；沒有人在看時什麼都不做。"""
+    hub = _stream_hub
+    with hub.cond:
+        if not hub.viewers:
+            return False
+    snap = current_snapshot()
+    with hub.cond:
+        if hub.version == snap["version"]:
+            return False
+    with app.app_context():   # 從背景更新器或串流產生器呼叫時沒有請求情境
+        cells = {v: _page_cells(_page_body(v, snap)[0]) for v in (False, True)}
+    with hub.cond:
+        if hub.version == snap["version"]:
+            return False
+        hub.base_id, hub.event_id = hub.event_id, _event_id(snap["version"])
+        for v in (False, True):
+            old = hub.cells[v]
+            changed = {k: c for k, c in cells[v].items() if old.get(k) != c}
+            hub.patch[v] = _sse("patch", hub.event_id, changed)
+            hub.reset[v] = _sse("reset", hub.event_id, cells[v])
+        hub.cells, hub.version = cells, snap["version"]
+        hub.stats["published"] += 1
+        hub.cond.notify_all()
+    return True
+
+def _stream_events(hide_etf, last_id):
+    """呼叫端已佔好觀看者名額（見 _StreamHub.join）。"""
+    hub = _stream_hub
+    publish_stream()
+    seen = last_id or None
+    deadline = _now() + _STREAM_MAX_AGE
+    while _now() < deadline:
+        with hub.cond:
+            if hub.event_id == seen:
+                hub.cond.wait(_STREAM_HEARTBEAT)
+            cur = hub.event_id
+            if cur == seen:
+                chunk = b": keepalive\n\n"
+            elif seen is not None and seen == hub.base_id:
+                chunk = hub.patch[hide_etf]
+            else:
+                chunk = hub.reset[hide_etf]
+            hub.stats["bytes_sent"] += len(chunk)
+        seen = cur
+        yield chunk
+        if not _refresher_warm.is_set():
+            publish_stream()   # 沒有背景更新器時由連線自己檢查版本
+
+@app.get("/stream")
+def stream():
+    """SSE：先送一次完整狀態（或依 Last-Event-ID 補差異），之後只推有變動的儲存格。額滿回 503。"""
+    if not _stream_hub.join():
+        resp = Response("too many live viewers, poll / instead\n", status=503, mimetype="text/plain")
+        resp.headers["Retry-After"] = str(_STREAM_RETRY_AFTER)
+        return resp
+    hide_etf = request.args.get('hide_etf') in ('1', 'true', 'on', 'yes')
+    resp = Response(_stream_events(hide_etf, request.headers.get("Last-Event-ID")), mimetype="text/event-stream")
+    # 名額在回應關閉時歸還：產生器還沒開始跑就斷線時 finally 不會執行，call_on_close 一定會
+    resp.call_on_close(_stream_hub.leave)
+    resp.headers["Cache-Control"] = "no-cache"
+    resp.headers["X-Accel-Buffering"] = "no"
+    return resp
+
+
+@app.get("/cache/stats")
+def cache_stats():
+    stats = {"backend": type(_cache).__name__, **_prices.stats()}
+    with _breaker_lock:
+        stats["breaker_skipped"] = _breaker_stats["skipped"]
+    with _stream_hub.cond:
+        stats["stream_viewers"] = _stream_hub.viewers
+        stats.update({f"stream_{k}": v for k, v in _stream_hub.stats.items()})
+    stats.update({f"chart_{k}": v for k, v in chart_stats().items()})
+    return stats
+
+@app.get("/cache/breakers")
+def cache_breakers():
+    """目前有失敗紀錄的代碼：狀態、連續失敗次數、下次重試時間、被略過的抓取次數。"""
+    now = _now()
+    with _breaker_lock:
+        symbols = {
+            sym: {"state": b.state(now), "failures": b.failures, "retry_in": max(0.0, round(b.retry_at - now, 1)),
+                  "last_error": b.last_error, "skipped": b.skipped}
+            for sym, b in sorted(_breakers.items())
+        }
+        skipped = _breaker_stats["skipped"]
+    return {"threshold": _BREAKER_THRESHOLD, "skipped": skipped,
+            "open": sum(1 for v in symbols.values() if v["state"] != "closed"), "symbols": symbols}
 
 @app.get("/health")
 def health():
@@ -783,5 +1246,7 @@ def health():
 
 # 本機執行（Render 用 gunicorn，不會跑到這裡）
 if __name__ == "__main__":
+    if os.environ.get("PRICE_REFRESHER", "1") != "0":
+        start_refresher()
     port = int(os.environ.get("PORT", 5000))
     app.run(host="0.0.0.0", port=port, debug=True)
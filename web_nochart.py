@@ -9,13 +9,13 @@ Render（建議 Start Command）：
   gunicorn portfolio:app --bind 0.0.0.0:$PORT --access-logfile - --error-logfile - --timeout 120 --forwarded-allow-ips='*'
 """
 
-from flask import Flask, render_template_string, request
+from flask import Flask, render_template, request
 from datetime import datetime, date
 from werkzeug.middleware.proxy_fix import ProxyFix
-import yfinance as yf
-import pandas as pd
-import threading, time, os, logging
+import os, logging
+from price_cache import FetchError, PriceCache
 from pytz import timezone
+from symbol_index import default_index
 
 app = Flask(__name__)
 # 代理相容（雲端反向代理下正確判斷 https/host）
@@ -80,61 +80,33 @@ _TTL_FAST   = 60        # 1 分鐘：即時／當日
 _TTL_NORMAL = 300       # 5 分鐘：一般
 _TTL_LONG   = 3600      # 1 小時：較長週期
 
-_cache = {}
-_cache_lock = threading.Lock()
-def _now(): return time.time()
-def _get_cache(key):
-    with _cache_lock:
-        return _cache.get(key)
-def _set_cache(key, value):
-    with _cache_lock:
-        _cache[key] = value
-
-def cached_history(symbol, *, period=None, start=None, end=None, ttl=_TTL_NORMAL):
-    """以 TTL 記憶 yfinance history；抓失敗時回上次成功的舊值（stale）。"""
-    key = ("history", symbol, period, start, end)
-    entry = _get_cache(key)
-    now = _now()
-    if entry and (now - entry["ts"] < ttl) and entry["data"] is not None:
-        return entry["data"]
-    try:
-        tkr = yf.Ticker(symbol)
-        df = tkr.history(period=period) if period else tkr.history(start=start, end=end)
-        _set_cache(key, {"ts": now, "data": df})
-        return df
-    except Exception:
-        if entry and entry["data"] is not None:
-            return entry["data"]
-        return pd.DataFrame()
-
-def cached_close(symbol, ttl=_TTL_FAST):
-    """
-    取最近一筆有效收盤價：先試 7d，再退 1mo；各自帶 TTL。
-    避免假日／停牌導致 period='1d' 為空而報「possibly delisted」。
-    """
-    for period, t in (("7d", ttl), ("1mo", max(ttl, _TTL_NORMAL))):
-        df = cached_history(symbol, period=period, ttl=t)
-        if not df.empty and "Close" in df:
-            close = df["Close"].dropna()
-            if not close.empty:
-                return float(close.iloc[-1])
-    return 'N/A'
+_tw_index = default_index()      # 台股代碼實際所在的後綴（見 symbol_index）
+
+# 記憶體快取、single-flight 與快取項目的取用路徑見 price_cache
+_prices = PriceCache(normal_ttl=_TTL_NORMAL)
+_cache = _prices.backend
+_get_cache, _set_cache = _prices.get, _prices.set
+_fetch_history, _cached_entry = _prices.fetch, _prices.entry
+cached_history, cached_close = _prices.history, _prices.close
 
 def get_tw_stock_price(symbol):
     """
     台股 ETF/股票的強韌代碼嘗試：.TW → .TWO → 裸代碼 → .TPE
     取最近有效收盤價（搭配 cached_close）。
+    解析過的後綴記在 _tw_index，之後直接查；確定不存在的後綴在負快取期限內不再試。
     """
     base = symbol.replace(".TW", "")
-    candidates = [f"{base}.TW", f"{base}.TWO", base, f"{base}.TPE"]
-    seen = set()
-    for sym in candidates:
-        if sym in seen: 
-            continue
-        seen.add(sym)
-        price = cached_close(sym, ttl=_TTL_FAST)
+    candidates = list(dict.fromkeys([f"{base}.TW", f"{base}.TWO", base, f"{base}.TPE"]))
+    misses = []
+    for sym in _tw_index.order(base, candidates):
+        try:
+            price = cached_close(sym, ttl=_TTL_FAST, strict=True)
+        except FetchError:
+            continue   # 逾時／HTTP 錯誤不代表這個後綴不存在，不記負快取
         if price != 'N/A':
+            _tw_index.record(base, sym, misses)
             return price
+        misses.append(sym)
     return 'N/A'
 
 def get_usdtwd_rate(default=31.5):
@@ -307,6 +279,7 @@ TEMPLATE = r"""
 </body>
 </html>
 """
+_TEMPLATE = app.jinja_env.from_string(TEMPLATE)   # import 時編譯一次，請求只做 render
 
 # ============== 路由 ==============
 @app.route("/")
@@ -419,8 +392,8 @@ def home():
     us_table.sort(key=lambda x: x["market_value"], reverse=True)
     tw_items.sort(key=lambda x: x["market_value"], reverse=True)
 
-    return render_template_string(
-        TEMPLATE,
+    return render_template(
+        _TEMPLATE,
         updated_at=updated_at_tw,
         exchange_rate=exchange_rate,
         hide_etf=hide_etf,
@@ -450,6 +423,13 @@ def home():
         total_profit_pct=total_profit_pct,
     )
 
+# 本檔沒有背景更新器替快取呼叫 stamps()，閒置的鍵改由請求順手清（有間隔限制，見 bounded_cache）
+@app.before_request
+def _expire_idle_cache():
+    _cache.maybe_expire()
+
+app.add_url_rule("/cache/stats", "cache_stats", _prices.stats)
+
 @app.get("/health")
 def health():
     return {"status": "ok"}